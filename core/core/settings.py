@@ -122,4 +122,39 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [
     BASE_DIR / 'static'
-]
\ No newline at end of file
+]
+
+# ===== DETECTOR DE VEHÍCULOS (traffic/detectors.py) =====
+# BACKEND: 'ultralytics' (PyTorch), 'onnx', 'onnx-int8' (ONNX Runtime), 'openvino'
+#          o 'remote' (servidor de inferencia por lotes: manage.py run_inference_server)
+# MODEL: ruta del modelo, o dirección del socket con 'remote' (None = por defecto del backend)
+#        Los modelos de export_detector tienen entrada dinámica; uno exportado con
+#        --fixed ignora el imgsz de cada recorte (TILING) y escala todo a su tamaño
+# THREADS: hilos de inferencia en CPU (None = automático)
+TRAFFIC_DETECTOR = {
+    'BACKEND': 'ultralytics',
+    'MODEL': None,
+    'THREADS': None,
+}
+
+# ===== CÁMARAS (traffic/cameras.py) =====
+# Una entrada por cámara; cada una corre en su propio proceso de visión y la
+# primera es la del video. Los conteos de todas se fusionan por carril.
+# ID: nombre de la cámara
+# SOURCE: URL, índice de webcam o None (= CAMERA_SOURCE de camera.py)
+# ZONES: zonas propias, mismo formato que zones.ZONES (None = las de zones.py)
+# LANES: carril (0-5 = semáforos A-F) que cuenta cada zona (None = zona i → carril i)
+# CORE: núcleo o lista de núcleos del proceso (None = automático: una sola cámara
+#       no se fija; varias se reparten los núcleos y el detector usa un hilo por núcleo)
+# Con varias cámaras conviene el backend 'remote' para cargar un solo modelo.
+TRAFFIC_CAMERAS = [
+    {'ID': 'principal', 'SOURCE': None, 'ZONES': None, 'LANES': None, 'CORE': None},
+    # Ejemplo: segunda cámara que ve la intersección derecha (D) y parte de la avenida (E, F)
+    # {
+    #     'ID': 'lateral',
+    #     'SOURCE': 'http://192.168.100.139:4747/video',
+    #     'ZONES': [(0.10, 0.20, 0.45, 0.90), (0.50, 0.40, 1.00, 0.55), (0.50, 0.55, 1.00, 0.70)],
+    #     'LANES': [3, 4, 5],
+    #     'CORE': None,
+    # },
+]
@@ -10,6 +10,20 @@ class TrafficConfig(AppConfig):
         
         # Evitar doble ejecución por el reloader de Django
         if os.environ.get('RUN_MAIN') == 'true':
-            from . import controller
+            from . import startup
+            startup.begin()
+            
+            with startup.timed('import_vision'):
+                from . import camera
+            with startup.timed('import_controller'):
+                from . import controller
+            
+            print("\n👁️  INICIANDO WORKER DE VISIÓN...")
+            camera.start_vision_worker()
+            
             print("\n🚀 INICIANDO CONTROLADOR AUTOMÁTICO...")
-            controller.start_auto_cycle()
\ No newline at end of file
+            controller.start_auto_cycle()
+            
+            # Detector y Arduino se precargan en segundo plano
+            # (el detector, en el proceso de visión si corre aparte)
+            startup.start_warmup(detector=not camera.VISION_PROCESS)
@@ -1,13 +1,15 @@
 import serial
-import time
 import threading
+from . import clock
 
 # ===== CONFIGURACIÓN =====
 PORT = 'COM3'  # 🔥 CAMBIAR según tu puerto (COM3, COM4, /dev/ttyUSB0, etc.)
 BAUD_RATE = 9600
+RECONNECT_INTERVAL = 10  # Segundos mínimos entre intentos de reconexión automática
 
 # Variables globales
 arduino = None
+_last_connect_attempt = None  # clock.now() del último intento (None = nunca)
 # Lock para acceso thread-safe
 serial_lock = threading.Lock()
 
@@ -26,14 +28,16 @@ LOGICAL_TO_PHYSICAL = {
 
 def connect_arduino():
     """Conectar al Arduino de forma segura"""
-    global arduino
+    global arduino, _last_connect_attempt
+    
+    _last_connect_attempt = clock.now()
     
     try:
         if arduino and arduino.is_open:
             return arduino
             
         arduino = serial.Serial(PORT, BAUD_RATE, timeout=1)
-        time.sleep(2)  # Esperar que Arduino se inicialice
+        clock.sleep(2)  # Esperar que Arduino se inicialice
         
         # Limpiar buffer
         arduino.reset_input_buffer()
@@ -48,6 +52,16 @@ def connect_arduino():
         return None
 
 
+def warmup_arduino():
+    """
+    Conectar en segundo plano antes del primer comando (ver startup.py)
+    
+    Así la espera de inicialización del Arduino no la paga el controlador.
+    """
+    with serial_lock:
+        return connect_arduino()
+
+
 def disconnect_arduino():
     """Desconectar Arduino de forma segura"""
     global arduino
@@ -78,7 +92,10 @@ def send_command(lane, color):
 
         try:
             if not arduino or not arduino.is_open:
-                arduino = connect_arduino()
+                # Sin Arduino no reintentar en cada comando (cada intento bloquea)
+                if (_last_connect_attempt is None
+                        or clock.now() - _last_connect_attempt >= RECONNECT_INTERVAL):
+                    arduino = connect_arduino()
                 
             if not arduino:
                 # Si no hay Arduino, solo simulamos (la maqueta ya se actualizó arriba)
@@ -96,7 +113,7 @@ def send_command(lane, color):
             arduino.flush()
             
             # Esperar confirmación
-            time.sleep(0.1)
+            clock.sleep(0.1)
             if arduino.in_waiting > 0:
                 response = arduino.readline().decode().strip()
                 print(f"📡 Arduino responde: {response}")
@@ -158,20 +175,20 @@ def test_sequence():
         print(f"\n--- Probando semáforo {i} ({chr(ord('A')+i)}) ---")
         
         all_red()
-        time.sleep(0.5)
+        clock.sleep(0.5)
         
         set_light(i, 'G')
-        time.sleep(2)
+        clock.sleep(2)
         
         set_light(i, 'Y')
-        time.sleep(1)
+        clock.sleep(1)
         
         set_light(i, 'R')
-        time.sleep(0.5)
+        clock.sleep(0.5)
     
     print("\n✅ Prueba completada")
     all_red()
 
 
-# Conectar al iniciar el módulo
-connect_arduino()
\ No newline at end of file
+# La conexión se abre en el primer comando o con warmup_arduino() al arrancar
+# el servidor, no al importar el módulo (migrate, shell y tests no la necesitan)
\ No newline at end of file
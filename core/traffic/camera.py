@@ -1,12 +1,23 @@
+import threading
+import time
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from .zones import ZONES, ZONE_NAMES, ZONE_COLORS
-from . import state
-
-# Cargar modelo YOLO
-model = YOLO("yolov8n.pt")
+from .zones import ZONES, ZONE_NAMES, ZONE_COLORS, lookup_zones, set_zones
+from .stream import StreamHub, SnapshotCache
+from .capture import LatestFrameGrabber
+from .camera_manager import CameraManager
+from .mjpeg import MjpegHttpSource, jpeg_size, choose_reduction, decode_jpeg
+from .detectors import get_detector, detector_square_input
+from .motion import MotionGate
+from .health import FrameHealth, make_thumbnail, DARK, BLURRY, DUPLICATE, FROZEN
+from .tiling import get_inference_regions, detect_in_regions, pixel_fraction, input_fraction
+from .tracker import VehicleTracker
+from .stabilizer import CountStabilizer
+from .overlay import get_static_overlay
+from .fusion import zones_to_lanes
+from . import state, startup
 
+# El detector (YOLO u otro backend) se configura en settings.TRAFFIC_DETECTOR
 # Clases de vehículos en COCO dataset
 VEHICLE_CLASSES = [2, 3, 5, 7]  # car, motorcycle, bus, truck
 
@@ -16,20 +27,99 @@ MIN_VEHICLE_SIZE = 100      # Muy bajo para detectar carritos pequeños desde le
 MAX_VEHICLE_SIZE = 100000   # Máximo grande por si la cámara está cerca
 MIN_BRIGHTNESS = 1          # 🔥 MODIFICADO: Muy bajo para permitir funcionamiento en oscuridad (maqueta)
 
+# ===== MODO DE INFERENCIA =====
+# 'full':  frame completo a imgsz=1280 (original)
+# 'roi':   recorte a la caja envolvente de todas las zonas
+# 'tiles': un recorte por grupo de zonas (ver tiling.py)
+# 'roi' y 'tiles' usan el frame completo si los recortes no ahorran entrada al
+# detector. Con las zonas de zones.py a 1280x720, 'tiles' ahorra ~40% con un
+# modelo exportado y ~21% con Ultralytics; 'roi' no ahorra (cubre todo el frame)
+INFERENCE_MODE = 'tiles'
+INFERENCE_IMGSZ = 1280      # imgsz equivalente sobre el frame completo
+
+# ===== FUENTE DE CÁMARA =====
+# Opción 1: Webcam normal
+# CAMERA_SOURCE = 0
+#
+# Opción 2: DroidCam por WiFi
+CAMERA_SOURCE = "http://192.168.100.138:4747/video"
+#
+# Opción 3: DroidCam como webcam virtual
+# CAMERA_SOURCE = 1
+#
+# Con settings.TRAFFIC_CAMERAS la fuente (y las zonas) vienen del registro
+# de cámaras (ver cameras.py); esta queda como la de la cámara por defecto
+CAMERA_ID = 'principal'
+ZONE_LANES = None           # Carril de cada zona (None = zona i → carril i)
+
+# Con una URL http (DroidCam) se leen los JPEG del stream directamente:
+# solo se decodifican los frames que van a YOLO o al render (ver mjpeg.py)
+MJPEG_PASSTHROUGH = True
+
+# Los reintentos de conexión usan backoff exponencial (ver camera_manager.py)
+FRAME_TIMEOUT = 5           # Segundos sin frames nuevos para considerar la cámara caída
+
 # ===== SISTEMA DE ESTABILIZACIÓN =====
+# 'tracker': contar vehículos seguidos entre frames (tracker.py)
+# 'window':  ventana de detecciones con STABILITY_POLICY (stabilize_counts)
+COUNT_MODE = 'tracker'
+DETECT_EVERY_N_FRAMES = 3   # Con el tracker se puede subir sin perder precisión
 STABILITY_FRAMES = 10
+STABILITY_POLICY = 'max'    # 'max', 'mean', 'median' o 'ewma' (ver stabilizer.py)
 UPDATE_INTERVAL = 5
 
 # Buffers para estabilización
-detection_history = []
-stable_counts = [0] * 6
+stabilizer = CountStabilizer(n_zones=len(ZONES), window=STABILITY_FRAMES, policy=STABILITY_POLICY)
+stable_counts = [0] * len(ZONES)
 frame_counter = 0
+avg_frame_age = None  # Promedio móvil de la antigüedad del frame procesado (s)
+
+# Tracker de vehículos (COUNT_MODE = 'tracker'): cualquier detección desde
+# MIN_CONFIDENCE crea un track, igual que las cuenta el modo 'window'
+TRACK_BIRTH_CONFIDENCE = MIN_CONFIDENCE
+tracker = VehicleTracker(new_track_confidence=TRACK_BIRTH_CONFIDENCE)
+
+# Compuerta de movimiento: salta YOLO si nada cambió en las zonas
+motion_gate = MotionGate()
+
+# Salud del frame: brillo, desenfoque y frames congelados sobre una miniatura
+frame_health = FrameHealth(min_brightness=MIN_BRIGHTNESS)
+last_detections = None     # Últimas detecciones (se reutilizan si se salta YOLO)
+last_raw_counts = [0] * len(ZONES)  # Último conteo sin estabilizar
+
+# Último frame analizado (para los frames MJPEG que no se decodifican)
+last_frame_size = None
+last_is_valid = True
+last_brightness = 0.0
+
+EMPTY_DETECTIONS = {
+    'xyxy': np.empty((0, 4), dtype=np.int64),
+    'conf': np.empty(0, dtype=np.float32),
+    'cls': np.empty(0, dtype=np.int64),
+    'zone': np.empty(0, dtype=np.int64),
+}
+
+# ===== WORKER DE VISIÓN =====
+# Un solo hilo abre la cámara, corre YOLO y actualiza state.vehicle_counts
+# aunque nadie esté mirando el video. Los clientes MJPEG solo leen frames.
+stream_hub = StreamHub()
+snapshot_cache = SnapshotCache()
+vision_running = False
+render_enabled = True
+_vision_thread = None
+_vision_lock = threading.Lock()
+frame_processed = threading.Event()  # Se marca tras cada frame (lo espera vision_process)
+
+# Con VISION_PROCESS el worker corre en otro proceso (otro GIL) y se comunica
+# por memoria compartida (ver vision_process.py y framebus.py). Dentro de ese
+# proceso frame_bus reemplaza a stream_hub / snapshot_cache como salida.
+VISION_PROCESS = True
+frame_bus = None
 
 
 def is_image_valid(frame):
-    """Verificar si la imagen tiene suficiente luz"""
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    avg_brightness = np.mean(gray)
+    """Verificar si la imagen tiene suficiente luz (sobre una miniatura)"""
+    avg_brightness = float(np.mean(make_thumbnail(frame)))
     
     if avg_brightness < MIN_BRIGHTNESS:
         return False, avg_brightness
@@ -37,243 +127,658 @@ def is_image_valid(frame):
     return True, avg_brightness
 
 
-def is_valid_vehicle(box, frame_width, frame_height):
-    """Verificar si la detección es un vehículo válido"""
-    confidence = float(box.conf[0])
-    if confidence < MIN_CONFIDENCE:
-        return False
+def filter_vehicles(xyxy, conf):
+    """
+    Filtrar detecciones válidas de forma vectorizada
     
-    x1, y1, x2, y2 = map(int, box.xyxy[0])
-    width = x2 - x1
-    height = y2 - y1
+    Args:
+        xyxy: Array (N, 4) de cajas en píxeles (enteros)
+        conf: Array (N,) de confianzas
+        
+    Returns:
+        np.ndarray: Máscara booleana (N,) de vehículos válidos
+    """
+    width = xyxy[:, 2] - xyxy[:, 0]
+    height = xyxy[:, 3] - xyxy[:, 1]
     area = width * height
     
-    if area < MIN_VEHICLE_SIZE or area > MAX_VEHICLE_SIZE:
-        return False
+    # aspect_ratio = 0 cuando la altura es 0 (igual que antes)
+    safe_height = np.where(height > 0, height, 1)
+    aspect_ratio = np.where(height > 0, width / safe_height, 0)
     
-    aspect_ratio = width / height if height > 0 else 0
-    if aspect_ratio < 0.2 or aspect_ratio > 6.0:
-        return False
+    return (
+        (conf >= MIN_CONFIDENCE)
+        & (area >= MIN_VEHICLE_SIZE) & (area <= MAX_VEHICLE_SIZE)
+        & (aspect_ratio >= 0.2) & (aspect_ratio <= 6.0)
+    )
+
+
+def assign_zones(xyxy, frame_width, frame_height):
+    """
+    Asignar cada caja a la zona que contiene su centro
     
-    return True
+    Returns:
+        np.ndarray: Índice de zona por caja (N,), -1 si no cae en ninguna
+    """
+    if len(xyxy) == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    cx = (xyxy[:, 0] + xyxy[:, 2]) // 2
+    cy = (xyxy[:, 1] + xyxy[:, 3]) // 2
+    
+    # Un solo acceso al mapa de etiquetas precompilado
+    return lookup_zones(cx, cy, frame_width, frame_height)
+
+
+def detect_vehicles(frame, imgsz=INFERENCE_IMGSZ, mode=None, frame_size=None):
+    """
+    Correr el detector y post-procesar todas las cajas en un solo paso de arrays
+    
+    Args:
+        frame_size: (ancho, alto) del frame original si `frame` se decodificó
+                    a escala reducida; las cajas se devuelven en esa escala
+    
+    Returns:
+        tuple: (detections, counts)
+        detections es un dict de arrays 'xyxy' (N, 4), 'conf', 'cls' y 'zone' (N,)
+        counts es la lista de vehículos por zona
+    """
+    h, w = frame.shape[:2]
+    
+    # Recortes a inferir según el modo (se calculan una vez por resolución)
+    detector = get_detector()
+    regions = get_inference_regions(w, h, mode or INFERENCE_MODE, imgsz, detector.square_input)
+    
+    # El filtro de clases se hace dentro del modelo
+    xyxy, conf, cls = detect_in_regions(detector, frame, regions, imgsz,
+                                      conf=MIN_CONFIDENCE, classes=VEHICLE_CLASSES)
+    
+    if frame_size is not None and frame_size != (w, h):
+        # Volver a coordenadas del frame original
+        xyxy = xyxy * np.array([frame_size[0] / w, frame_size[1] / h] * 2)
+        w, h = frame_size
+    xyxy = xyxy.astype(np.int64)
+    
+    valid = filter_vehicles(xyxy, conf)
+    xyxy = xyxy[valid]
+    conf = conf[valid]
+    cls = cls[valid]
+    zone = assign_zones(xyxy, w, h)
+    
+    counts = np.bincount(zone[zone >= 0], minlength=len(ZONES)).tolist()
+    
+    return {'xyxy': xyxy, 'conf': conf, 'cls': cls, 'zone': zone}, counts
 
 
 def stabilize_counts(new_counts):
     """Estabilizar conteos - si detecta aunque sea 1 vez, lo mantiene"""
-    global detection_history, stable_counts
+    global stable_counts
+    
+    stable_counts = stabilizer.push(new_counts)
+    return stable_counts
+
+
+def analyze_frame(frame, captured_at=None, frame_size=None):
+    """
+    Analizar un frame: salud del frame + detección YOLO + conteo por zona
+    
+    No dibuja nada; solo actualiza los conteos estabilizados.
+    captured_at es el momento de captura (time.monotonic) usado por el tracker.
+    
+    Args:
+        frame: Frame BGR, o None si no se decodificó (frame MJPEG que no toca
+               YOLO): se reutiliza el brillo del último frame y el tracker
+               solo predice
+        frame_size: (ancho, alto) original si el frame está a escala reducida
+    
+    Returns:
+        tuple: (detections, is_valid, brightness)
+        detections es un dict de arrays 'xyxy', 'conf' y 'zone' (-1 = fuera de zonas)
+    """
+    global stable_counts, last_detections, last_raw_counts
+    global last_frame_size, last_is_valid, last_brightness
     
-    detection_history.append(new_counts)
+    detections = EMPTY_DETECTIONS
+    if captured_at is None:
+        captured_at = time.monotonic()
     
-    if len(detection_history) > STABILITY_FRAMES:
-        detection_history.pop(0)
+    if frame is None:
+        if COUNT_MODE == 'tracker' and last_is_valid and last_frame_size:
+            tracker.predict(captured_at)
+            stable_counts = tracker.zone_counts(*last_frame_size)
+        if frame_counter % UPDATE_INTERVAL == 0:
+            _publish_counts(stable_counts)
+        return detections, last_is_valid, last_brightness
     
-    if len(detection_history) >= 2:
-        averaged_counts = []
-        for zone_idx in range(6):
-            zone_detections = [frame[zone_idx] for frame in detection_history]
+    if frame_size is None:
+        frame_size = (frame.shape[1], frame.shape[0])
+    
+    # Salud del frame (brillo, desenfoque, congelado) sobre una miniatura
+    health = frame_health.check(frame, captured_at)
+    brightness = frame_health.brightness
+    is_valid = health not in (DARK, FROZEN)
+    last_frame_size, last_is_valid, last_brightness = frame_size, is_valid, brightness
+    _report_health(health)
+    
+    if not is_valid:
+        # Cámara tapada o congelada: forzar conteos a cero
+        stabilizer.reset()
+        stable_counts = [0] * len(ZONES)
+        _publish_counts(stable_counts)
+        last_detections = None
+        tracker.reset()
+        return detections, is_valid, brightness
+    
+    w, h = frame_size
+    
+    # Detectar cada N frames para no sobrecargar
+    if frame_counter % DETECT_EVERY_N_FRAMES == 0:
+        if health == BLURRY and not motion_gate.refresh_due():
+            # Frame movido o desenfocado: no inferir, los tracks solo se predicen.
+            # Pasado MAX_SKIP_SECONDS se infiere igual para no sostener conteos viejos
+            detections = last_detections if last_detections is not None else EMPTY_DETECTIONS
+            current_detections = last_raw_counts
             
-            # Contar frames donde se detectó algo
-            frames_with_detection = sum(1 for d in zone_detections if d > 0)
+            if COUNT_MODE == 'tracker':
+                tracker.predict(captured_at)
+        elif health != DUPLICATE and (
+                motion_gate.should_infer(frame, frame_health.gray) or last_detections is None):
+            # Escala de imgsz=1280 para detectar objetos PEQUEÑOS desde lejos
+            detections, current_detections = detect_vehicles(frame, frame_size=frame_size)
+            last_detections, last_raw_counts = detections, current_detections
+            _publish_detections(detections, frame_size, captured_at)
             
-            # Si se detectó en al menos 1 de los últimos 10 frames, mantener
-            if frames_with_detection >= 1:
-                # Usar el máximo de los últimos 5 frames
-                recent = zone_detections[-min(5, len(zone_detections)):]
-                stable_value = max(recent)
-            else:
-                stable_value = 0
+            if COUNT_MODE == 'tracker':
+                tracker.update(detections['xyxy'], detections['conf'], captured_at)
+        else:
+            # Frame repetido o sin movimiento en las zonas: reutilizar el último resultado
+            detections = last_detections if last_detections is not None else EMPTY_DETECTIONS
+            current_detections = last_raw_counts
             
-            averaged_counts.append(stable_value)
+            if COUNT_MODE == 'tracker':
+                tracker.hold(captured_at)
         
-        stable_counts = averaged_counts
+        if COUNT_MODE == 'tracker':
+            stable_counts = tracker.zone_counts(w, h)
+        else:
+            # Estabilizar (solo en frames donde tocaba YOLO)
+            stabilize_counts(current_detections)
+        
+        state.update_vision_stats(**motion_gate.get_stats())
+        
+        if frame_counter % 30 == 0 and sum(stable_counts) > 0:
+            print(f"📊 Conteos estabilizados: {stable_counts}")
     
-    return stable_counts
+    elif COUNT_MODE == 'tracker':
+        # Sin detección en este frame: solo predecir posiciones
+        tracker.predict(captured_at)
+        stable_counts = tracker.zone_counts(w, h)
+    
+    # Actualizar estado cada UPDATE_INTERVAL frames
+    if frame_counter % UPDATE_INTERVAL == 0:
+        _publish_counts(stable_counts)
+    
+    return detections, is_valid, brightness
 
 
-def generate_frames():
-    """Generador de frames con detección YOLO + estabilización"""
-    global frame_counter, stable_counts
+def _publish_counts(zone_counts):
+    """Publicar en state los conteos de las zonas de esta cámara sumados por carril"""
+    state.update_vehicle_counts(zones_to_lanes(zone_counts, ZONE_LANES))
+
+
+def _report_health(health):
+    """Publicar en state la decisión de salud y levantar/limpiar la falla de cámara"""
+    fault = 'frozen' if health == FROZEN else None
+    if fault != state.get_camera_fault():
+        if fault:
+            print(f"🧊 Cámara congelada: el mismo frame hace {frame_health.frozen_for:.0f}s")
+        else:
+            print("✅ La cámara volvió a enviar frames nuevos")
+        state.set_camera_fault(fault)
+    
+    state.update_vision_stats(**frame_health.get_stats())
+
+
+def _publish_detections(detections, frame_size, captured_at):
+    """Guardar en state la última detección para detections/latest"""
+    # Momento de captura en hora de pared (captured_at es monotónico)
+    captured_wall = time.time() - (time.monotonic() - captured_at)
+    
+    state.update_latest_detections(dict(
+        detections,
+        captured_at=captured_wall,
+        frame_size=tuple(frame_size),
+    ))
+
+
+def render_frame(frame, detections, is_valid, brightness):
+    """
+    Dibujar detecciones, zonas e información sobre el frame
+    
+    La codificación JPEG la hace StreamHub, una vez por variante de stream.
     
-    # ===== FUENTE DE CÁMARA =====
-    # Opción 1: Webcam normal
-    # CAMERA_SOURCE = 0
-    #
-    # Opción 2: DroidCam por WiFi
-    CAMERA_SOURCE = "http://192.168.100.138:4747/video"
-    #
-    # Opción 3: DroidCam como webcam virtual
-    # CAMERA_SOURCE = 1
+    Returns:
+        np.ndarray: El mismo frame, anotado
+    """
+    h, w, _ = frame.shape
     
-    print(f"📷 Conectando a: {CAMERA_SOURCE}")
-    cap = cv2.VideoCapture(CAMERA_SOURCE)
+    if not is_valid:
+        # Mostrar advertencia
+        warning = "CAMARA CONGELADA" if frame_health.decision == FROZEN else "CAMARA TAPADA O SIN LUZ"
+        cv2.rectangle(frame, (0, 0), (w, 100), (0, 0, 0), -1)
+        cv2.putText(frame, warning, (w//2 - 200, 40),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+        cv2.putText(frame, f"Brillo: {brightness:.1f}/255 (min: {MIN_BRIGHTNESS})",
+                   (w//2 - 200, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    
+    # Dibujar detecciones
+    for (x1, y1, x2, y2), confidence, zone in zip(detections['xyxy'].tolist(),
+                                                  detections['conf'].tolist(),
+                                                  detections['zone'].tolist()):
+        if zone >= 0:
+            label = f"{ZONE_NAMES[zone][0]} {confidence:.2f}"
+            cv2.putText(frame, label, (x1, y1 - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, ZONE_COLORS[zone], 2)
+        
+        color = (0, 255, 0) if zone >= 0 else (0, 165, 255)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f"car {confidence:.0%}", (x1, y2 + 15),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+    
+    # Zonas, fondos de etiquetas y barra de estado: capa precompilada
+    overlay = get_static_overlay(w, h)
+    overlay.apply(frame)
+    overlay.draw_counts(frame, stable_counts)
+    
+    # Info general
+    total = sum(stable_counts)
+    status_text = f"Vehiculos: {total} | Brillo: {brightness:.0f}/255"
+    if not is_valid:
+        status_text += " | CONGELADA" if frame_health.decision == FROZEN else " | TAPADA"
+    
+    status_color = (0, 255, 0) if is_valid else (0, 0, 255)
+    
+    cv2.putText(frame, status_text, (10, h - 15),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
+    
+    # Indicador de estabilidad
+    if COUNT_MODE == 'tracker':
+        stability_text = f"Tracks: {int(tracker.confirmed().sum())}"
+    else:
+        stability_pct = stabilizer.fill_ratio * 100
+        stability_text = f"Estabilidad: {stability_pct:.0f}%"
+    cv2.putText(frame, stability_text, (w - 200, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+    
+    return frame
+
+
+def _open_source():
+    """
+    Abrir CAMERA_SOURCE (lo llama CameraManager en un hilo aparte)
+    
+    Returns:
+        tuple: (cap, passthrough) con passthrough=True si cap entrega
+               los JPEG crudos del stream MJPEG en vez de frames decodificados,
+               o None si no se pudo abrir
+    """
+    print(f"📷 Conectando a {CAMERA_ID}: {CAMERA_SOURCE}")
+    
+    if MJPEG_PASSTHROUGH and isinstance(CAMERA_SOURCE, str) and CAMERA_SOURCE.startswith('http'):
+        cap, passthrough = MjpegHttpSource(CAMERA_SOURCE), True
+    else:
+        cap, passthrough = cv2.VideoCapture(CAMERA_SOURCE), False
     
     if not cap.isOpened():
+        cap.release()
         print(f"❌ No se puede conectar a: {CAMERA_SOURCE}")
         print("   💡 Verifica que DroidCam esté abierto en el celular")
         print("   💡 Verifica que la IP sea correcta")
         print("   💡 Asegúrate de estar en la misma red WiFi")
-        state.camera_active = False
-        return
+        return None
+    
+    if not passthrough:
+        # Resolución de captura
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        cap.set(cv2.CAP_PROP_FPS, 30)
+    return cap, passthrough
+
+
+def _release_source(source):
+    """Liberar una fuente abierta por _open_source"""
+    cap, _ = source
+    cap.release()
+
+
+# Apertura asíncrona y reconexión con backoff
+camera_manager = CameraManager(_open_source, _release_source)
+
+
+def configure_camera(config):
+    """
+    Usar la fuente y las zonas de una cámara del registro (antes de iniciar el worker)
+    
+    Args:
+        config: cameras.CameraConfig
+    """
+    global CAMERA_ID, CAMERA_SOURCE, ZONE_LANES, stabilizer, stable_counts, last_raw_counts
+    
+    CAMERA_ID = config.id
+    if config.source is not None:
+        CAMERA_SOURCE = config.source
+    if config.zones is not None:
+        set_zones(config.zones, config.lanes)
+    ZONE_LANES = config.lanes
+    
+    # Buffers dimensionados según las zonas de esta cámara
+    stabilizer = CountStabilizer(n_zones=len(ZONES), window=STABILITY_FRAMES, policy=STABILITY_POLICY)
+    stable_counts = [0] * len(ZONES)
+    last_raw_counts = [0] * len(ZONES)
+
+
+def _decode_for_pipeline(jpeg, needs_analysis, needs_render):
+    """
+    Decodificar solo lo necesario de un JPEG del stream MJPEG
     
-    # Resolución de captura
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-    cap.set(cv2.CAP_PROP_FPS, 30)
+    El frame de análisis se decodifica a 1/2 o 1/4 de escala cuando aun así
+    sigue siendo al menos tan grande como la entrada del detector.
     
-    actual_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    actual_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    Returns:
+        tuple: (analysis_frame, render_frame, frame_size); los frames son
+               None si no hacen falta o el JPEG está corrupto
+    """
+    frame_size = jpeg_size(jpeg)
+    analysis, full = None, None
+    
+    if needs_analysis:
+        reduction = choose_reduction(max(frame_size), INFERENCE_IMGSZ) if frame_size else 1
+        analysis = decode_jpeg(jpeg, reduction)
+        if reduction == 1:
+            full = analysis
+    
+    if needs_render and full is None:
+        full = decode_jpeg(jpeg)
+        if needs_analysis and analysis is None:
+            analysis = full
+    
+    decoded = full if full is not None else analysis
+    if frame_size is None and decoded is not None:
+        frame_size = (decoded.shape[1], decoded.shape[0])
+    
+    return analysis, full, frame_size
+
+
+def _run_capture_session(cap, passthrough):
+    """
+    Una sesión de captura: procesar frames de una fuente ya abierta hasta
+    que falle o se detenga el worker
+    
+    Returns:
+        tuple: (frames procesados, motivo del fin de la sesión)
+    """
+    global frame_counter
     
     state.camera_active = True
-    print(f"✅ Cámara conectada: {actual_w}x{actual_h}")
+    if passthrough:
+        print("✅ Cámara conectada: MJPEG directo (sin decodificar cada frame)")
+    else:
+        actual_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        print(f"✅ Cámara conectada: {actual_w}x{actual_h}")
+        tiling = (actual_w, actual_h, INFERENCE_MODE, INFERENCE_IMGSZ, detector_square_input())
+        print(f"   - Modo de inferencia: {INFERENCE_MODE} "
+              f"({pixel_fraction(*tiling):.0%} del frame, "
+              f"{input_fraction(*tiling):.0%} de la entrada del detector)")
     print(f"📊 Configuración:")
     print(f"   - Confianza mínima: {MIN_CONFIDENCE}")
-    print(f"   - YOLO imgsz: 1280 (alta resolución para objetos pequeños)")
+    print(f"   - YOLO imgsz: {INFERENCE_IMGSZ} (alta resolución para objetos pequeños)")
     print(f"   - Estabilización: {STABILITY_FRAMES} frames")
+    print(f"   - Render para visores: {'sí' if render_enabled else 'no (headless)'}")
     
     last_warning = 0
+    frames_decoded = 0
+    frames_processed = 0
+    reason = 'worker detenido'
+    
+    # Hilo lector: mantiene vacío el buffer de la cámara
+    grabber = LatestFrameGrabber(cap).start()
+    motion_gate.reset()
+    frame_health.reset()
+    tracker.reset()
+    state.set_camera_fault(None)
     
     try:
-        while True:
-            success, frame = cap.read()
-            if not success:
-                print("⚠️ Error leyendo frame")
-                state.camera_active = False
+        while vision_running:
+            item, captured_at = grabber.read(timeout=FRAME_TIMEOUT)
+            if item is None:
+                if grabber.is_alive:
+                    reason = f'sin frames en {FRAME_TIMEOUT}s'
+                else:
+                    reason = 'error leyendo frame'
+                print(f"⚠️ Cámara: {reason}")
                 break
             
-            h, w, _ = frame.shape
-            current_detections = [0] * 6
-            
-            # Verificar brillo
-            is_valid, brightness = is_image_valid(frame)
+            # El render es un consumidor opcional del análisis:
+            # sin visores (o sin variantes a las que les toque frame) no se
+            # dibuja ni se codifica
+            wants_render = _wants_render()
             
-            if not is_valid:
-                # Imagen muy oscura
-                if frame_counter - last_warning > 30:
-                    print(f"⚠️  Cámara tapada (brillo: {brightness:.1f}/255)")
-                    last_warning = frame_counter
-                
-                # Forzar conteos a cero
-                detection_history.clear()
-                stable_counts = [0] * 6
-                state.update_vehicle_counts([0] * 6)
-                
-                # Mostrar advertencia
-                cv2.rectangle(frame, (0, 0), (w, 100), (0, 0, 0), -1)
-                cv2.putText(frame, "CAMARA TAPADA O SIN LUZ", (w//2 - 200, 40),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                cv2.putText(frame, f"Brillo: {brightness:.1f}/255 (min: {MIN_BRIGHTNESS})",
-                           (w//2 - 200, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            # Vista cruda: los bytes de la cámara tal cual, o el frame antes
+            # de que render_frame dibuje sobre él
+            if _wants_raw():
+                _publish_raw(item)
             
+            if passthrough:
+                needs_analysis = frame_counter % DETECT_EVERY_N_FRAMES == 0
+                analysis, frame, frame_size = _decode_for_pipeline(item, needs_analysis, wants_render)
+                frames_decoded += (analysis is not None) + (frame is not None and frame is not analysis)
             else:
-                # Detectar cada 3 frames para no sobrecargar
-                if frame_counter % 3 == 0:
-                    # imgsz=1280 para detectar objetos PEQUEÑOS desde lejos
-                    results = model(frame, stream=True, verbose=False, conf=MIN_CONFIDENCE, imgsz=1280)
-                    
-                    for r in results:
-                        for box in r.boxes:
-                            cls = int(box.cls[0])
-                            
-                            if cls not in VEHICLE_CLASSES:
-                                continue
-                            
-                            if not is_valid_vehicle(box, w, h):
-                                continue
-                            
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            cx = (x1 + x2) // 2
-                            cy = (y1 + y2) // 2
-                            confidence = float(box.conf[0])
-                            
-                            # Detectar en qué zona cae
-                            vehicle_in_zone = False
-                            for i, (zx1, zy1, zx2, zy2) in enumerate(ZONES):
-                                zone_x1 = int(zx1 * w)
-                                zone_y1 = int(zy1 * h)
-                                zone_x2 = int(zx2 * w)
-                                zone_y2 = int(zy2 * h)
-                                
-                                if zone_x1 <= cx <= zone_x2 and zone_y1 <= cy <= zone_y2:
-                                    current_detections[i] += 1
-                                    vehicle_in_zone = True
-                                    
-                                    label = f"{ZONE_NAMES[i][0]} {confidence:.2f}"
-                                    cv2.putText(frame, label, (x1, y1 - 10),
-                                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, ZONE_COLORS[i], 2)
-                                    break
-                            
-                            # Dibujar caja
-                            color = (0, 255, 0) if vehicle_in_zone else (0, 165, 255)
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                            cv2.putText(frame, f"car {confidence:.0%}", (x1, y2 + 15),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-                    
-                    # Estabilizar (solo en frames donde corrió YOLO)
-                    stabilize_counts(current_detections)
-                    
-                    if frame_counter % 30 == 0 and sum(stable_counts) > 0:
-                        print(f"📊 Conteos estabilizados: {stable_counts}")
-                
-                # Actualizar estado cada UPDATE_INTERVAL frames
-                if frame_counter % UPDATE_INTERVAL == 0:
-                    state.update_vehicle_counts(stable_counts.copy())
+                frame = analysis = item
+                frame_size = None
             
-            # Dibujar zonas
-            for i, (zx1, zy1, zx2, zy2) in enumerate(ZONES):
-                x1 = int(zx1 * w)
-                y1 = int(zy1 * h)
-                x2 = int(zx2 * w)
-                y2 = int(zy2 * h)
-                
-                cv2.rectangle(frame, (x1, y1), (x2, y2), ZONE_COLORS[i], 2)
-                
-                label = f"{ZONE_NAMES[i]}: {stable_counts[i]}"
-                (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-                cv2.rectangle(frame, (x1, y1), (x1 + text_w + 10, y1 + text_h + 10), ZONE_COLORS[i], -1)
-                cv2.putText(frame, label, (x1 + 5, y1 + text_h + 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+            detections, is_valid, brightness = analyze_frame(analysis, captured_at, frame_size)
             
-            # Info general
-            total = sum(stable_counts)
-            status_text = f"Vehiculos: {total} | Brillo: {brightness:.0f}/255"
-            if not is_valid:
-                status_text += " | TAPADA"
+            # Antigüedad del frame al terminar el análisis
+            frame_age = time.monotonic() - captured_at
+            _report_capture_stats(grabber, frame_age)
+            if passthrough:
+                state.update_vision_stats(frames_decoded=frames_decoded)
             
-            status_color = (0, 255, 0) if is_valid else (0, 0, 255)
+            if not is_valid and frame_health.decision == DARK and frame_counter - last_warning > 30:
+                print(f"⚠️  Cámara tapada (brillo: {brightness:.1f}/255)")
+                last_warning = frame_counter
             
-            cv2.rectangle(frame, (0, h - 40), (w, h), (0, 0, 0), -1)
-            cv2.putText(frame, status_text, (10, h - 15),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
-            
-            # Indicador de estabilidad
-            stability_pct = min(100, (len(detection_history) / STABILITY_FRAMES) * 100)
-            stability_text = f"Estabilidad: {stability_pct:.0f}%"
-            cv2.putText(frame, stability_text, (w - 200, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-            
-            # Codificar frame
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                continue
-            
-            frame_bytes = buffer.tobytes()
-            
-            yield (
-                b'--frame\r\n'
-                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n'
-            )
+            if wants_render and frame is not None:
+                annotated = render_frame(frame, detections, is_valid, brightness)
+                _publish_annotated(annotated, time.time() - (time.monotonic() - captured_at))
             
             frame_counter += 1
-    
-    except Exception as e:
-        print(f"❌ Error en generate_frames: {e}")
-        import traceback
-        traceback.print_exc()
+            frames_processed += 1
+            frame_processed.set()
+            if frames_processed == 1:
+                startup.mark('first_frame')
     
     finally:
+        grabber.stop()
         cap.release()
         state.camera_active = False
         print("🔌 Cámara desconectada")
+    
+    return frames_processed, reason
+
+
+def _wants_render():
+    """True si algún visor (stream o snapshot) necesita el frame anotado"""
+    if not render_enabled:
+        return False
+    if frame_bus is not None:
+        return frame_bus.annotated.wanted()
+    return stream_hub.wants_frame() or snapshot_cache.wants_frame()
+
+
+def _wants_raw():
+    """True si hay clientes de la vista cruda"""
+    if frame_bus is not None:
+        return frame_bus.raw.wanted()
+    return stream_hub.wants_raw()
+
+
+def _publish_raw(item):
+    """Publicar el JPEG original (bytes) o el frame BGR sin anotar"""
+    if frame_bus is not None:
+        # Los frames BGR los codifica el proceso web
+        frame_bus.raw.write(item)
+        return
+    
+    if not isinstance(item, bytes):
+        ret, buffer = cv2.imencode('.jpg', item)
+        if not ret:
+            return
+        item = buffer.tobytes()
+    stream_hub.publish_raw(item)
+
+
+def _publish_annotated(annotated, captured_wall):
+    """Entregar el frame anotado a las variantes de stream y al snapshot"""
+    if frame_bus is not None:
+        frame_bus.annotated.write(annotated, captured_wall)
+        return
+    
+    if stream_hub.wants_frame():
+        stream_hub.publish_frame(annotated)
+    if snapshot_cache.wants_frame():
+        snapshot_cache.store(annotated, captured_wall)
+
+
+def _report_capture_stats(grabber, frame_age):
+    """Publicar en state los frames descartados y la antigüedad del frame procesado"""
+    global avg_frame_age
+    
+    avg_frame_age = frame_age if avg_frame_age is None else (
+        0.9 * avg_frame_age + 0.1 * frame_age
+    )
+    
+    capture_stats = grabber.get_stats()
+    state.update_vision_stats(
+        frames_captured=capture_stats['frames_captured'],
+        frames_dropped=capture_stats['frames_dropped'],
+        frame_age_ms=round(frame_age * 1000, 1),
+        avg_frame_age_ms=round(avg_frame_age * 1000, 1),
+    )
+
+
+def _vision_loop():
+    """Bucle del worker de visión: reconecta con backoff mientras esté activo"""
+    # Cargar el detector mientras se abre la cámara (queda cargado entre reconexiones)
+    threading.Thread(target=startup.warm_detector, daemon=True).start()
+    
+    while vision_running and not camera_manager.stopped:
+        source = camera_manager.open()
+        
+        if source is not None:
+            frames, reason = 0, 'error en worker de visión'
+            try:
+                frames, reason = _run_capture_session(*source)
+            except Exception as e:
+                print(f"❌ Error en worker de visión: {e}")
+                import traceback
+                traceback.print_exc()
+            camera_manager.disconnected(reason, had_frames=frames > 0)
+        
+        if vision_running and not camera_manager.stopped:
+            delay = camera_manager.next_delay()
+            print(f"🔄 Reintentando cámara en {delay:.1f}s "
+                  f"(intentos fallidos: {camera_manager.failed_attempts})")
+            camera_manager.wait(delay)
+    
+    stream_hub.close()
+    print("⏹️  Worker de visión detenido")
+
+
+def start_vision_worker(render=True, process=None):
+    """
+    Iniciar el worker de visión si no está corriendo (idempotente)
+    
+    Args:
+        render (bool): Dibujar y codificar frames para los visores MJPEG.
+                       Con False el worker solo cuenta vehículos (headless).
+        process (bool): Correrlo en un proceso aparte (None = VISION_PROCESS)
+    """
+    global _vision_thread, vision_running, render_enabled
+    
+    if process is None:
+        process = VISION_PROCESS and frame_bus is None
+    
+    if process:
+        from . import vision_process
+        stream_hub.open()
+        return vision_process.start(render=render)
+    
+    if frame_bus is None and not (_vision_thread and _vision_thread.is_alive()):
+        # En este mismo proceso corre una sola cámara: la principal del registro
+        # (dentro de un proceso de visión, vision_process ya configuró la suya)
+        from .cameras import get_camera_configs
+        configs = get_camera_configs()
+        if len(configs) > 1:
+            print(f"⚠️ {len(configs)} cámaras configuradas, pero sin proceso de visión "
+                  f"solo corre la principal ({configs[0].id})")
+        configure_camera(configs[0])
+    
+    with _vision_lock:
+        if _vision_thread and _vision_thread.is_alive():
+            return False
+        
+        vision_running = True
+        render_enabled = render
+        stream_hub.open()
+        camera_manager.start()
+        _vision_thread = threading.Thread(target=_vision_loop, daemon=True)
+        _vision_thread.start()
+        
+        print("👁️  Worker de visión iniciado")
+        return True
+
+
+def stop_vision_worker():
+    """Detener el worker de visión"""
+    global vision_running
+    
+    from . import vision_process
+    if vision_process.is_running():
+        vision_process.stop()
+        stream_hub.close()
+        return True
+    
+    if not vision_running:
+        return False
+    
+    vision_running = False
+    camera_manager.stop()
+    if _vision_thread:
+        _vision_thread.join(timeout=10)
+    
+    return True
+
+
+def generate_frames(width=None, fps=None, quality=None, raw=False):
+    """
+    Stream MJPEG para UN cliente: lee los frames del worker de visión
+    
+    Args:
+        width (int): Ancho del video (None = resolución de la cámara)
+        fps (float): Frames por segundo máximos (None = todos)
+        quality (int): Calidad JPEG 10-95 (None = 95)
+        raw (bool): Frames originales de la cámara, sin anotar (ignora
+                    width/fps/quality)
+    """
+    start_vision_worker()
+    
+    for frame_bytes in stream_hub.subscribe(width, fps, quality, raw=raw):
+        yield (
+            b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n'
+        )
 
 
 def test_camera():
@@ -286,8 +791,10 @@ def test_camera():
     
     print("✅ Cámara OK. Presiona 'q' para cerrar")
     
-    test_history = []
-    test_stable = [0] * 6
+    # Misma clase que el sistema en vivo, con política de promedio
+    test_stabilizer = CountStabilizer(n_zones=len(ZONES), window=STABILITY_FRAMES,
+                                      policy='mean', min_frames=3, mean_threshold=0.4)
+    test_stable = [0] * len(ZONES)
     
     while True:
         ret, frame = cap.read()
@@ -297,44 +804,15 @@ def test_camera():
         h, w, _ = frame.shape
         is_valid, brightness = is_image_valid(frame)
         
-        current = [0] * 6
+        current = [0] * len(ZONES)
         
         if is_valid:
-            results = model(frame, verbose=False, conf=MIN_CONFIDENCE)
-            
-            for r in results:
-                for box in r.boxes:
-                    cls = int(box.cls[0])
-                    if cls not in VEHICLE_CLASSES:
-                        continue
-                    
-                    if not is_valid_vehicle(box, w, h):
-                        continue
-                    
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cx = (x1 + x2) // 2
-                    cy = (y1 + y2) // 2
-                    
-                    for i, (zx1, zy1, zx2, zy2) in enumerate(ZONES):
-                        zone_x1 = int(zx1 * w)
-                        zone_y1 = int(zy1 * h)
-                        zone_x2 = int(zx2 * w)
-                        zone_y2 = int(zy2 * h)
-                        
-                        if zone_x1 <= cx <= zone_x2 and zone_y1 <= cy <= zone_y2:
-                            current[i] += 1
-                            break
-                    
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            detections, current = detect_vehicles(frame, imgsz=640, mode='full')
             
-            test_history.append(current)
-            if len(test_history) > STABILITY_FRAMES:
-                test_history.pop(0)
+            for x1, y1, x2, y2 in detections['xyxy'].tolist():
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             
-            if len(test_history) >= 3:
-                for i in range(6):
-                    avg = sum([f[i] for f in test_history]) / len(test_history)
-                    test_stable[i] = round(avg) if avg >= 0.4 else 0
+            test_stable = test_stabilizer.push(current)
         
         cv2.putText(frame, f"Instantaneo: {current}", (10, 30),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
@@ -352,11 +830,29 @@ def test_camera():
     cv2.destroyAllWindows()
 
 
+def _vision_process_running():
+    from . import vision_process
+    return vision_process.is_running()
+
+
+def _vision_process_stats():
+    from . import vision_process
+    return vision_process.get_stats()
+
+
 def get_camera_status():
     """Obtener estado actual de la cámara"""
     return {
         'active': state.camera_active,
+        'fault': state.get_camera_fault(),
+        'connection': state.get_camera_connection(),
+        'worker_running': vision_running or _vision_process_running(),
         'vehicle_count': state.vehicle_count,
         'counts_per_lane': state.vehicle_counts,
-        'stable': len(detection_history) >= STABILITY_FRAMES
+        'cameras': state.get_cameras(),
+        'stable': stabilizer.is_stable or COUNT_MODE == 'tracker',
+        'stream': stream_hub.get_stats(),
+        'pipeline': state.get_vision_stats(),
+        'startup': startup.get_startup_report(),
+        'process': _vision_process_stats()
     }
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Conexión resiliente a la cámara
+
+La apertura de la fuente (cv2.VideoCapture o MJPEG por HTTP) puede quedarse
+bloqueada varios segundos mientras la red hace timeout. El manager la corre
+en un hilo aparte con OPEN_TIMEOUT, así el worker de visión sigue
+respondiendo (detenerlo es inmediato), y reintenta con backoff exponencial
+con jitter: 1s, 2s, 4s... hasta BACKOFF_MAX, ±BACKOFF_JITTER.
+
+El estado de la conexión y la duración del corte se publican en
+state.camera_connection para el panel y el controlador.
+"""
+
+import random
+import threading
+import time
+from . import state
+
+# ===== CONFIGURACIÓN =====
+OPEN_TIMEOUT = 10.0      # Segundos máximos para abrir la fuente
+BACKOFF_INITIAL = 1.0    # Primer reintento
+BACKOFF_FACTOR = 2.0
+BACKOFF_MAX = 30.0       # Tope entre reintentos
+BACKOFF_JITTER = 0.25    # ±25% aleatorio para no reintentar en sincronía
+
+# Estados de la conexión
+STOPPED = 'stopped'
+CONNECTING = 'connecting'
+CONNECTED = 'connected'
+RECONNECTING = 'reconnecting'
+
+
+def backoff_delay(attempt, initial=BACKOFF_INITIAL, factor=BACKOFF_FACTOR,
+                  maximum=BACKOFF_MAX, jitter=BACKOFF_JITTER):
+    """
+    Espera antes del reintento número `attempt` (1, 2, 3...)
+
+    Returns:
+        float: Segundos, con jitter aplicado
+    """
+    delay = min(maximum, initial * factor ** max(0, attempt - 1))
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+class CameraManager:
+    """Abre la fuente sin bloquear y lleva el estado de la conexión"""
+
+    def __init__(self, open_source, release_source, open_timeout=OPEN_TIMEOUT):
+        """
+        Args:
+            open_source: Función que abre la fuente y devuelve un objeto
+                         (o None si no se pudo abrir)
+            release_source: Función que libera lo que devolvió open_source
+        """
+        self._open_source = open_source
+        self._release_source = release_source
+        self.open_timeout = open_timeout
+        self._stop = threading.Event()
+
+        self.status = STOPPED
+        self.failed_attempts = 0   # Intentos fallidos seguidos (define el backoff)
+        self.outages = 0           # Cortes desde que arrancó el worker
+        self.outage_started = None
+        self.last_error = None
+
+    # ----- Ciclo de vida -----
+
+    def start(self):
+        """Permitir conexiones (al arrancar el worker)"""
+        self._stop.clear()
+        self.failed_attempts = 0
+        self.outage_started = time.time()
+        self._set_status(CONNECTING)
+
+    def stop(self):
+        """Cortar esperas y aperturas en curso"""
+        self._stop.set()
+        self._set_status(STOPPED)
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def wait(self, seconds):
+        """
+        Esperar sin bloquear la detención
+
+        Returns:
+            bool: True si se pidió detener durante la espera
+        """
+        return self._stop.wait(seconds)
+
+    # ----- Apertura -----
+
+    def open(self):
+        """
+        Abrir la fuente en un hilo aparte
+
+        Returns:
+            El objeto de open_source, o None si falló, tardó más de
+            open_timeout o se detuvo el manager mientras tanto
+        """
+        lock = threading.Lock()
+        done = threading.Event()
+        result = {'source': None, 'error': None, 'abandoned': False}
+
+        def run():
+            try:
+                source = self._open_source()
+            except Exception as e:
+                source = None
+                result['error'] = str(e)
+
+            with lock:
+                if result['abandoned']:
+                    # Nadie la espera ya: liberarla si llegó a abrirse
+                    if source is not None:
+                        self._release_source(source)
+                    return
+                result['source'] = source
+            done.set()
+
+        threading.Thread(target=run, daemon=True).start()
+
+        deadline = time.monotonic() + self.open_timeout
+        while not done.wait(0.1):
+            if self.stopped or time.monotonic() >= deadline:
+                break
+
+        with lock:
+            if not done.is_set():
+                result['abandoned'] = True
+                result['error'] = 'detenido' if self.stopped else f'timeout ({self.open_timeout:.0f}s)'
+
+        source = result['source']
+        if source is None:
+            self.failed_attempts += 1
+            self.last_error = result['error'] or 'no se pudo abrir la fuente'
+            self._set_status(RECONNECTING if not self.stopped else STOPPED)
+            return None
+
+        self._connected()
+        return source
+
+    # ----- Estado -----
+
+    def _connected(self):
+        if self.outage_started is not None:
+            outage = time.time() - self.outage_started
+            if self.status == RECONNECTING:
+                print(f"✅ Cámara recuperada tras {outage:.1f}s sin video")
+            state.update_camera_connection(last_outage_seconds=round(outage, 1))
+        self.outage_started = None
+        self.last_error = None
+        self._set_status(CONNECTED)
+
+    def disconnected(self, reason, had_frames=True):
+        """
+        La sesión de captura terminó
+
+        Args:
+            reason: Motivo (para el panel)
+            had_frames: Si la sesión llegó a entregar frames; si no, cuenta
+                        como intento fallido y el backoff sigue creciendo
+        """
+        if had_frames:
+            self.failed_attempts = 0
+        else:
+            self.failed_attempts += 1
+
+        if self.outage_started is None:
+            self.outage_started = time.time()
+            self.outages += 1
+        self.last_error = reason
+        self._set_status(STOPPED if self.stopped else RECONNECTING)
+
+    def next_delay(self):
+        """Espera antes del próximo intento según los fallos seguidos"""
+        return backoff_delay(max(1, self.failed_attempts))
+
+    def _set_status(self, status):
+        self.status = status
+        state.update_camera_connection(
+            status=status,
+            outage_started=self.outage_started,
+            failed_attempts=self.failed_attempts,
+            outages=self.outages,
+            last_error=self.last_error,
+        )
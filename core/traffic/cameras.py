@@ -0,0 +1,151 @@
+"""
+Registro de cámaras configurado en settings.TRAFFIC_CAMERAS
+
+Cada cámara tiene su fuente, sus zonas y el carril (semáforo A-F) que cuenta
+cada zona. Con VISION_PROCESS cada cámara corre en su propio proceso de
+visión (vision_process.py) y el proceso web fusiona los conteos de todas en
+un solo vector por carril (fusion.py). Con varias cámaras cada proceso se
+fija a su propio grupo de núcleos y el detector usa un hilo por núcleo; una
+sola cámara no se fija y usa toda la máquina.
+
+Sin TRAFFIC_CAMERAS hay una sola cámara: camera.CAMERA_SOURCE con las zonas
+de zones.py, igual que antes.
+"""
+
+import os
+from .fusion import N_LANES
+
+DEFAULT_CAMERA_ID = 'principal'
+
+
+class CameraConfig:
+    """Una cámara del registro"""
+
+    def __init__(self, camera_id, source=None, zones=None, lanes=None, core=None):
+        """
+        Args:
+            camera_id: Identificador único (aparece en estado y logs)
+            source: URL, índice de webcam o None (= camera.CAMERA_SOURCE)
+            zones: Zonas propias (None = las de zones.py)
+            lanes: Carril de cada zona (None = zona i → carril i)
+            core: Núcleo o lista de núcleos para su proceso (None = asignación automática)
+        """
+        self.id = camera_id
+        self.source = source
+        self.zones = zones
+        self.core = core
+
+        n_zones = len(zones) if zones is not None else N_LANES
+        self.lanes = list(lanes) if lanes is not None else list(range(n_zones))
+
+        if len(self.lanes) != n_zones:
+            raise ValueError(f"Cámara {camera_id}: {n_zones} zonas pero {len(self.lanes)} carriles")
+        if any(not 0 <= lane < N_LANES for lane in self.lanes):
+            raise ValueError(f"Cámara {camera_id}: los carriles van de 0 a {N_LANES - 1}")
+
+    @property
+    def covered_lanes(self):
+        """Carriles que ve esta cámara"""
+        return sorted(set(self.lanes))
+
+    def __repr__(self):
+        return f"CameraConfig({self.id!r}, source={self.source!r}, lanes={self.lanes})"
+
+
+def get_camera_configs():
+    """
+    Leer el registro de cámaras desde settings
+
+    Returns:
+        list: CameraConfig en orden; la primera es la principal (la del video)
+    """
+    try:
+        from django.conf import settings
+        entries = getattr(settings, 'TRAFFIC_CAMERAS', None)
+    except Exception:
+        entries = None
+
+    if not entries:
+        return [CameraConfig(DEFAULT_CAMERA_ID)]
+
+    configs = [
+        CameraConfig(
+            entry.get('ID') or f'camara{i + 1}',
+            source=entry.get('SOURCE'),
+            zones=entry.get('ZONES'),
+            lanes=entry.get('LANES'),
+            core=entry.get('CORE'),
+        )
+        for i, entry in enumerate(entries)
+    ]
+
+    ids = [config.id for config in configs]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"IDs de cámara repetidos en TRAFFIC_CAMERAS: {ids}")
+    return configs
+
+
+# ===== NÚCLEOS DE CPU =====
+
+def available_cores():
+    """Núcleos en los que puede correr este proceso"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def assign_cores(configs):
+    """
+    Núcleos para el proceso de cada cámara
+
+    Una sola cámara sin CORE no se fija: sus hilos de inferencia usan toda
+    la máquina. Con varias, el primer núcleo queda para el proceso web
+    (servidor, controlador, streams) y el resto se reparte en grupos iguales
+    entre las cámaras sin CORE.
+
+    Returns:
+        list: Lista de núcleos por cámara, o None = sin fijar (mismo orden que configs)
+    """
+    if len(configs) == 1 and configs[0].core is None:
+        return [None]
+
+    cores = available_cores()
+    pool = cores[1:] if len(cores) > 1 else cores
+    automatic = sum(1 for config in configs if config.core is None)
+
+    # Grupos contiguos de tamaño parejo; con más cámaras que núcleos, en ronda
+    if automatic > len(pool):
+        groups = [[pool[i % len(pool)]] for i in range(automatic)]
+    else:
+        base, extra = divmod(len(pool), max(1, automatic))
+        groups, start = [], 0
+        for i in range(automatic):
+            size = base + (1 if i < extra else 0)
+            groups.append(pool[start:start + size])
+            start += size
+
+    assigned = []
+    for config in configs:
+        if config.core is not None:
+            core = config.core
+            assigned.append(sorted(core) if isinstance(core, (list, tuple, set)) else [core])
+        else:
+            assigned.append(groups.pop(0))
+    return assigned
+
+
+def pin_to_cores(cores):
+    """
+    Fijar el proceso actual a un grupo de núcleos
+
+    Returns:
+        bool: False si no hay que fijarlo o el sistema no lo permite (p. ej. en Windows)
+    """
+    if not cores or not hasattr(os, 'sched_setaffinity'):
+        return False
+    try:
+        os.sched_setaffinity(0, set(cores))
+        return True
+    except OSError as e:
+        print(f"⚠️ No se pudo fijar el proceso a los núcleos {cores}: {e}")
+        return False
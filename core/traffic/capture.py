@@ -0,0 +1,99 @@
+"""
+Captura desacoplada de la cámara
+
+Un hilo dedicado vacía continuamente el buffer de OpenCV/DroidCam y deja
+solo el frame más reciente en un slot, junto con su momento de captura.
+La etapa de inferencia toma siempre ese frame fresco: si YOLO tarda, los
+frames intermedios se descartan en vez de acumularse y atrasar los conteos.
+"""
+
+import threading
+import time
+
+
+class LatestFrameGrabber:
+    """Hilo lector con un solo slot para el último frame capturado"""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0
+        self._consumed_seq = 0
+        self._running = False
+        self._thread = None
+
+        # Estadísticas
+        self.frames_captured = 0
+        self.frames_dropped = 0  # Frames sobrescritos sin llegar a procesarse
+        self.failed = False
+
+    def start(self):
+        """Arrancar el hilo lector"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Detener el hilo lector (no libera la cámara)"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while self._running:
+            success, frame = self.cap.read()
+            captured_at = time.monotonic()
+
+            with self._cond:
+                if not success:
+                    self.failed = True
+                    self._running = False
+                    self._cond.notify_all()
+                    break
+
+                # El frame anterior nunca fue leído → se descarta
+                if self._seq > self._consumed_seq:
+                    self.frames_dropped += 1
+
+                self._frame = frame
+                self._timestamp = captured_at
+                self._seq += 1
+                self.frames_captured += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=2.0):
+        """
+        Obtener el frame más reciente que aún no se haya procesado
+
+        Returns:
+            tuple: (frame, captured_at) o (None, None) si no llegó ninguno
+                   a tiempo o la cámara falló
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq > self._consumed_seq or not self._running,
+                timeout=timeout
+            )
+
+            if self._seq <= self._consumed_seq:
+                return None, None
+
+            self._consumed_seq = self._seq
+            return self._frame, self._timestamp
+
+    @property
+    def is_alive(self):
+        return self._running and not self.failed
+
+    def get_stats(self):
+        """Estadísticas de captura"""
+        with self._cond:
+            return {
+                'frames_captured': self.frames_captured,
+                'frames_dropped': self.frames_dropped,
+            }
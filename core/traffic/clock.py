@@ -0,0 +1,165 @@
+"""
+Reloj del controlador y del Arduino
+
+Todas las esperas del controlador, del planificador de luces y del Arduino
+pasan por este módulo en lugar de llamar a time directamente. Normalmente
+es el reloj real; una simulación (ver simulation.py) instala un
+SimulatedClock con use_clock() y las mismas esperas avanzan el tiempo al
+instante, así un día completo de ciclos corre en segundos con el código
+real de decisión y secuenciación.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RealClock:
+    """Reloj de pared: delega en time y en las primitivas de threading"""
+
+    simulated = False
+
+    def now(self):
+        """Segundos monotónicos"""
+        return time.monotonic()
+
+    def time(self):
+        """Hora de pared (time.time)"""
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, cond, timeout):
+        """Condition.wait (con el lock de cond tomado)"""
+        return cond.wait(timeout)
+
+    def wait_event(self, event, timeout):
+        """Event.wait"""
+        return event.wait(timeout)
+
+
+class SimulatedClock:
+    """
+    Reloj virtual que avanza al instante
+
+    Pensado para correr todo en un solo hilo: una espera no bloquea, adelanta
+    el reloj hasta el timeout (o hasta el primer callback programado que
+    cae antes, por si ese callback cambia lo que se esperaba).
+    """
+
+    simulated = True
+
+    def __init__(self, start=0.0, wall_start=None):
+        """
+        Args:
+            start: Valor inicial de now()
+            wall_start: Hora de pared equivalente a start (None = ahora)
+        """
+        self._now = start
+        self._wall_offset = (time.time() if wall_start is None else wall_start) - start
+        self._callbacks = []   # (instante, orden, función)
+        self._order = itertools.count()
+        self._lock = threading.RLock()
+
+    def now(self):
+        return self._now
+
+    def time(self):
+        return self._now + self._wall_offset
+
+    def call_at(self, at, callback):
+        """Programar callback() cuando el reloj llegue a `at`"""
+        with self._lock:
+            heapq.heappush(self._callbacks, (at, next(self._order), callback))
+
+    def advance(self, seconds, stop_on_callback=False):
+        """
+        Adelantar el reloj corriendo los callbacks que vencen en el camino
+
+        Args:
+            stop_on_callback: Detenerse después del primer callback
+
+        Returns:
+            bool: True si se corrió algún callback
+        """
+        target = self._now + max(0.0, seconds)
+        ran = False
+
+        while True:
+            with self._lock:
+                if not self._callbacks or self._callbacks[0][0] > target:
+                    break
+                at, _, callback = heapq.heappop(self._callbacks)
+                self._now = max(self._now, at)
+            callback()
+            ran = True
+            if stop_on_callback:
+                return True
+
+        self._now = target
+        return ran
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, cond, timeout):
+        if timeout is None:
+            raise RuntimeError("Espera sin timeout con reloj simulado: nada la despertaría")
+        self.advance(timeout, stop_on_callback=True)
+        return False
+
+    def wait_event(self, event, timeout):
+        if event.is_set():
+            return True
+        if timeout is None:
+            raise RuntimeError("Espera sin timeout con reloj simulado: nada la despertaría")
+
+        target = self._now + timeout
+        while self._now < target and not event.is_set():
+            if not self.advance(target - self._now, stop_on_callback=True):
+                break
+        return event.is_set()
+
+
+# ===== RELOJ ACTUAL =====
+_clock = RealClock()
+
+
+def get_clock():
+    return _clock
+
+
+@contextmanager
+def use_clock(clock):
+    """Usar otro reloj (ej: SimulatedClock) dentro del bloque"""
+    global _clock
+
+    previous = _clock
+    _clock = clock
+    try:
+        yield clock
+    finally:
+        _clock = previous
+
+
+def now():
+    return _clock.now()
+
+
+def wall_time():
+    return _clock.time()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def wait(cond, timeout):
+    return _clock.wait(cond, timeout)
+
+
+def wait_event(event, timeout):
+    return _clock.wait_event(event, timeout)
@@ -1,32 +1,140 @@
-import time
 import threading
-from .logic import select_best_phase, get_lanes_to_activate, should_system_run, get_traffic_level
+import time
+from collections import deque
+from .logic import decide_phase, get_lanes_to_activate, should_system_run, get_traffic_level
 from .arduino import set_light, all_red
-from . import state
+from .scheduler import LightScheduler, LightEvent, ALL_LANES
+from . import clock, state
 
 # ===== CONFIGURACIÓN DE TIEMPOS (REALISTAS) =====
 YELLOW_TIME = 3          # Tiempo en amarillo (segundos) - Semáforo real: 3-4s
 RED_CLEARANCE = 2        # Tiempo de seguridad con todos en rojo (segundos)
 WAIT_INTERVAL = 5        # Segundos entre verificaciones cuando no hay tráfico
+LANE_STAGGER = 0.2       # Separación entre los cambios de luz de cada carril
+CYCLE_PAUSE = 2          # Pausa entre ciclos (solo sin PIPELINE_PLANNING)
+ERROR_PAUSE = 5          # Pausa tras un error en el ciclo automático
+STOP_TIMEOUT = 2         # Segundos máximos esperando al hilo del controlador al detenerlo
+CYCLE_STATS_WINDOW = 100 # Ciclos recientes para las estadísticas de decisión
 
 # NOTA: En semáforos reales:
 # - Amarillo: 3-4 segundos (suficiente para que los carros frenen)
 # - Todo rojo: 1-2 segundos (clearance de seguridad)
 # - Verde mínimo: 15-20 segundos (ver logic.py)
 
+# Guardar cada ciclo en TrafficCycle (la simulación lo desactiva)
+RECORD_CYCLES = True
+
+# Decidir el próximo ciclo durante el amarillo/rojo del actual (sin pausa entre ciclos)
+PIPELINE_PLANNING = True
+
+# ===== MODO ACTUADO =====
+# Durante el verde el controlador escucha cada cambio de conteo (state.add_counts_listener):
+# - Gap-out: si los carriles de una subfase quedan vacíos, su verde termina GAP_TIME
+#   después (respetando MIN_GREEN_TIME)
+# - Extensión: cada llegada (sube el conteo de un carril de la subfase en verde) asegura
+#   EXTENSION_TIME más de verde, hasta MAX_GREEN_TIME. Los cambios en carriles en rojo
+#   o un conteo trabado no la alargan
+ACTUATED_MODE = False
+GAP_TIME = 2.0              # Segundos de verde tras quedar vacíos los carriles
+EXTENSION_TIME = 3.0        # Segundos de verde asegurados tras cada cambio con vehículos
+ACTUATION_TOLERANCE = 0.1   # Correcciones menores a esto no se aplican
+
 # Control del ciclo
 controller_running = False
 controller_thread = None
 cycle_in_progress = False  # NUEVO: indicador de ciclo activo
+_stop_event = threading.Event()  # Despierta las pausas del ciclo automático al detenerlo
+cycle_stats = deque(maxlen=CYCLE_STATS_WINDOW)  # Latencia de decisión y tiempo muerto por ciclo
+
+# Los cambios de luz de cada ciclo se ejecutan como un plan de eventos
+# (ver scheduler.py): cancelable, y el verde se puede alargar o acortar
+scheduler = LightScheduler(set_light, all_red)
+
+
+# ===== PLANES DE LUCES =====
+
+def build_plan(subphases):
+    """
+    Plan de un ciclo: todos en rojo, arranque simultáneo de las subfases y
+    apagado escalonado (cada subfase termina según su propio verde)
+    
+    Args:
+        subphases: Lista de (nombre, carriles, segundos de verde)
+    
+    Returns:
+        list: LightEvent con instantes relativos al inicio del ciclo
+    """
+    # PASO 1: SEGURIDAD - Todos en ROJO
+    events = [LightEvent(0.0, ALL_LANES, 'R', 'clear')]
+    
+    # PASO 2: TODOS en VERDE al mismo tiempo (con una pausa entre carriles)
+    start_lanes = [(name, lane) for name, lanes, _ in subphases for lane in lanes]
+    for i, (name, lane) in enumerate(start_lanes):
+        events.append(LightEvent(RED_CLEARANCE + i * LANE_STAGGER, lane, 'G', name))
+    
+    # PASO 3: Cada subfase pasa a AMARILLO y a ROJO al terminar su verde
+    for name, lanes, green_time in subphases:
+        green_end = RED_CLEARANCE + green_time
+        for i, lane in enumerate(lanes):
+            events.append(LightEvent(green_end + i * LANE_STAGGER, lane, 'Y', name))
+            events.append(LightEvent(green_end + YELLOW_TIME + i * LANE_STAGGER, lane, 'R', name))
+    
+    return events
+
+
+def run_plan(events, on_clearing=None, on_green=None):
+    """
+    Ejecutar un plan de luces (bloquea hasta que termina o se cancela)
+    
+    Args:
+        on_clearing: Función a llamar cuando sale el último amarillo (ver scheduler.run)
+        on_green: Función a llamar cuando sale el primer verde
+    
+    Returns:
+        tuple: (completado, segundos transcurridos)
+    """
+    global cycle_in_progress
+    
+    cycle_in_progress = True
+    start = clock.now()
+    try:
+        completed = scheduler.run(events, on_clearing, on_green)
+    finally:
+        cycle_in_progress = False
+    
+    return completed, clock.now() - start
+
+
+def extend_green(seconds, group=None):
+    """
+    Alargar (o acortar, con seconds < 0) el verde en curso
+    
+    Args:
+        group: Nombre de la subfase (ej: 'AVENIDA_IDA'); None = todas las que siguen en verde
+    
+    Returns:
+        float: Segundos que se corrió el fin del verde (0 si no había verde)
+    """
+    shifted = scheduler.extend(seconds, group)
+    if shifted:
+        action = 'extendido' if shifted > 0 else 'acortado'
+        print(f"⏱️  Verde {action} {abs(shifted):.1f}s ({group or 'todas las subfases'})")
+    return shifted
+
+
+def end_green(group=None):
+    """Terminar ya el verde en curso (pasa a amarillo ahora)"""
+    return extend_green(-float('inf'), group)
 
 
 def execute_phase(phase, green_time):
     """
     Ejecutar UNA FASE completa del sistema
     Puede activar MÚLTIPLES semáforos en verde simultáneamente
-    """
-    global cycle_in_progress
     
+    Returns:
+        tuple: (phase_id, segundos); phase_id es None si se interrumpió
+    """
     lanes = get_lanes_to_activate(phase)
     lanes_str = ', '.join([f"{l}({chr(ord('A')+l)})" for l in lanes])
     
@@ -35,258 +143,288 @@ def execute_phase(phase, green_time):
     print(f"{'='*60}")
     print(f"🟢 Carriles en VERDE: {lanes_str}")
     print(f"⏱️  Tiempo: {green_time} segundos")
+    print(f"🔴 Todos en ROJO {RED_CLEARANCE}s → 🟢 verde {green_time}s → 🟡 amarillo {YELLOW_TIME}s → 🔴 rojo")
     
-    cycle_in_progress = True  # MARCAR QUE ESTAMOS EN CICLO
+    completed, elapsed = run_plan(build_plan([(phase['name'], lanes, green_time)]))
     
-    # FASE 1: SEGURIDAD - Todos en ROJO
-    print(f"\n🔴 Fase 1: TODOS en ROJO por {RED_CLEARANCE}s (seguridad)")
-    all_red()
-    time.sleep(RED_CLEARANCE)
-    
-    # FASE 2: VERDE - Activar semáforos de la fase
-    print(f"🟢 Fase 2: Activando semáforos...")
-    for lane in lanes:
-        print(f"   → Carril {lane} ({chr(ord('A')+lane)}) en VERDE")
-        set_light(lane, 'G')
-        time.sleep(0.2)  # Pausa entre activaciones
-    
-    print(f"⏱️  Manteniendo verde por {green_time}s...")
-    time.sleep(green_time)
-    
-    # FASE 3: AMARILLO
-    print(f"🟡 Fase 3: Amarillo en carriles activos...")
-    for lane in lanes:
-        print(f"   → Carril {lane} ({chr(ord('A')+lane)}) en AMARILLO")
-        set_light(lane, 'Y')
-        time.sleep(0.2)
-    
-    time.sleep(YELLOW_TIME)
-    
-    # FASE 4: ROJO
-    print(f"🔴 Fase 4: Rojo en carriles activos...")
-    for lane in lanes:
-        print(f"   → Carril {lane} ({chr(ord('A')+lane)}) en ROJO")
-        set_light(lane, 'R')
-        time.sleep(0.2)
-    
-    cycle_in_progress = False  # CICLO TERMINADO
-    
-    total_time = RED_CLEARANCE + green_time + YELLOW_TIME
-    print(f"\n✅ FASE COMPLETADA en {total_time} segundos")
+    if completed:
+        print(f"\n✅ FASE COMPLETADA en {elapsed:.1f} segundos")
+    else:
+        print(f"\n⏹️  FASE INTERRUMPIDA a los {elapsed:.1f} segundos")
     print(f"{'='*60}\n")
     
-    return phase['id'], total_time
+    return (phase['id'] if completed else None), elapsed
 
 
-def traffic_controller():
+class CyclePlan:
+    """Decisión de un ciclo: fase ganadora y subfases con su propio verde"""
+    
+    def __init__(self, phase, subphases, frozen_counts, labels, decision_ms, ciclos_grupo):
+        self.phase = phase
+        self.subphases = subphases          # [(nombre, carriles, segundos de verde)]
+        self.frozen_counts = frozen_counts
+        self.labels = labels                # [(etiqueta, vehículos, segundos)] para los logs
+        self.decision_ms = decision_ms      # Tiempo que tomó decidir
+        self.ciclos_grupo = ciclos_grupo    # state.ciclos_grupo_actual cuando el ciclo arranque
+        self.green_start = None             # Instante (clock) del primer verde
+        self.green_end = None               # Instante (clock) del último amarillo
+        self.dead_time = None               # Segundos sin verde desde el ciclo anterior
+        self.green_shift = {}               # Subfase → segundos corridos por el modo actuado
+    
+    @property
+    def group(self):
+        return self.phase.get('group')
+    
+    @property
+    def green_time(self):
+        return max(tiempo for _, _, tiempo in self.subphases)
+
+
+def plan_cycle(counts=None, last_phase=None):
     """
-    Ejecutar UN CICLO INTELIGENTE del controlador
+    Decidir el próximo ciclo sin tocar las luces ni state
     
-    IMPORTANTE: CONGELA los conteos al inicio para evitar cambios durante el ciclo
+    IMPORTANTE: CONGELA los conteos; el ciclo no cambia aunque cambien después.
+    La última fase y el contador de justicia se actualizan recién cuando el
+    ciclo arranca (run_cycle): un plan descartado no cuenta como ciclo.
     
     NUEVA LÓGICA AVENIDAS:
     - Si el grupo ganador es AVENIDA, ejecuta AMBAS subfases (IDA y VUELTA)
     - Cada subfase tiene su propio tiempo proporcional a sus vehículos
+    
+    Args:
+        counts: Conteos a usar (None = los actuales de state)
+        last_phase: Última fase decidida (None = state.last_phase)
+    
+    Returns:
+        CyclePlan o None si no hay vehículos
     """
-    from .logic import PHASES, calculate_phase_priority
+    from .logic import PHASES, MIN_GREEN_TIME, calculate_phase_priority
+    
+    started = time.perf_counter()
     
     # 🔒 CONGELAR conteos al inicio del ciclo
-    frozen_counts = getattr(state, "vehicle_counts", [0] * 6).copy()
-    last_phase = getattr(state, "last_phase", -1)
+    if counts is None:
+        counts = getattr(state, "vehicle_counts", [0] * 6)
+    frozen_counts = list(counts)
+    if last_phase is None:
+        last_phase = getattr(state, "last_phase", -1)
     
     print(f"\n🔒 CONTEOS CONGELADOS PARA ESTE CICLO: {frozen_counts}")
     
     # Verificar si hay vehículos
     if not should_system_run(frozen_counts):
         print(f"\n⏸️  SISTEMA EN ESPERA - Sin vehículos detectados")
-        all_red()
-        return None, 0
+        return None
     
     # Seleccionar mejor fase CON LOS CONTEOS CONGELADOS
-    phase, green_time = select_best_phase(frozen_counts, last_phase)
+    phase, green_time, ciclos_grupo = decide_phase(
+        frozen_counts, last_phase, getattr(state, "ciclos_grupo_actual", 0)
+    )
     
     if phase is None or green_time == 0:
         print(f"\n⏸️  NO se ejecutó ciclo - Sin vehículos suficientes")
-        all_red()
-        return None, 0
-    
-    # Verificar si la fase seleccionada es del grupo AVENIDA o INTERSECCION
-    from .logic import PHASES, calculate_phase_priority, MIN_GREEN_TIME
+        return None
     
+    # Subfases del grupo ganador (AVENIDA o INTERSECCION)
     group_name = phase.get('group')
     
     if group_name == 'AVENIDA':
-        # ============================================
         # AVENIDA: ARRANQUE SIMULTÁNEO, APAGADO ESCALONADO
-        # ============================================
         print(f"\n🚗 GRUPO AVENIDA - ARRANQUE SIMULTÁNEO")
-        
-        fase_a = None  # IDA
-        fase_b = None  # VUELTA
-        for p in PHASES:
-            if p['name'] == 'AVENIDA_IDA':
-                fase_a = p
-            elif p['name'] == 'AVENIDA_VUELTA':
-                fase_b = p
-        
-        veh_a, tiempo_a = calculate_phase_priority(frozen_counts, fase_a)
-        veh_b, tiempo_b = calculate_phase_priority(frozen_counts, fase_b)
-        
-        label_a = "SUPERIOR (B+C → sem B+E)"
-        label_b = "INFERIOR (E+F → sem C+F)"
-        
+        names = (('AVENIDA_IDA', "SUPERIOR (B+C → sem B+E)"),
+                 ('AVENIDA_VUELTA', "INFERIOR (E+F → sem C+F)"))
     elif group_name == 'INTERSECCION':
-        # ============================================
         # INTERSECCIONES: ARRANQUE SIMULTÁNEO, APAGADO ESCALONADO
-        # ============================================
         print(f"\n🏙️ GRUPO INTERSECCIONES - ARRANQUE SIMULTÁNEO")
+        names = (('INTERSEC_A', "INTERSEC_A (A)"),
+                 ('INTERSEC_D', "INTERSEC_D (D)"))
+    else:
+        # Fase desconocida: solo esa fase con su tiempo
+        names = ()
+    
+    labels = []
+    subphases = []
+    for name, label in names:
+        fase = next(p for p in PHASES if p['name'] == name)
+        veh, tiempo = calculate_phase_priority(frozen_counts, fase)
+        if veh > 0:
+            tiempo = max(tiempo, MIN_GREEN_TIME)   # Igual que la fase elegida en decide_phase
+        labels.append((label, veh, tiempo))
+        print(f"   🔵 {label}: {veh} carros → {tiempo}s verde")
         
-        fase_a = None  # INTERSEC_A
-        fase_b = None  # INTERSEC_D
-        for p in PHASES:
-            if p['name'] == 'INTERSEC_A':
-                fase_a = p
-            elif p['name'] == 'INTERSEC_D':
-                fase_b = p
-        
-        veh_a, tiempo_a = calculate_phase_priority(frozen_counts, fase_a)
-        veh_b, tiempo_b = calculate_phase_priority(frozen_counts, fase_b)
-        
-        label_a = "INTERSEC_A (A)"
-        label_b = "INTERSEC_D (D)"
+        # Si una subfase tiene 0 carros, NO se enciende
+        if veh > 0:
+            subphases.append((fase['name'], fase['lanes'], tiempo))
     
-    else:
-        # Fase desconocida, ejecutar normalmente
-        phase_id, cycle_time = execute_phase(phase, green_time)
-        state.last_phase = phase_id
-        return phase_id, cycle_time
+    if not names:
+        subphases = [(phase['name'], get_lanes_to_activate(phase), green_time)]
+    if not subphases:
+        # Ninguna tiene carros (no debería llegar aquí)
+        return None
+    
+    decision_ms = (time.perf_counter() - started) * 1000
+    return CyclePlan(phase, subphases, frozen_counts, labels, decision_ms, ciclos_grupo)
+
+
+def run_cycle(cycle, previous=None, on_clearing=None):
+    """
+    Ejecutar un ciclo ya decidido
     
-    # ============================================
-    # LÓGICA COMÚN: ARRANQUE SIMULTÁNEO + APAGADO ESCALONADO
-    # Si una subfase tiene 0 carros, NO se enciende
-    # ============================================
+    Todas las subfases con carros arrancan en VERDE al mismo tiempo; la que
+    tiene MENOS carros se apaga primero.
     
-    print(f"   🔵 {label_a}: {veh_a} carros → {tiempo_a}s verde")
-    print(f"   🔵 {label_b}: {veh_b} carros → {tiempo_b}s verde")
+    Args:
+        cycle: CyclePlan
+        previous: CyclePlan anterior si este va inmediatamente después (para el tiempo muerto)
+        on_clearing: Función a llamar cuando terminan todos los verdes (amarillo/rojo)
     
-    cycle_in_progress = True
+    Returns:
+        tuple: (phase_id, segundos) o (None, segundos) si se interrumpió
+    """
+    group_name = cycle.group
+    
+    if scheduler.stopped:
+        # Parada (emergencia o stop) entre la decisión y el arranque
+        print(f"\n⏹️  CICLO {group_name} DESCARTADO: controlador detenido")
+        return None, 0.0
+    
+    # El ciclo arranca: recién ahora cuenta para la justicia entre grupos
+    state.last_phase = cycle.phase['id']
+    state.ciclos_grupo_actual = cycle.ciclos_grupo
     
-    # PASO 1: SEGURIDAD - Todos en ROJO
     print(f"\n🔴 PASO 1: Todos en ROJO por {RED_CLEARANCE}s (seguridad)")
-    all_red()
-    time.sleep(RED_CLEARANCE)
-    
-    # ============================================
-    # ARRANQUE SIMULTÁNEO + APAGADO ESCALONADO
-    # Los 4 semáforos de avenida arrancan en VERDE al mismo tiempo
-    # El que tiene MENOS carros se apaga primero
-    # ============================================
-    
-    # Caso 1: AMBAS tienen vehículos → arranque simultáneo
-    if veh_a > 0 and veh_b > 0:
-        # Determinar cuál tiene más y cuál menos tiempo
-        if tiempo_a >= tiempo_b:
-            fase_larga, fase_corta = fase_a, fase_b
-            tiempo_largo, tiempo_corto = tiempo_a, tiempo_b
-            label_larga, label_corta = label_a, label_b
-        else:
-            fase_larga, fase_corta = fase_b, fase_a
-            tiempo_largo, tiempo_corto = tiempo_b, tiempo_a
-            label_larga, label_corta = label_b, label_a
-        
-        # PASO 2: TODOS en VERDE al mismo tiempo
-        print(f"\n🟢 PASO 2: TODOS en VERDE")
-        all_lanes = fase_a['lanes'] + fase_b['lanes']
-        for lane in all_lanes:
-            print(f"   → Carril {lane} ({chr(ord('A')+lane)}) en VERDE")
-            set_light(lane, 'G')
-            time.sleep(0.2)
-        
-        # PASO 3: Esperar el tiempo de la subfase CORTA (ambas en verde)
-        print(f"\n⏱️  PASO 3: Todos en verde por {tiempo_corto}s...")
-        time.sleep(tiempo_corto)
-        
-        # PASO 4: La de MENOS carros se apaga (la otra sigue en verde)
-        tiempo_restante = tiempo_largo - tiempo_corto
-        
-        if tiempo_restante > 0:
-            print(f"\n🟡 PASO 4: {label_corta} se apaga (menos carros)")
-            for lane in fase_corta['lanes']:
-                set_light(lane, 'Y')
-                time.sleep(0.2)
-            time.sleep(YELLOW_TIME)
-            
-            for lane in fase_corta['lanes']:
-                set_light(lane, 'R')
-                time.sleep(0.2)
-            
-            # PASO 5: La larga sigue en verde el tiempo restante
-            print(f"\n🟢 PASO 5: {label_larga} sigue VERDE por {tiempo_restante}s más...")
-            time.sleep(tiempo_restante)
-        
-        # PASO 6: La de MÁS carros también se apaga
-        print(f"\n🟡 PASO 6: {label_larga} se apaga")
-        for lane in fase_larga['lanes']:
-            set_light(lane, 'Y')
-            time.sleep(0.2)
-        time.sleep(YELLOW_TIME)
-        
-        for lane in fase_larga['lanes']:
-            set_light(lane, 'R')
-            time.sleep(0.2)
-        
-        total_time = RED_CLEARANCE + tiempo_largo + YELLOW_TIME
-        if tiempo_restante > 0:
-            total_time += YELLOW_TIME
-    
-    # Caso 2: SOLO una tiene vehículos → solo encender esa
-    elif veh_a > 0:
-        print(f"\n🟢 Solo {label_a} tiene carros")
-        for lane in fase_a['lanes']:
-            set_light(lane, 'G')
-            time.sleep(0.2)
+    print(f"🟢 PASO 2: VERDE en {', '.join(name for name, _, _ in cycle.subphases)}")
+    for name, _, tiempo in sorted(cycle.subphases, key=lambda s: s[2]):
+        print(f"🟡 {name} pasa a amarillo a los {tiempo}s de verde")
+    
+    def clearing():
+        cycle.green_end = clock.now()
+        if on_clearing is not None:
+            on_clearing()
+    
+    cycle.green_start = clock.now() + RED_CLEARANCE
+    if previous is not None and previous.green_end is not None:
+        cycle.dead_time = cycle.green_start - previous.green_end
+    
+    # Modo actuado: los cambios de conteo llegan al instante desde state, y al
+    # arrancar el verde se revisan los conteos actuales (un carril que se vació
+    # durante el rojo de seguridad no vuelve a avisar)
+    listener = None
+    green_started = None
+    if ACTUATED_MODE:
+        listener = lambda counts, previous: _actuate(cycle, counts, previous)
+        state.add_counts_listener(listener)
         
-        time.sleep(tiempo_a)
-        
-        for lane in fase_a['lanes']:
-            set_light(lane, 'Y')
-            time.sleep(0.2)
-        time.sleep(YELLOW_TIME)
-        for lane in fase_a['lanes']:
-            set_light(lane, 'R')
-            time.sleep(0.2)
-        
-        total_time = RED_CLEARANCE + tiempo_a + YELLOW_TIME
+        def green_started():
+            counts = state.get_vehicle_counts()
+            _actuate(cycle, counts, counts)
+    try:
+        completed, total_time = run_plan(build_plan(cycle.subphases), on_clearing=clearing,
+                                         on_green=green_started)
+    finally:
+        if listener is not None:
+            state.remove_counts_listener(listener)
+    
+    if not completed:
+        print(f"\n⏹️  CICLO {group_name} INTERRUMPIDO a los {total_time:.1f}s")
+        return None, total_time
+    
+    print(f"\n✅ CICLO {group_name} COMPLETO en {total_time:.1f}s")
+    print("   " + " | ".join(f"{label}: {veh} carros ({tiempo}s)" for label, veh, tiempo in cycle.labels))
+    if cycle.green_shift:
+        print("   🎛️ Verde actuado: " + ", ".join(
+            f"{name} {shift:+.1f}s" for name, shift in cycle.green_shift.items()))
+    
+    dead_time = f"{cycle.dead_time:.1f}s" if cycle.dead_time is not None else "-"
+    print(f"   ⚡ Decisión: {cycle.decision_ms:.1f}ms | tiempo muerto entre verdes: {dead_time}")
+    cycle_stats.append({
+        'phase': cycle.phase['name'],
+        'decision_ms': round(cycle.decision_ms, 2),
+        'dead_time': round(cycle.dead_time, 2) if cycle.dead_time is not None else None,
+        'green_shift': round(sum(cycle.green_shift.values()), 2),
+    })
+    
+    # Guardar datos en la base de datos
+    if RECORD_CYCLES:
+        _record_cycle(cycle.phase, cycle.frozen_counts, cycle.green_time,
+                      cycle.decision_ms, cycle.dead_time)
+    
+    return cycle.phase['id'], total_time
+
+
+def _actuate(cycle, counts, previous):
+    """
+    Modo actuado: correr el fin de verde de cada subfase según los conteos nuevos
+    
+    Se llama desde state.update_vehicle_counts (hilo de visión) mientras el
+    ciclo está en curso, y una vez al salir el primer verde con los conteos
+    de ese momento; los cambios pasan por scheduler.extend.
+    
+    Args:
+        cycle: CyclePlan en curso
+        counts: Conteos nuevos por carril
+        previous: Conteos anteriores (para distinguir llegadas de otros cambios)
+    """
+    from .logic import MIN_GREEN_TIME, MAX_GREEN_TIME
     
-    elif veh_b > 0:
-        print(f"\n🟢 Solo {label_b} tiene carros")
-        for lane in fase_b['lanes']:
-            set_light(lane, 'G')
-            time.sleep(0.2)
+    now = clock.now()
+    if cycle.green_start is None or now < cycle.green_start:
+        return  # Todavía en el rojo de seguridad
+    
+    for name, lanes, _ in cycle.subphases:
+        remaining = scheduler.green_remaining(name)
+        if remaining <= 0:
+            continue  # Esta subfase ya pasó a amarillo
         
-        time.sleep(tiempo_b)
+        green_end = now + remaining
+        vehicles = sum(counts[lane] for lane in lanes)
         
-        for lane in fase_b['lanes']:
-            set_light(lane, 'Y')
-            time.sleep(0.2)
-        time.sleep(YELLOW_TIME)
-        for lane in fase_b['lanes']:
-            set_light(lane, 'R')
-            time.sleep(0.2)
+        if vehicles == 0:
+            # GAP-OUT: carriles vacíos → terminar el verde pronto
+            target = max(now + GAP_TIME, cycle.green_start + MIN_GREEN_TIME)
+            if target >= green_end - ACTUATION_TOLERANCE:
+                continue
+        elif any(counts[lane] > previous[lane] for lane in lanes):
+            # EXTENSIÓN: llegó un vehículo a un carril en verde → alargar hasta el máximo
+            target = min(now + EXTENSION_TIME, cycle.green_start + MAX_GREEN_TIME)
+            if target <= green_end + ACTUATION_TOLERANCE:
+                continue
+        else:
+            continue  # Sin llegadas en esta subfase (el cambio fue en otro carril)
         
-        total_time = RED_CLEARANCE + tiempo_b + YELLOW_TIME
-    
-    else:
-        # Ninguna tiene carros (no debería llegar aquí)
-        cycle_in_progress = False
-        return None, 0
-    
-    cycle_in_progress = False
+        shifted = scheduler.extend(target - green_end, name)
+        if shifted:
+            cycle.green_shift[name] = cycle.green_shift.get(name, 0.0) + shifted
+            if vehicles == 0:
+                print(f"🎛️ GAP-OUT {name}: carriles vacíos, amarillo en {target - now:.1f}s")
+
+
+def traffic_controller():
+    """
+    Ejecutar UN CICLO INTELIGENTE del controlador (decidir + ejecutar)
     
-    print(f"\n✅ CICLO {group_name} COMPLETO en {total_time}s")
-    print(f"   {label_a}: {veh_a} carros ({tiempo_a}s) | {label_b}: {veh_b} carros ({tiempo_b}s)")
+    Es una orden explícita (ciclo manual): si un stop anterior dejó detenido
+    el planificador, se vuelve a aceptar planes. Un plan decidido antes de
+    ese stop (el del ciclo automático) ya no llega a arrancar.
     
-    # Guardar datos en la base de datos
+    Returns:
+        tuple: (phase_id, segundos), (None, 0) sin tráfico o (None, None) si
+               el ciclo se descartó o se interrumpió
+    """
+    scheduler.reset()
+    cycle = plan_cycle()
+    if cycle is None:
+        all_red()
+        return None, 0
+    phase_id, elapsed = run_cycle(cycle)
+    if phase_id is None:
+        return None, None
+    return phase_id, elapsed
+
+
+def _record_cycle(phase, frozen_counts, green_time, decision_ms=None, dead_time=None):
+    """Guardar un ciclo completado en TrafficCycle"""
     try:
         from .models import TrafficCycle
         TrafficCycle.objects.create(
@@ -297,15 +435,35 @@ def traffic_controller():
             zone_d_count=frozen_counts[3],
             zone_e_count=frozen_counts[4],
             zone_f_count=frozen_counts[5],
-            green_time=max(tiempo_a, tiempo_b),
-            total_vehicles=sum(frozen_counts)
+            green_time=green_time,
+            total_vehicles=sum(frozen_counts),
+            decision_ms=decision_ms,
+            dead_time=dead_time,
         )
         print(f"💾 Datos guardados en BD")
     except Exception as e:
         print(f"⚠️  Error guardando datos: {e}")
+
+
+def get_cycle_stats():
+    """Latencia de decisión y tiempo muerto de los últimos ciclos"""
+    stats = list(cycle_stats)
+    decisions = [s['decision_ms'] for s in stats]
+    dead_times = [s['dead_time'] for s in stats if s['dead_time'] is not None]
     
-    state.last_phase = phase['id']
-    return phase['id'], total_time
+    shifts = [s['green_shift'] for s in stats]
+    
+    return {
+        'pipelined': PIPELINE_PLANNING,
+        'actuated': ACTUATED_MODE,
+        'cycles': len(stats),
+        'avg_decision_ms': round(sum(decisions) / len(decisions), 2) if decisions else 0.0,
+        'max_decision_ms': round(max(decisions), 2) if decisions else 0.0,
+        'avg_dead_time': round(sum(dead_times) / len(dead_times), 2) if dead_times else None,
+        'max_dead_time': round(max(dead_times), 2) if dead_times else None,
+        'avg_green_shift': round(sum(shifts) / len(shifts), 2) if shifts else 0.0,
+        'last': stats[-1] if stats else None,
+    }
 
 
 def smart_auto_cycle():
@@ -313,11 +471,13 @@ def smart_auto_cycle():
     Ciclo automático INTELIGENTE con sistema de FASES
     
     NUEVA LÓGICA:
-    - Congela conteos al inicio de cada ciclo
+    - Congela conteos al decidir cada ciclo
     - No se interrumpe aunque los conteos cambien
-    - Espera a que termine el ciclo completo antes de tomar nuevas decisiones
+    - Con PIPELINE_PLANNING el próximo ciclo se decide durante el
+      amarillo/rojo del actual (con los conteos más recientes) y su verde
+      arranca apenas termina el despeje, sin pausa entre ciclos
     """
-    global controller_running, cycle_in_progress
+    global controller_running
     controller_running = True
     
     print("\n" + "="*60)
@@ -331,38 +491,53 @@ def smart_auto_cycle():
     
     all_red()
     
+    previous = None      # Último ciclo completado, si el siguiente va inmediatamente después
+    next_cycle = None    # Decidido durante el despeje del ciclo anterior
+    
+    def plan_next():
+        nonlocal next_cycle
+        if controller_running:
+            next_cycle = plan_cycle()
+    
     while controller_running:
         try:
+            cycle, next_cycle = next_cycle, None
+            
             # Obtener conteo actual
-            counts = getattr(state, "vehicle_counts", [0] * 6)
+            if cycle is None and should_system_run(getattr(state, "vehicle_counts", [0] * 6)):
+                cycle = plan_cycle()
             
-            # Verificar si hay vehículos
-            if should_system_run(counts):
+            if cycle is not None:
                 # HAY TRÁFICO: Ejecutar ciclo inteligente
-                # Los conteos se congelarán DENTRO de traffic_controller()
-                phase_id, cycle_time = traffic_controller()
+                phase_id, cycle_time = run_cycle(
+                    cycle, previous, on_clearing=plan_next if PIPELINE_PLANNING else None
+                )
+                previous = cycle if phase_id is not None else None
+                if phase_id is None:
+                    # Interrumpido: el plan decidido en su despeje queda obsoleto
+                    next_cycle = None
                 
-                # Pausa breve antes del siguiente ciclo
-                if controller_running:
-                    print(f"⏸️  Pausa de 2s antes del siguiente análisis...\n")
-                    time.sleep(2)
+                # Sin pipeline: pausa breve antes del siguiente análisis
+                if controller_running and not PIPELINE_PLANNING:
+                    print(f"⏸️  Pausa de {CYCLE_PAUSE}s antes del siguiente análisis...\n")
+                    clock.wait_event(_stop_event, CYCLE_PAUSE)
             else:
                 # SIN TRÁFICO: Esperar
                 print(f"⏸️  Sin tráfico - Verificando en {WAIT_INTERVAL}s...")
+                previous = None
                 all_red()
-                time.sleep(WAIT_INTERVAL)
+                clock.wait_event(_stop_event, WAIT_INTERVAL)
         
         except Exception as e:
             print(f"❌ Error en ciclo automático: {e}")
             import traceback
             traceback.print_exc()
-            cycle_in_progress = False
-            all_red()
-            time.sleep(5)
+            previous = next_cycle = None
+            # Solo cortar este plan: el ciclo automático sigue
+            scheduler.cancel(final=all_red, stop=False)
+            clock.wait_event(_stop_event, ERROR_PAUSE)
     
     print("\n⏹️  SISTEMA INTELIGENTE DETENIDO")
-    cycle_in_progress = False
-    all_red()
 
 
 def start_auto_cycle():
@@ -373,6 +548,9 @@ def start_auto_cycle():
         print("⚠️ El sistema ya está corriendo")
         return False
     
+    controller_running = True
+    _stop_event.clear()
+    scheduler.reset()
     controller_thread = threading.Thread(target=smart_auto_cycle, daemon=True)
     controller_thread.start()
     
@@ -390,13 +568,13 @@ def stop_auto_cycle():
     
     print("\n⏳ Deteniendo sistema...")
     controller_running = False
+    _stop_event.set()
     
-    # Esperar que termine el ciclo actual
-    if controller_thread:
-        print("⏳ Esperando que termine el ciclo actual...")
-        controller_thread.join(timeout=40)
+    # Cortar el ciclo en curso: ningún evento pendiente sale después del rojo
+    scheduler.cancel(final=all_red)
+    if controller_thread and controller_thread is not threading.current_thread():
+        controller_thread.join(timeout=STOP_TIMEOUT)
     
-    all_red()
     print("✅ Sistema detenido. Todos en ROJO")
     
     return True
@@ -408,8 +586,9 @@ def emergency_stop():
     
     print("\n🚨 PARADA DE EMERGENCIA")
     controller_running = False
+    _stop_event.set()
+    scheduler.cancel(final=all_red)
     cycle_in_progress = False
-    all_red()
     print("✅ Todos los semáforos en ROJO")
 
 
@@ -424,13 +603,21 @@ def get_controller_status():
         'vehicle_counts': counts,
         'total_vehicles': sum(counts),
         'traffic_level': get_traffic_level(counts),
-        'has_traffic': should_system_run(counts)
+        'has_traffic': should_system_run(counts),
+        'green_remaining': round(scheduler.green_remaining(), 1),
+        'scheduler': scheduler.get_status(),
+        'cycles': get_cycle_stats(),
     }
 
 
 def manual_phase(phase_id, custom_time=None):
     """
     Ejecutar una fase específica manualmente
+    
+    Como traffic_controller, vuelve a aceptar planes tras un stop anterior.
+    
+    Returns:
+        bool: True si la fase se completó
     """
     from .logic import PHASES, calculate_phase_priority
     
@@ -451,7 +638,11 @@ def manual_phase(phase_id, custom_time=None):
     
     print(f"\n🎮 CICLO MANUAL: Fase {phase_id} - {phase['name']}")
     
-    execute_phase(phase, green_time)
+    scheduler.reset()
+    completed_id, _ = execute_phase(phase, green_time)
+    if completed_id is None:
+        print(f"⏹️  Ciclo manual interrumpido")
+        return False
     
     print(f"✅ Ciclo manual completado")
     return True
@@ -477,6 +668,6 @@ def test_phase_system():
         state.vehicle_counts = counts
         phase_id, time_used = traffic_controller()
         
-        time.sleep(2)
+        clock.sleep(2)
     
     print("\n✅ Prueba completada")
\ No newline at end of file
@@ -0,0 +1,383 @@
+"""
+Backends de detección de vehículos
+
+Todos los backends devuelven el mismo formato de arrays, así el resto del
+pipeline (filtros, zonas, estabilización) no depende de cuál se use:
+
+    xyxy: np.ndarray (N, 4) float32 en píxeles del frame original
+    conf: np.ndarray (N,) float32
+    cls:  np.ndarray (N,) int64 (clases COCO)
+
+BACKENDS DISPONIBLES (settings.TRAFFIC_DETECTOR['BACKEND']):
+- 'ultralytics': modelo .pt con PyTorch (el original)
+- 'onnx':        modelo exportado a ONNX sobre ONNX Runtime (CPU)
+- 'onnx-int8':   modelo ONNX cuantizado a INT8 (ver manage.py export_detector)
+- 'openvino':    modelo OpenVINO IR (.xml), FP32 o INT8
+- 'remote':      servidor local de inferencia por lotes (ver inference_server.py);
+                 MODEL es la dirección del socket
+
+Los modelos exportados se generan con: python manage.py export_detector
+(tamaño de entrada dinámico por defecto, necesario para el imgsz por recorte
+de TILING; con --fixed el modelo escala todo a su tamaño fijo)
+"""
+
+import threading
+import numpy as np
+import cv2
+
+# Modelo por defecto de cada backend
+DEFAULT_MODELS = {
+    'ultralytics': 'yolov8n.pt',
+    'onnx': 'yolov8n.onnx',
+    'onnx-int8': 'yolov8n-int8.onnx',
+    'openvino': 'yolov8n_openvino_model/yolov8n.xml',
+    'remote': '/tmp/trafico_inference.sock',
+}
+
+NMS_IOU = 0.45          # Umbral IoU para NMS en backends exportados
+LETTERBOX_COLOR = 114   # Relleno gris, igual que Ultralytics
+
+_detector = None
+_detector_lock = threading.Lock()
+
+# Hilos de inferencia si settings no fija THREADS (el proceso de visión lo
+# ajusta a sus núcleos, ver vision_process.py); None = automático del backend
+DEFAULT_THREADS = None
+
+
+class Detector:
+    """Interfaz común de los backends de detección"""
+
+    name = 'base'
+    square_input = True   # Cada entrada se rellena a imgsz x imgsz (ver tiling.input_pixels)
+
+    def detect(self, frame, imgsz=640, conf=0.25, classes=None):
+        """
+        Detectar objetos en un frame BGR
+
+        Returns:
+            tuple: (xyxy, conf, cls) como arrays NumPy
+        """
+        raise NotImplementedError
+
+    def detect_batch(self, frames, imgsz=640, conf=0.25, classes=None):
+        """
+        Detectar en varios frames con el mismo imgsz
+
+        Los backends que soportan lotes hacen una sola llamada al modelo;
+        por defecto se procesa frame por frame.
+
+        Returns:
+            list: Un (xyxy, conf, cls) por frame
+        """
+        return [self.detect(frame, imgsz=imgsz, conf=conf, classes=classes) for frame in frames]
+
+    def warmup(self, imgsz=640):
+        """Correr una inferencia en vacío para cargar pesos y kernels"""
+        self.detect(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz)
+
+
+def empty_result():
+    """Resultado vacío con los dtypes correctos"""
+    return (
+        np.empty((0, 4), dtype=np.float32),
+        np.empty(0, dtype=np.float32),
+        np.empty(0, dtype=np.int64),
+    )
+
+
+class UltralyticsDetector(Detector):
+    """Modelo YOLO original sobre PyTorch"""
+
+    name = 'ultralytics'
+    square_input = False  # Letterbox rectangular salvo en lotes de formas distintas
+
+    def __init__(self, model_path, threads=None):
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+
+    def detect(self, frame, imgsz=640, conf=0.25, classes=None):
+        results = self.model(frame, verbose=False, conf=conf, imgsz=imgsz, classes=classes)
+        return self._to_numpy(results[0].boxes)
+
+    def detect_batch(self, frames, imgsz=640, conf=0.25, classes=None):
+        if not frames:
+            return []
+        results = self.model(list(frames), verbose=False, conf=conf, imgsz=imgsz, classes=classes)
+        return [self._to_numpy(result.boxes) for result in results]
+
+    @staticmethod
+    def _to_numpy(boxes):
+        # Una sola conversión tensor → NumPy por campo
+        return (
+            boxes.xyxy.cpu().numpy().astype(np.float32),
+            boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.cls.cpu().numpy().astype(np.int64),
+        )
+
+
+class ExportedYoloDetector(Detector):
+    """
+    Base para modelos YOLOv8 exportados (ONNX / OpenVINO)
+
+    Hace el letterbox, decodifica la salida (N, 4 + clases, anclas) y aplica NMS.
+    Las subclases solo implementan _infer().
+    """
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.input_size = None  # None = el modelo acepta tamaño dinámico
+        self.max_batch = 1      # Frames por llamada al modelo (None = lote dinámico)
+        self._ignored_sizes = set()
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def _letterbox(self, frame, size):
+        """Redimensionar manteniendo proporción y rellenar a size x size"""
+        h, w = frame.shape[:2]
+        ratio = min(size / h, size / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_x = (size - new_w) // 2
+        pad_y = (size - new_h) // 2
+
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+
+        # BGR → RGB, HWC → NCHW, 0-1
+        blob = cv2.dnn.blobFromImage(canvas, 1 / 255.0, swapRB=True)
+        return blob, ratio, pad_x, pad_y
+
+    def detect(self, frame, imgsz=640, conf=0.25, classes=None):
+        return self.detect_batch([frame], imgsz=imgsz, conf=conf, classes=classes)[0]
+
+    def detect_batch(self, frames, imgsz=640, conf=0.25, classes=None):
+        if not frames:
+            return []
+
+        size = self.input_size or imgsz
+        if size != imgsz and imgsz not in self._ignored_sizes:
+            # Modelo exportado con entrada fija: el imgsz por recorte de TILING no aplica
+            self._ignored_sizes.add(imgsz)
+            print(f"⚠️ {self.model_path} tiene entrada fija {size}: se ignora imgsz={imgsz} "
+                  f"(exportar sin --fixed para respetarlo)")
+        letterboxed = [self._letterbox(frame, size) for frame in frames]
+        step = self.max_batch or len(frames)
+
+        outputs = []
+        for start in range(0, len(frames), step):
+            blobs = [blob for blob, _, _, _ in letterboxed[start:start + step]]
+            count = len(blobs)
+            if self.max_batch and count < self.max_batch:
+                # Lote fijo del modelo exportado: rellenar con ceros
+                blobs += [np.zeros_like(blobs[0])] * (self.max_batch - count)
+            output = np.asarray(self._infer(np.concatenate(blobs)))
+            outputs.extend(output[:count])
+
+        return [
+            self._decode(output, frame.shape, ratio, pad_x, pad_y, conf, classes)
+            for output, frame, (_, ratio, pad_x, pad_y) in zip(outputs, frames, letterboxed)
+        ]
+
+    def _decode(self, output, frame_shape, ratio, pad_x, pad_y, conf, classes):
+        """Salida de un frame (4 + nc, anclas) → cajas en coordenadas del frame"""
+        h, w = frame_shape[:2]
+
+        # (4 + nc, anclas) → (anclas, 4 + nc)
+        predictions = output.T
+        scores_all = predictions[:, 4:]
+
+        cls = scores_all.argmax(axis=1)
+        scores = scores_all[np.arange(len(cls)), cls]
+
+        keep = scores >= conf
+        if classes is not None:
+            keep &= np.isin(cls, classes)
+
+        if not keep.any():
+            return empty_result()
+
+        boxes = predictions[keep, :4]
+        scores = scores[keep]
+        cls = cls[keep]
+
+        # cx, cy, w, h → x1, y1, x2, y2 en coordenadas del frame original
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+        xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+        xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+        xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+        xyxy -= np.array([pad_x, pad_y, pad_x, pad_y], dtype=xyxy.dtype)
+        xyxy /= ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+        keep_idx = nms_per_class(xyxy, scores, cls, NMS_IOU)
+
+        return (
+            xyxy[keep_idx].astype(np.float32),
+            scores[keep_idx].astype(np.float32),
+            cls[keep_idx].astype(np.int64),
+        )
+
+
+def nms_per_class(xyxy, scores, cls, iou_threshold):
+    """
+    NMS por clase usando OpenCV
+
+    Desplaza las cajas de cada clase para que no se supriman entre clases.
+    """
+    if len(xyxy) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    offset = cls[:, None].astype(np.float32) * 8192.0
+    shifted = xyxy + offset
+    boxes_xywh = np.column_stack([
+        shifted[:, 0], shifted[:, 1],
+        shifted[:, 2] - shifted[:, 0], shifted[:, 3] - shifted[:, 1]
+    ])
+
+    indices = cv2.dnn.NMSBoxes(boxes_xywh.tolist(), scores.tolist(), 0.0, iou_threshold)
+    return np.asarray(indices, dtype=np.int64).reshape(-1)
+
+
+class OnnxRuntimeDetector(ExportedYoloDetector):
+    """Modelo ONNX sobre ONNX Runtime (CPU)"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, threads=None):
+        super().__init__(model_path)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("Backend 'onnx' requiere: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.float16 if 'float16' in model_input.type else np.float32
+
+        # Si el modelo se exportó con tamaño o lote fijo, usar esos
+        size = model_input.shape[-1]
+        self.input_size = size if isinstance(size, int) else None
+        batch = model_input.shape[0]
+        self.max_batch = batch if isinstance(batch, int) else None
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob.astype(self.input_dtype)})[0]
+
+
+class OpenVINODetector(ExportedYoloDetector):
+    """Modelo OpenVINO IR (.xml + .bin) sobre CPU"""
+
+    name = 'openvino'
+
+    def __init__(self, model_path, threads=None):
+        super().__init__(model_path)
+        try:
+            import openvino as ov
+        except ImportError:
+            raise ImportError("Backend 'openvino' requiere: pip install openvino")
+
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+
+        model = core.read_model(model_path)
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled.output(0)
+
+        shape = model.input(0).partial_shape
+        self.input_size = shape[3].get_length() if shape[3].is_static else None
+        self.max_batch = shape[0].get_length() if shape[0].is_static else None
+
+    def _infer(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+class RemoteDetector(Detector):
+    """Cliente del servidor local de inferencia por lotes (inference_server.py)"""
+
+    name = 'remote'
+    square_input = False  # El servidor puede usar Ultralytics (caso menos favorable a recortar)
+
+    def __init__(self, address):
+        from .inference_server import InferenceClient
+        self.client = InferenceClient(address)
+
+    def detect(self, frame, imgsz=640, conf=0.25, classes=None):
+        return self.detect_batch([frame], imgsz=imgsz, conf=conf, classes=classes)[0]
+
+    def detect_batch(self, frames, imgsz=640, conf=0.25, classes=None):
+        if not frames:
+            return []
+        return self.client.detect(frames, imgsz=imgsz, conf=conf, classes=classes)
+
+
+BACKENDS = {
+    'ultralytics': UltralyticsDetector,
+    'onnx': OnnxRuntimeDetector,
+    'onnx-int8': OnnxRuntimeDetector,
+    'openvino': OpenVINODetector,
+    'remote': RemoteDetector,
+}
+
+
+def get_detector_config():
+    """Leer la configuración del detector desde settings (con valores por defecto)"""
+    config = {'BACKEND': 'ultralytics', 'MODEL': None, 'THREADS': None}
+
+    try:
+        from django.conf import settings
+        config.update(getattr(settings, 'TRAFFIC_DETECTOR', {}))
+    except Exception:
+        pass
+
+    if not config['MODEL']:
+        config['MODEL'] = DEFAULT_MODELS.get(config['BACKEND'])
+
+    return config
+
+
+def detector_square_input():
+    """Detector.square_input del backend configurado, sin cargar el modelo"""
+    detector_class = BACKENDS.get(get_detector_config()['BACKEND'], Detector)
+    return detector_class.square_input
+
+
+def create_detector(backend, model_path, threads=None):
+    """Crear un detector del backend indicado"""
+    detector_class = BACKENDS.get(backend)
+    if detector_class is None:
+        raise ValueError(f"Backend de detección desconocido: {backend}. Opciones: {list(BACKENDS)}")
+
+    if detector_class is RemoteDetector:
+        return detector_class(model_path)
+    return detector_class(model_path, threads=threads)
+
+
+def get_detector():
+    """Detector compartido según settings (se crea en el primer uso)"""
+    global _detector
+
+    with _detector_lock:
+        if _detector is None:
+            config = get_detector_config()
+            print(f"🧠 Cargando detector: {config['BACKEND']} ({config['MODEL']})")
+            threads = config['THREADS'] or DEFAULT_THREADS
+            _detector = create_detector(config['BACKEND'], config['MODEL'], threads)
+
+        return _detector
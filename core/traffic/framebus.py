@@ -0,0 +1,425 @@
+"""
+Bus de frames y resultados en memoria compartida entre procesos
+
+El worker de visión corre en su propio proceso (ver vision_process.py) y se
+comunica con el proceso web sin pipes ni pickling de frames:
+
+- FrameRing: N slots en multiprocessing.shared_memory. El productor escribe
+  cada frame en el siguiente slot y el lector lo ve como un array NumPy sobre
+  la misma memoria (sin copias intermedias). Cada slot tiene un seqlock: si
+  el productor lo sobrescribe mientras se lee, el lector lo detecta y
+  descarta la lectura. El lector marca demanda con un timestamp; sin
+  demanda el productor no copia frames.
+- SeqlockChannel: un solo registro (conteos, detecciones y estado) que el
+  worker sobrescribe y el proceso web lee sin locks. Un contador par/impar
+  indica si hay una escritura en curso; el lector reintenta si cambió.
+
+Hay un solo escritor por región. El seqlock sin locks necesita que las
+escrituras a memoria se vean en orden desde otros procesos, que x86 garantiza
+pero ARM no (y Python no agrega barreras). En otras arquitecturas cada región
+usa además un multiprocessing.Lock compartido (SEQLOCK_ORDERED = False): la
+adquisición del lock hace de barrera. El lector valida igual cada cabecera
+y reintenta ante cualquier inconsistencia. Quien toma el lock anota su pid
+en la región; un worker nuevo solo fuerza el lock si ese proceso murió.
+"""
+
+import multiprocessing
+import os
+import pickle
+import platform
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+# ===== CONFIGURACIÓN =====
+RING_SLOTS = 3
+MAX_FRAME_BYTES = 1920 * 1080 * 3   # Capacidad de cada slot (frame BGR 1080p)
+CHANNEL_BYTES = 256 * 1024          # Capacidad del canal de resultados
+DEMAND_SECONDS = 1.0                # La demanda del lector vence si no se renueva
+READ_RETRIES = 100
+LOCK_TIMEOUT = 1.0                  # Segundos esperando el lock de una región (sin x86)
+
+# x86 ve las escrituras en orden: el seqlock alcanza sin locks
+SEQLOCK_ORDERED = platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686', 'x86')
+
+# Tipo de contenido de un slot
+KIND_BGR = 1    # Array (h, w, 3) uint8
+KIND_JPEG = 2   # Bytes JPEG
+
+_SLOT_HEADER = np.dtype([
+    ('seq', '<u8'),          # Seqlock: impar = escritura en curso
+    ('frame', '<u8'),        # Número de frame escrito en el slot
+    ('captured_at', '<f8'),  # Hora de captura (time.time)
+    ('nbytes', '<u8'),
+    ('h', '<u4'),
+    ('w', '<u4'),
+    ('kind', '<u4'),
+    ('pad', '<u4'),
+])
+_RING_CONTROL = np.dtype([
+    ('latest', '<u8'),       # Último número de frame publicado (0 = ninguno)
+    ('demand', '<f8'),       # time.time() de la última demanda del lector
+    ('owner', '<u8'),        # pid que tiene el lock de la región (0 = nadie)
+])
+
+
+def _align(n, alignment=64):
+    return (n + alignment - 1) // alignment * alignment
+
+
+def _pid_alive(pid):
+    """True si el proceso existe (sin mandarle ninguna señal)"""
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)   # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259                            # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _locked(lock, owner):
+    """
+    Tomar el lock de una región si tiene; da False si no se pudo a tiempo
+
+    Args:
+        owner: Vista de un elemento en la región donde se anota el pid dueño
+    """
+    if lock is None:
+        yield True
+        return
+
+    acquired = lock.acquire(timeout=LOCK_TIMEOUT)
+    if acquired:
+        owner[0] = os.getpid()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            owner[0] = 0
+            lock.release()
+
+
+def _recover_lock(lock, owner):
+    """
+    Liberar el lock de una región si lo retiene un proceso que murió
+
+    Un lector o escritor vivo y lento conserva su lock: solo se fuerza si
+    el pid anotado en la región ya no existe.
+    """
+    if lock is None:
+        return
+    if lock.acquire(timeout=LOCK_TIMEOUT):
+        lock.release()
+        return
+
+    pid = int(owner[0])
+    if pid and pid != os.getpid() and not _pid_alive(pid):
+        print(f"⚠️ Lock de memoria compartida retenido por el proceso {pid} (muerto): liberando")
+        owner[0] = 0
+        try:
+            lock.release()
+        except ValueError:
+            pass
+
+
+class FrameRing:
+    """Ring de frames en memoria compartida (un productor, N lectores)"""
+
+    def __init__(self, name=None, create=False, slots=RING_SLOTS, capacity=MAX_FRAME_BYTES, lock=None):
+        self.slots = slots
+        self.capacity = capacity
+        self.lock = lock   # Solo sin SEQLOCK_ORDERED (ver docstring del módulo)
+
+        headers_offset = _align(_RING_CONTROL.itemsize)
+        data_offset = _align(headers_offset + slots * _SLOT_HEADER.itemsize)
+        size = data_offset + slots * capacity
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        buf = self.shm.buf
+        self._control = np.ndarray(1, dtype=_RING_CONTROL, buffer=buf)
+        self._headers = np.ndarray(slots, dtype=_SLOT_HEADER, buffer=buf, offset=headers_offset)
+        self._data = np.ndarray((slots, capacity), dtype=np.uint8, buffer=buf, offset=data_offset)
+
+        if create:
+            self._control[0] = (0, 0.0, 0)
+            self._headers[:] = 0
+        self._owner = self._control['owner']
+
+        self._last_read = 0  # Último frame entregado a ESTE lector
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # ----- Productor -----
+
+    def recover(self):
+        """Dejar pares los seqlocks si un productor anterior murió escribiendo"""
+        _recover_lock(self.lock, self._owner)
+        odd = self._headers['seq'] % 2 == 1
+        self._headers['seq'][odd] += 1
+
+    def wanted(self):
+        """True si algún lector pidió frames hace menos de DEMAND_SECONDS"""
+        return time.time() - float(self._control['demand'][0]) <= DEMAND_SECONDS
+
+    def write(self, data, captured_at=None):
+        """
+        Publicar un frame BGR (ndarray) o un JPEG (bytes)
+
+        Returns:
+            bool: False si no entra en el slot
+        """
+        if isinstance(data, np.ndarray):
+            kind, h, w = KIND_BGR, data.shape[0], data.shape[1]
+            payload = np.ascontiguousarray(data).reshape(-1)
+        else:
+            kind, h, w = KIND_JPEG, 0, 0
+            payload = np.frombuffer(data, dtype=np.uint8)
+
+        nbytes = payload.size
+        if nbytes > self.capacity:
+            return False
+
+        with _locked(self.lock, self._owner) as acquired:
+            if not acquired:
+                return False
+
+            frame_no = int(self._control['latest'][0]) + 1
+            slot = frame_no % self.slots
+            header = self._headers[slot:slot + 1]
+
+            header['seq'] += 1                  # Impar: escritura en curso
+            self._data[slot, :nbytes] = payload
+            header['frame'] = frame_no
+            header['captured_at'] = captured_at or time.time()
+            header['nbytes'] = nbytes
+            header['h'] = h
+            header['w'] = w
+            header['kind'] = kind
+            header['seq'] += 1                  # Par: slot consistente
+
+            self._control['latest'] = frame_no
+        return True
+
+    # ----- Lector -----
+
+    def demand(self):
+        """Avisar al productor que este lector quiere frames"""
+        self._control['demand'] = time.time()
+
+    def has_new(self):
+        """True si hay un frame publicado que este lector no leyó"""
+        return int(self._control['latest'][0]) > self._last_read
+
+    def read_latest(self):
+        """
+        Copiar el frame más reciente si es nuevo para este lector
+
+        Returns:
+            tuple: (data, kind, captured_at) con data un ndarray BGR o bytes
+                   JPEG, o (None, None, None) si no hay frame nuevo o el
+                   productor lo sobrescribió durante la lectura
+        """
+        with _locked(self.lock, self._owner) as acquired:
+            if not acquired:
+                return None, None, None
+            return self._read_latest()
+
+    def _read_latest(self):
+        for _ in range(READ_RETRIES):
+            frame_no = int(self._control['latest'][0])
+            if frame_no <= self._last_read:
+                return None, None, None
+
+            slot = frame_no % self.slots
+            headers = self._headers
+            seq = int(headers['seq'][slot])
+            if seq % 2:
+                continue
+
+            nbytes = int(headers['nbytes'][slot])
+            kind = int(headers['kind'][slot])
+            h, w = int(headers['h'][slot]), int(headers['w'][slot])
+            captured_at = float(headers['captured_at'][slot])
+
+            # Cabecera a medio escribir (el productor dio la vuelta al ring): reintentar
+            if int(headers['seq'][slot]) != seq or int(headers['frame'][slot]) != frame_no:
+                continue
+            if nbytes > self.capacity or kind not in (KIND_BGR, KIND_JPEG):
+                continue
+            if kind == KIND_BGR and nbytes != h * w * 3:
+                continue
+
+            # Vista sobre la memoria compartida → una sola copia fuera del slot
+            view = self._data[slot, :nbytes]
+            data = view.reshape(h, w, 3).copy() if kind == KIND_BGR else view.tobytes()
+
+            if int(headers['seq'][slot]) == seq and int(headers['frame'][slot]) == frame_no:
+                self._last_read = frame_no
+                return data, kind, captured_at
+
+        return None, None, None
+
+    def close(self):
+        # Soltar las vistas antes de cerrar el mapeo
+        self._control = self._headers = self._data = self._owner = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SeqlockChannel:
+    """Último mensaje (pickle) en memoria compartida, lectura sin locks"""
+
+    _HEADER = 24  # seq (u8) + nbytes (u8) + pid dueño del lock (u8)
+
+    def __init__(self, name=None, create=False, capacity=CHANNEL_BYTES, lock=None):
+        self.lock = lock   # Solo sin SEQLOCK_ORDERED (ver docstring del módulo)
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=create, size=self._HEADER + capacity if create else 0
+        )
+        self.capacity = self.shm.size - self._HEADER
+        self._meta = np.ndarray(3, dtype='<u8', buffer=self.shm.buf)
+        self._data = np.ndarray(self.capacity, dtype=np.uint8, buffer=self.shm.buf,
+                                offset=self._HEADER)
+        if create:
+            self._meta[:] = 0
+        self._owner = self._meta[2:3]
+
+        self._last_seq = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self._meta[0])
+
+    def recover(self):
+        """Dejar par el seqlock si el escritor anterior murió escribiendo"""
+        _recover_lock(self.lock, self._owner)
+        if self._meta[0] % 2:
+            self._meta[0] += 1
+
+    def write(self, message):
+        """
+        Publicar un mensaje (un solo escritor)
+
+        Returns:
+            bool: False si el mensaje no entra en el canal
+        """
+        payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.capacity:
+            return False
+
+        with _locked(self.lock, self._owner) as acquired:
+            if not acquired:
+                return False
+
+            self._meta[0] += 1   # Impar: escritura en curso
+            self._data[:len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+            self._meta[1] = len(payload)
+            self._meta[0] += 1   # Par: mensaje consistente
+        return True
+
+    def read(self, only_new=True):
+        """
+        Leer el último mensaje
+
+        Returns:
+            El mensaje, o None si no hay uno nuevo (only_new) o no se pudo
+            leer uno consistente
+        """
+        with _locked(self.lock, self._owner) as acquired:
+            if not acquired:
+                return None
+            return self._read(only_new)
+
+    def _read(self, only_new):
+        for _ in range(READ_RETRIES):
+            seq = int(self._meta[0])
+            if seq == 0 or (only_new and seq == self._last_seq):
+                return None
+            if seq % 2:
+                continue
+
+            nbytes = int(self._meta[1])
+            if nbytes > self.capacity:
+                continue
+            payload = self._data[:nbytes].tobytes()
+            if int(self._meta[0]) == seq:
+                self._last_seq = seq
+                return pickle.loads(payload)
+
+        return None
+
+    def close(self):
+        self._meta = self._data = self._owner = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class FrameBus:
+    """Ring de frames anotados, ring de frames crudos y canal de resultados"""
+
+    def __init__(self, names=None, locks=None):
+        """
+        Args:
+            names: dict con los nombres de memoria compartida a los que
+                   conectarse (proceso worker); None = crearlos (proceso web)
+            locks: dict de locks por región que pasó el proceso web (None si
+                   SEQLOCK_ORDERED); al crear se generan aquí
+        """
+        create = names is None
+        names = names or {}
+        if create and not SEQLOCK_ORDERED:
+            ctx = multiprocessing.get_context('spawn')
+            locks = {region: ctx.Lock() for region in ('annotated', 'raw', 'channel')}
+        self.locks = locks
+        locks = locks or {}
+
+        self.owner = create
+        self.annotated = FrameRing(names.get('annotated'), create=create, lock=locks.get('annotated'))
+        self.raw = FrameRing(names.get('raw'), create=create, lock=locks.get('raw'))
+        self.channel = SeqlockChannel(names.get('channel'), create=create, lock=locks.get('channel'))
+
+        if not create:
+            # Este proceso es el escritor: puede reemplazar a un worker caído
+            for region in (self.annotated, self.raw, self.channel):
+                region.recover()
+
+    @property
+    def names(self):
+        return {
+            'annotated': self.annotated.name,
+            'raw': self.raw.name,
+            'channel': self.channel.name,
+        }
+
+    def close(self):
+        """Cerrar los mapeos; el proceso que los creó también los borra"""
+        for region in (self.annotated, self.raw, self.channel):
+            region.close()
+            if self.owner:
+                try:
+                    region.unlink()
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,121 @@
+"""
+Fusión de conteos de varias cámaras en un vector por carril
+
+Cada cámara cuenta vehículos en SUS zonas y cada zona pertenece a un carril
+(semáforo A-F). Primero los conteos de zona se suman por carril dentro de la
+cámara (dos zonas de una misma cámara no se superponen: cada caja cae en
+una sola). Después, para cada carril se combinan las cámaras que lo cubren:
+
+- 'max':  las cámaras ven el mismo tramo (zonas superpuestas) → el mayor
+          conteo, sin contar dos veces el mismo vehículo
+- 'sum':  cada cámara ve un tramo distinto del carril
+- 'mean': promedio redondeado de las cámaras que lo cubren
+
+Las cámaras caídas, congeladas o con conteos viejos no participan. Un
+carril que ninguna cámara sana cubre queda en 0 (nunca el último conteo de
+una cámara caída, que estaría congelado) y uncovered_lanes() lo informa para
+levantar la falla de cámara (ver vision_process.py).
+"""
+
+import time
+import numpy as np
+
+# ===== CONFIGURACIÓN =====
+N_LANES = 6                 # Semáforos A-F (ver zones.py)
+FUSION_POLICY = 'max'
+STALE_SECONDS = 5.0         # Conteos de una cámara más viejos que esto no cuentan como sanos
+
+POLICIES = ('max', 'sum', 'mean')
+
+
+def zones_to_lanes(zone_counts, zone_lanes=None, n_lanes=N_LANES):
+    """
+    Sumar los conteos de zona de una cámara por carril
+
+    Args:
+        zone_counts: Conteo por zona
+        zone_lanes: Carril de cada zona (None = zona i → carril i)
+
+    Returns:
+        list: Conteo por carril (n_lanes)
+    """
+    counts = np.asarray(zone_counts, dtype=np.int64)
+    if zone_lanes is None:
+        zone_lanes = np.arange(len(counts))
+    return np.bincount(zone_lanes, weights=counts, minlength=n_lanes)[:n_lanes].astype(np.int64).tolist()
+
+
+def _coverage(cameras, now=None):
+    """
+    Conteos, cobertura y salud de las cámaras con datos
+
+    Returns:
+        tuple: (counts (cámaras, carriles), covers (bool, igual forma), healthy (cámaras,))
+               o None si ninguna cámara tiene conteos
+    """
+    cameras = [c for c in cameras if c.get('lane_counts') is not None]
+    if not cameras:
+        return None
+
+    now = time.time() if now is None else now
+    counts = np.array([c['lane_counts'] for c in cameras], dtype=np.int64)
+    covers = np.zeros_like(counts, dtype=bool)
+    for row, camera in enumerate(cameras):
+        covers[row, list(camera['lanes'])] = True
+
+    healthy = np.array([
+        bool(c.get('healthy', True)) and now - (c.get('updated_at') or 0) <= STALE_SECONDS
+        for c in cameras
+    ])
+    return counts, covers, healthy
+
+
+def fuse_counts(cameras, n_lanes=N_LANES, policy=FUSION_POLICY, now=None):
+    """
+    Combinar los conteos por carril de varias cámaras
+
+    Args:
+        cameras: Iterable de dicts con 'lane_counts' (n_lanes), 'lanes'
+                 (carriles que cubre la cámara), 'healthy' (bool) y
+                 'updated_at' (time.time de los conteos)
+
+    Returns:
+        list: Conteo fusionado por carril (0 donde no hay cámara sana)
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Política de fusión desconocida: {policy}. Opciones: {POLICIES}")
+
+    coverage = _coverage(cameras, now)
+    if coverage is None:
+        return [0] * n_lanes
+    counts, covers, healthy = coverage
+
+    # Por carril: solo las cámaras sanas que lo cubren
+    use = covers & healthy[:, None]
+
+    n_used = use.sum(axis=0)
+    if policy == 'max':
+        fused = np.where(use, counts, 0).max(axis=0)
+    elif policy == 'sum':
+        fused = np.where(use, counts, 0).sum(axis=0)
+    else:
+        fused = np.rint(np.where(use, counts, 0).sum(axis=0) / np.maximum(n_used, 1))
+
+    return np.where(n_used > 0, fused, 0).astype(np.int64).tolist()
+
+
+def uncovered_lanes(cameras, now=None):
+    """
+    Carriles que alguna cámara cubre pero ninguna sana (su conteo fusionado es 0)
+
+    Returns:
+        list: Índices de carril
+    """
+    coverage = _coverage(cameras, now)
+    if coverage is None:
+        return []
+    _, covers, healthy = coverage
+
+    covered = covers.any(axis=0)
+    healthy_covered = (covers & healthy[:, None]).any(axis=0)
+    return np.flatnonzero(covered & ~healthy_covered).tolist()
@@ -0,0 +1,164 @@
+"""
+Chequeo de salud de cada frame sobre una miniatura
+
+Antes de gastar YOLO en un frame se revisa una versión reducida en grises:
+- brillo medio:       cámara tapada o sin luz → conteos en cero
+- varianza Laplaciana: frame movido/desenfocado → no se infiere (solo con
+                      luz suficiente: de noche poca textura no es desenfoque)
+- hash perceptual:    frame repetido (DroidCam reenvía el mismo cuadro) →
+                      no se infiere; si sigue repetido FROZEN_SECONDS la
+                      cámara está congelada → falla de cámara en state
+
+La miniatura es la misma que usa la compuerta de movimiento, así que se
+calcula una sola vez por frame.
+"""
+
+import time
+import cv2
+import numpy as np
+from .motion import MOTION_WIDTH
+
+# ===== CONFIGURACIÓN =====
+HEALTH_WIDTH = MOTION_WIDTH  # Ancho de la miniatura (compartida con MotionGate)
+MIN_BRIGHTNESS = 1           # Brillo medio mínimo (0-255)
+BLUR_THRESHOLD = 5.0         # Varianza Laplaciana mínima (0 = no chequear desenfoque)
+BLUR_MIN_BRIGHTNESS = 60     # Bajo este brillo no se chequea desenfoque (escena oscura, poca textura)
+FROZEN_SECONDS = 5.0         # Frames idénticos durante este tiempo = cámara congelada
+
+# Decisiones
+OK = 'ok'
+DARK = 'dark'            # Conteos en cero
+BLURRY = 'blurry'        # Saltar inferencia
+DUPLICATE = 'duplicate'  # Saltar inferencia (mismo cuadro que el anterior)
+FROZEN = 'frozen'        # Conteos en cero + falla de cámara
+
+DECISIONS = (OK, DARK, BLURRY, DUPLICATE, FROZEN)
+
+
+def make_thumbnail(frame, width=HEALTH_WIDTH):
+    """
+    Miniatura en grises del frame
+
+    INTER_AREA directo sobre 1280x720 cuesta ~1.6 ms; se diezma primero con
+    INTER_NEAREST al doble del tamaño final y se promedia 2x2 con INTER_AREA
+    (~0.15 ms), que alcanza para suavizar el ruido del sensor.
+    """
+    h, w = frame.shape[:2]
+    small_h = max(1, int(h * width / w))
+    if w > 2 * width:
+        frame = cv2.resize(frame, (2 * width, 2 * small_h), interpolation=cv2.INTER_NEAREST)
+    small = cv2.resize(frame, (width, small_h), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def dhash(gray):
+    """Hash de diferencias de 64 bits (9x8 píxeles, gradiente horizontal)"""
+    tiny = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (tiny[:, 1:] > tiny[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class FrameHealth:
+    """Clasifica cada frame y lleva el estado de congelamiento"""
+
+    def __init__(self, min_brightness=MIN_BRIGHTNESS, blur_threshold=BLUR_THRESHOLD,
+                 frozen_seconds=FROZEN_SECONDS, blur_min_brightness=BLUR_MIN_BRIGHTNESS):
+        self.min_brightness = min_brightness
+        self.blur_threshold = blur_threshold
+        self.blur_min_brightness = blur_min_brightness
+        self.frozen_seconds = frozen_seconds
+        self.reset()
+
+        # Estadísticas
+        self.checks = 0
+        self.decision_counts = dict.fromkeys(DECISIONS, 0)
+        self.last_cost_ms = 0.0
+        self.avg_cost_ms = None
+
+    def reset(self):
+        """Olvidar el frame anterior (p. ej. tras reconectar la cámara)"""
+        self.gray = None            # Miniatura del último frame (la reutiliza MotionGate)
+        self.brightness = 0.0
+        self.blur = 0.0
+        self.decision = OK
+        self._hash = None
+        self._prev_gray = None
+        self._repeated_since = None
+        self._timestamp = None
+
+    def check(self, frame, timestamp=None):
+        """
+        Clasificar un frame
+
+        Args:
+            frame: Frame BGR
+            timestamp: Momento de captura (time.monotonic)
+
+        Returns:
+            str: Una de DECISIONS
+        """
+        start = time.perf_counter()
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        gray = make_thumbnail(frame)
+        self.brightness = cv2.mean(gray)[0]
+
+        frame_hash = dhash(gray)
+        # El hash descarta rápido los frames distintos; la comparación exacta
+        # confirma el repetido (un frame vivo siempre trae algo de ruido)
+        repeated = (
+            frame_hash == self._hash
+            and self._prev_gray is not None
+            and np.array_equal(gray, self._prev_gray)
+        )
+        self._hash, self._prev_gray, self.gray = frame_hash, gray, gray
+        self._timestamp = timestamp
+
+        if repeated:
+            if self._repeated_since is None:
+                self._repeated_since = timestamp
+        else:
+            self._repeated_since = None
+
+        if self.brightness < self.min_brightness:
+            decision = DARK
+        elif repeated and timestamp - self._repeated_since >= self.frozen_seconds:
+            decision = FROZEN
+        elif repeated:
+            decision = DUPLICATE
+        else:
+            decision = OK
+            if self.blur_threshold > 0 and self.brightness >= self.blur_min_brightness:
+                _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+                self.blur = float(std[0, 0]) ** 2
+                if self.blur < self.blur_threshold:
+                    decision = BLURRY
+
+        self.decision = decision
+        self.checks += 1
+        self.decision_counts[decision] += 1
+
+        self.last_cost_ms = (time.perf_counter() - start) * 1000
+        self.avg_cost_ms = self.last_cost_ms if self.avg_cost_ms is None else (
+            0.9 * self.avg_cost_ms + 0.1 * self.last_cost_ms
+        )
+        return decision
+
+    @property
+    def frozen_for(self):
+        """Segundos que lleva repitiéndose el mismo frame (0 si no)"""
+        if self._repeated_since is None:
+            return 0.0
+        return self._timestamp - self._repeated_since
+
+    def get_stats(self):
+        """Estadísticas del chequeo de salud"""
+        return {
+            'health_decision': self.decision,
+            'health_brightness': round(self.brightness, 1),
+            'health_blur': round(self.blur, 1),
+            'health_cost_ms': round(self.last_cost_ms, 3),
+            'health_avg_cost_ms': round(self.avg_cost_ms or 0.0, 3),
+            'health_counts': dict(self.decision_counts),
+        }
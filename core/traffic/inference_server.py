@@ -0,0 +1,510 @@
+"""
+Servidor local de inferencia por lotes para varias cámaras
+
+Con N cámaras cada worker cargaría su propio modelo y haría llamadas de a un
+frame. El servidor carga un solo detector y atiende a todos los workers por
+un socket Unix (o TCP en localhost donde no hay AF_UNIX):
+
+- Cada worker manda sus frames (o los recortes del modo 'tiles') con el
+  backend 'remote' (detectors.RemoteDetector) y espera la respuesta.
+- El hilo de lotes junta los pedidos que llegan en una ventana corta y los
+  corre en UNA llamada a detect_batch. El lote sale apenas todos los
+  clientes conectados tienen un pedido en cola, se llena MAX_BATCH o el
+  pedido más viejo alcanza MAX_WAIT_MS (la latencia máxima que se agrega).
+- Cada worker recibe solo sus resultados.
+
+Protocolo: por mensaje, un encabezado fijo con los largos, un dict en JSON
+(operación, id, forma de cada frame, parámetros) y los bytes crudos de los
+frames concatenados. Las respuestas traen las cajas, confianzas y clases de
+todos los frames como arrays crudos y en el JSON cuántas son de cada frame.
+Nada de lo que llega por el socket se deserializa con pickle.
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import Counter, deque
+import numpy as np
+from .detectors import DEFAULT_MODELS
+
+# ===== CONFIGURACIÓN =====
+DEFAULT_ADDRESS = DEFAULT_MODELS['remote'] if hasattr(socket, 'AF_UNIX') else '127.0.0.1:8765'
+MAX_BATCH = 8              # Frames máximos por llamada al detector
+MAX_WAIT_MS = 15.0         # Espera máxima de un pedido antes de lanzar el lote
+REQUEST_TIMEOUT = 5.0      # Segundos que el cliente espera una respuesta
+STATS_WINDOW = 1000        # Lotes/pedidos recientes para promedios y percentiles
+
+MAX_HEADER_BYTES = 1 << 20       # Encabezado JSON más largo aceptado
+MAX_DATA_BYTES = 1 << 28         # Datos crudos más largos aceptados (256 MB)
+
+_LENGTHS = struct.Struct('!II')  # Largo del encabezado JSON, largo de los datos
+
+
+# ===== PROTOCOLO =====
+
+def parse_address(address):
+    """
+    'host:puerto' → TCP, cualquier otra cosa → ruta de socket Unix
+
+    Returns:
+        tuple: (familia, dirección para bind/connect)
+    """
+    host, sep, port = str(address).rpartition(':')
+    if sep and port.isdigit() and '/' not in address and '\\' not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+def _json_default(obj):
+    """Escalares y arrays NumPy en el encabezado JSON"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'no serializable: {type(obj).__name__}')
+
+
+def send_message(sock, header, buffers=()):
+    """Enviar un encabezado (dict JSON) seguido de buffers crudos"""
+    head = json.dumps(header, default=_json_default).encode()
+    total = sum(memoryview(b).nbytes for b in buffers)
+    sock.sendall(_LENGTHS.pack(len(head), total) + head)
+    for buffer in buffers:
+        sock.sendall(buffer)
+
+
+def _recv_exact(sock, nbytes):
+    data = bytearray(nbytes)
+    view = memoryview(data)
+    received = 0
+    while received < nbytes:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError('conexión cerrada')
+        received += n
+    return data
+
+
+def recv_message(sock):
+    """
+    Recibir un mensaje
+
+    Returns:
+        tuple: (encabezado, datos crudos)
+    """
+    head_len, data_len = _LENGTHS.unpack(_recv_exact(sock, _LENGTHS.size))
+    if head_len > MAX_HEADER_BYTES or data_len > MAX_DATA_BYTES:
+        raise ConnectionError(f'mensaje demasiado grande ({head_len} + {data_len} bytes)')
+    header = json.loads(_recv_exact(sock, head_len))
+    if not isinstance(header, dict):
+        raise ConnectionError('encabezado inválido')
+    data = _recv_exact(sock, data_len) if data_len else bytearray()
+    return header, data
+
+
+def _split_frames(data, shapes):
+    """
+    Reconstruir los frames uint8 a partir de los bytes concatenados
+
+    Raises:
+        ValueError: Si las formas no son (alto, ancho, 3) o no suman el largo de los datos
+    """
+    frames = []
+    offset = 0
+    for shape in shapes:
+        if (not isinstance(shape, (list, tuple)) or len(shape) != 3 or shape[2] != 3
+                or not all(isinstance(n, int) and n > 0 for n in shape)):
+            raise ValueError(f'forma de frame inválida: {shape}')
+        size = shape[0] * shape[1] * 3
+        if offset + size > len(data):
+            raise ValueError('los frames no coinciden con los datos recibidos')
+        frames.append(np.frombuffer(data, dtype=np.uint8, count=size, offset=offset).reshape(shape))
+        offset += size
+    if offset != len(data):
+        raise ValueError('los frames no coinciden con los datos recibidos')
+    return frames
+
+
+def pack_results(results):
+    """
+    Resultados (xyxy, conf, cls) por frame → (cantidades, buffers crudos)
+
+    Returns:
+        tuple: ([detecciones por frame], [xyxy float32, conf float32, cls int64])
+    """
+    counts = [len(conf) for _, conf, _ in results]
+    if not results:
+        return counts, []
+    xyxy = np.concatenate([np.asarray(r[0], dtype=np.float32).reshape(-1, 4) for r in results])
+    conf = np.concatenate([np.asarray(r[1], dtype=np.float32).reshape(-1) for r in results])
+    cls = np.concatenate([np.asarray(r[2], dtype=np.int64).reshape(-1) for r in results])
+    return counts, [xyxy, conf, cls]
+
+
+def unpack_results(counts, data):
+    """Inverso de pack_results"""
+    total = sum(counts)
+    if len(data) != total * (16 + 4 + 8):
+        raise ConnectionError('respuesta de detección inválida')
+    xyxy = np.frombuffer(data, dtype=np.float32, count=total * 4).reshape(total, 4)
+    conf = np.frombuffer(data, dtype=np.float32, count=total, offset=total * 16)
+    cls = np.frombuffer(data, dtype=np.int64, count=total, offset=total * 20)
+
+    bounds = np.cumsum(counts)[:-1]
+    return list(zip(np.split(xyxy, bounds), np.split(conf, bounds), np.split(cls, bounds)))
+
+
+# ===== SERVIDOR =====
+
+class _Client:
+    """Conexión de un worker"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+
+    def reply(self, header, buffers=()):
+        try:
+            with self.send_lock:
+                send_message(self.sock, header, buffers)
+        except OSError:
+            pass  # El cliente se fue; su hilo lector lo limpia
+
+
+class _Request:
+    __slots__ = ('client', 'id', 'frames', 'key', 'received_at')
+
+    def __init__(self, client, request_id, frames, key):
+        self.client = client
+        self.id = request_id
+        self.frames = frames
+        self.key = key  # (imgsz, conf, classes): solo se agrupan pedidos compatibles
+        self.received_at = time.monotonic()
+
+
+class InferenceServer:
+    """Junta pedidos de varios workers y los corre en lotes"""
+
+    def __init__(self, detector, address=DEFAULT_ADDRESS, max_batch=MAX_BATCH,
+                 max_wait_ms=MAX_WAIT_MS):
+        """
+        Args:
+            detector: Detector ya cargado (se usa detect_batch)
+            address: Ruta del socket Unix o 'host:puerto'
+            max_batch: Frames máximos por llamada al detector
+            max_wait_ms: Espera máxima de un pedido en cola antes de lanzar el lote
+        """
+        self.detector = detector
+        self.address = address
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._clients = set()
+        self._running = False
+        self._listener = None
+        self._threads = []
+
+        # Estadísticas
+        self.batches = 0
+        self.frames = 0
+        self.requests = 0
+        self.errors = 0
+        self.launch_reasons = Counter()   # all_clients / full / deadline
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._queue_ms = deque(maxlen=STATS_WINDOW)
+        self._infer_ms = deque(maxlen=STATS_WINDOW)
+        self.max_batch_size = 0
+
+    # ----- Ciclo de vida -----
+
+    def start(self):
+        """Abrir el socket y arrancar los hilos de aceptación y de lotes"""
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.unlink(bind_address)  # Socket viejo de una corrida anterior
+
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if not bind_address[0].startswith('127.') and bind_address[0] != 'localhost':
+                print(f"⚠️ Servidor de inferencia expuesto en {bind_address[0]}: "
+                      f"cualquiera en la red puede usar el detector")
+        listener.bind(bind_address)
+        listener.listen()
+        listener.settimeout(0.5)
+        self._listener = listener
+        self._running = True
+
+        self._threads = [
+            threading.Thread(target=self._accept_loop, daemon=True),
+            threading.Thread(target=self._batch_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"🧠 Servidor de inferencia escuchando en {self.address} "
+              f"(lote máx {self.max_batch}, espera máx {self.max_wait * 1000:.0f} ms)")
+
+    def stop(self):
+        """Cerrar el socket y cortar a los clientes"""
+        with self._cond:
+            self._running = False
+            clients = list(self._clients)
+            self._cond.notify_all()
+
+        for client in clients:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._listener.close()
+
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.unlink(bind_address)
+
+    # ----- Conexiones -----
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                sock, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._client_loop, args=(_Client(sock),), daemon=True).start()
+
+    def _client_loop(self, client):
+        """Hilo lector de una conexión: encola pedidos de detección"""
+        with self._cond:
+            self._clients.add(client)
+
+        try:
+            while self._running:
+                header, data = recv_message(client.sock)
+                op = header.get('op')
+
+                if op == 'detect':
+                    try:
+                        frames = _split_frames(data, header['shapes'])
+                        classes = header.get('classes')
+                        key = (int(header['imgsz']), float(header['conf']),
+                               tuple(int(c) for c in classes) if classes else None)
+                    except (KeyError, TypeError, ValueError) as e:
+                        client.reply({'id': header.get('id'), 'error': f'pedido inválido: {e}'})
+                        continue
+                    with self._cond:
+                        self._pending.append(_Request(client, header['id'], frames, key))
+                        self.requests += 1
+                        self._cond.notify()
+                elif op == 'stats':
+                    client.reply({'id': header.get('id'), 'stats': self.get_stats()})
+                else:
+                    client.reply({'id': header.get('id'), 'error': f'operación desconocida: {op}'})
+        except (ConnectionError, OSError, EOFError, ValueError):
+            pass  # Incluye encabezados que no son JSON válido
+        finally:
+            with self._cond:
+                self._clients.discard(client)
+                self._cond.notify()  # Un cliente menos puede completar el lote
+            client.sock.close()
+
+    # ----- Lotes -----
+
+    def _collect(self):
+        """
+        Esperar y sacar de la cola el próximo lote
+
+        Returns:
+            list: Pedidos del lote (vacía si se detuvo el servidor)
+        """
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait(0.5)
+            if not self._running:
+                return []
+
+            deadline = self._pending[0].received_at + self.max_wait
+            while True:
+                queued = sum(len(r.frames) for r in self._pending)
+                waiting = {r.client for r in self._pending}
+                if queued >= self.max_batch:
+                    reason = 'full'
+                    break
+                if waiting >= self._clients:
+                    reason = 'all_clients'
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    reason = 'deadline'
+                    break
+                self._cond.wait(remaining)
+
+            # Al menos un pedido aunque traiga más frames que max_batch
+            batch = [self._pending.popleft()]
+            count = len(batch[0].frames)
+            while self._pending and count + len(self._pending[0].frames) <= self.max_batch:
+                request = self._pending.popleft()
+                batch.append(request)
+                count += len(request.frames)
+
+            self.launch_reasons[reason] += 1
+            return batch
+
+    def _batch_loop(self):
+        while self._running:
+            batch = self._collect()
+
+            # Pedidos con distinto imgsz/conf/clases no pueden ir en la misma llamada
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.key, []).append(request)
+
+            for (imgsz, conf, classes), requests in groups.items():
+                self._run_group(requests, imgsz, conf, list(classes) if classes else None)
+
+    def _run_group(self, requests, imgsz, conf, classes):
+        frames = [frame for request in requests for frame in request.frames]
+        started = time.monotonic()
+
+        try:
+            results = self.detector.detect_batch(frames, imgsz=imgsz, conf=conf, classes=classes)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Error en lote de inferencia: {e}")
+            for request in requests:
+                request.client.reply({'id': request.id, 'error': str(e)})
+            return
+
+        infer_ms = (time.monotonic() - started) * 1000
+
+        with self._cond:
+            self.batches += 1
+            self.frames += len(frames)
+            self.max_batch_size = max(self.max_batch_size, len(frames))
+            self._batch_sizes.append(len(frames))
+            self._infer_ms.append(infer_ms)
+            self._queue_ms.extend((started - r.received_at) * 1000 for r in requests)
+
+        offset = 0
+        for request in requests:
+            count = len(request.frames)
+            counts, buffers = pack_results(results[offset:offset + count])
+            request.client.reply({'id': request.id, 'counts': counts}, buffers)
+            offset += count
+
+    # ----- Estadísticas -----
+
+    def get_stats(self):
+        """Tamaño de lote, tiempo en cola y tiempo de inferencia recientes"""
+        with self._cond:
+            sizes = list(self._batch_sizes)
+            queue_ms = np.array(self._queue_ms) if self._queue_ms else None
+            infer_ms = list(self._infer_ms)
+
+            return {
+                'clients': len(self._clients),
+                'pending': len(self._pending),
+                'batches': self.batches,
+                'frames': self.frames,
+                'requests': self.requests,
+                'errors': self.errors,
+                'avg_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'batch_size_histogram': dict(sorted(Counter(sizes).items())),
+                'launch_reasons': dict(self.launch_reasons),
+                'queue_ms_avg': round(float(queue_ms.mean()), 2) if queue_ms is not None else 0.0,
+                'queue_ms_p95': round(float(np.percentile(queue_ms, 95)), 2) if queue_ms is not None else 0.0,
+                'queue_ms_max': round(float(queue_ms.max()), 2) if queue_ms is not None else 0.0,
+                'infer_ms_avg': round(sum(infer_ms) / len(infer_ms), 2) if infer_ms else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+
+# ===== CLIENTE =====
+
+class InferenceClient:
+    """Conexión de un worker al servidor (un pedido a la vez, thread-safe)"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=REQUEST_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _connect(self):
+        family, connect_address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(connect_address)
+        except OSError:
+            sock.close()
+            raise
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _request(self, header, buffers=()):
+        """Enviar y esperar la respuesta; reconecta una vez si el servidor se reinició"""
+        with self._lock:
+            self._next_id += 1
+            header['id'] = self._next_id
+
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    send_message(self._sock, header, buffers)
+                    response, data = recv_message(self._sock)
+                    break
+                except (ConnectionError, OSError) as e:
+                    self._close()
+                    if attempt == 1 or isinstance(e, socket.timeout):
+                        raise ConnectionError(f'servidor de inferencia no disponible ({self.address}): {e}')
+
+        if 'error' in response:
+            raise RuntimeError(f"servidor de inferencia: {response['error']}")
+        return response, data
+
+    def detect(self, frames, imgsz=640, conf=0.25, classes=None):
+        """
+        Detectar en varios frames con un solo pedido
+
+        Returns:
+            list: Un (xyxy, conf, cls) por frame
+        """
+        frames = [np.ascontiguousarray(frame, dtype=np.uint8) for frame in frames]
+        header = {
+            'op': 'detect',
+            'imgsz': imgsz,
+            'conf': conf,
+            'classes': list(classes) if classes is not None else None,
+            'shapes': [frame.shape for frame in frames],
+        }
+        response, data = self._request(header, frames)
+        return unpack_results(response['counts'], data)
+
+    def get_stats(self):
+        """Estadísticas del servidor"""
+        return self._request({'op': 'stats'})[0]['stats']
@@ -85,6 +85,7 @@ TIME_PER_VEHICLE = 5      # ¡5 segundos extra por CADA vehículo!
 MAX_GREEN_TIME = 45       # Tiempo máximo en verde
 MIN_GREEN_TIME = 5        # Tiempo mínimo absoluto
 MIN_VEHICLES_FOR_PHASE = 1  # Mínimo de vehículos para activar una fase
+MAX_CICLOS_GRUPO = 3        # Máximo de ciclos seguidos para un grupo antes de cambiar
 
 # EJEMPLO DE CÓMO FUNCIONA AHORA:
 # - 1 vehículo  → 3 + 5  =  8 segundos en verde
@@ -122,9 +123,9 @@ def calculate_phase_priority(counts, phase):
     return total_vehicles, green_time
 
 
-def select_best_phase(counts, last_phase_id=-1):
+def decide_phase(counts, last_phase_id=-1, ciclos_grupo=0):
     """
-    Seleccionar la mejor fase según tráfico actual
+    Elegir la mejor fase según tráfico actual, SIN modificar state
     
     LÓGICA DE 4 FASES INDEPENDIENTES:
     - Cada fase tiene su tiempo proporcional a SUS vehículos
@@ -134,15 +135,16 @@ def select_best_phase(counts, last_phase_id=-1):
     Args:
         counts: Lista de 6 enteros con conteo de vehículos [A, B, C, D, E, F]
         last_phase_id: ID de la última fase ejecutada (1-4)
+        ciclos_grupo: Ciclos seguidos del grupo de la última fase
         
     Returns:
-        tuple: (phase_dict, green_time) o (None, 0)
+        tuple: (phase_dict, green_time, ciclos_grupo si la fase se ejecuta) o (None, 0, ciclos_grupo)
     """
     total_vehicles = sum(counts)
     
     if total_vehicles == 0:
         print("⏸️  NO hay vehículos - Sistema en espera")
-        return None, 0
+        return None, 0, ciclos_grupo
     
     # Calcular prioridad de cada una de las 4 fases
     phase_scores = []
@@ -166,7 +168,7 @@ def select_best_phase(counts, last_phase_id=-1):
     
     if not active_phases:
         print("⏸️  Ninguna fase tiene vehículos")
-        return None, 0
+        return None, 0, ciclos_grupo
     
     # Ordenar por cantidad de vehículos (mayor primero)
     active_phases.sort(key=lambda x: x['vehicles'], reverse=True)
@@ -178,10 +180,6 @@ def select_best_phase(counts, last_phase_id=-1):
             last_group = phase.get('group', None)
             break
     
-    from . import state as state_module
-    ciclos_grupo_actual = getattr(state_module, 'ciclos_grupo_actual', 0)
-    MAX_CICLOS_GRUPO = 3  # Máximo de ciclos seguidos para un grupo antes de cambiar
-    
     # REGLA DE SELECCIÓN:
     # 1. Priorizar la fase con más vehículos
     # 2. PERO si el grupo actual lleva muchos ciclos, cambiar al otro grupo
@@ -193,26 +191,26 @@ def select_best_phase(counts, last_phase_id=-1):
     best_phase = active_phases[0]
     best_group = best_phase['group']
     
-    if last_group and ciclos_grupo_actual >= MAX_CICLOS_GRUPO:
+    if last_group and ciclos_grupo >= MAX_CICLOS_GRUPO:
         # Buscar una fase del OTRO grupo que tenga vehículos
         other_group_phases = [p for p in active_phases if p['group'] != last_group]
         if other_group_phases:
             selected = other_group_phases[0]
-            print(f"\n⚖️ JUSTICIA: Grupo {last_group} tuvo {ciclos_grupo_actual} ciclos → Cambiando a {selected['group']}")
-            state_module.ciclos_grupo_actual = 1
+            print(f"\n⚖️ JUSTICIA: Grupo {last_group} tuvo {ciclos_grupo} ciclos → Cambiando a {selected['group']}")
+            new_ciclos = 1
         else:
             # No hay fases activas del otro grupo, continuar con el actual
             selected = best_phase
-            state_module.ciclos_grupo_actual = ciclos_grupo_actual + 1
+            new_ciclos = ciclos_grupo + 1
     else:
         # Seleccionar la fase con más vehículos
         selected = best_phase
         
-        # Actualizar contador de grupo
+        # Contador de grupo si esta fase se ejecuta
         if best_group == last_group:
-            state_module.ciclos_grupo_actual = ciclos_grupo_actual + 1
+            new_ciclos = ciclos_grupo + 1
         else:
-            state_module.ciclos_grupo_actual = 1
+            new_ciclos = 1
     
     # Obtener datos de la fase seleccionada
     phase = selected['phase']
@@ -230,8 +228,27 @@ def select_best_phase(counts, last_phase_id=-1):
     print(f"   Vehículos: {selected['vehicles']}")
     print(f"   Tiempo verde: {green_time}s")
     
-    # Guardar última fase
-    state_module.last_phase = phase['id']
+    return phase, green_time, new_ciclos
+
+
+def select_best_phase(counts, last_phase_id=-1):
+    """
+    Seleccionar la mejor fase y registrarla en state como ejecutada
+    
+    El controlador decide con decide_phase y aplica la justicia recién
+    cuando el ciclo arranca (ver controller.run_cycle).
+    
+    Returns:
+        tuple: (phase_dict, green_time) o (None, 0)
+    """
+    from . import state as state_module
+    
+    phase, green_time, ciclos_grupo = decide_phase(
+        counts, last_phase_id, getattr(state_module, 'ciclos_grupo_actual', 0)
+    )
+    if phase is not None:
+        state_module.ciclos_grupo_actual = ciclos_grupo
+        state_module.last_phase = phase['id']
     
     return phase, green_time
 
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Evaluar por Monte Carlo los parámetros de la lógica de fases (logic.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', type=int, default=1000, help='Escenarios de llegadas aleatorias')
+        parser.add_argument('--horizon', type=float, default=3600.0, help='Segundos simulados por escenario')
+        parser.add_argument('--workers', type=int, default=None, help='Procesos (por defecto uno por núcleo)')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla')
+        parser.add_argument('--top', type=int, default=15, help='Cuántos juegos de parámetros mostrar')
+        parser.add_argument('--base', type=float, nargs='+', help='Valores de BASE_GREEN_TIME')
+        parser.add_argument('--per-vehicle', type=float, nargs='+', help='Valores de TIME_PER_VEHICLE')
+        parser.add_argument('--max-green', type=float, nargs='+', help='Valores de MAX_GREEN_TIME')
+        parser.add_argument('--max-ciclos', type=int, nargs='+', help='Valores de MAX_CICLOS_GRUPO')
+
+    def handle(self, *args, **options):
+        from traffic.policy_eval import evaluate, current_params, PARAM_NAMES
+
+        grid = {
+            name: options[key]
+            for name, key in (
+                ('BASE_GREEN_TIME', 'base'),
+                ('TIME_PER_VEHICLE', 'per_vehicle'),
+                ('MAX_GREEN_TIME', 'max_green'),
+                ('MAX_CICLOS_GRUPO', 'max_ciclos'),
+            )
+            if options[key]
+        }
+
+        results = evaluate(
+            grid,
+            scenarios=options['scenarios'],
+            horizon=options['horizon'],
+            workers=options['workers'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write("\n" + "=" * 92)
+        self.stdout.write(f"{'BASE':>5} {'x VEH':>6} {'MAX':>5} {'CICL':>5} | "
+                          f"{'demora':>7} {'cola máx':>9} {'peor cola':>9} "
+                          f"{'hambruna':>9} {'peor':>6} {'ciclos/h':>9}")
+        self.stdout.write("-" * 92)
+        shown = results[:options['top']] + [r for r in results[options['top']:] if r['current']]
+        for r in shown:
+            base, per_vehicle, max_green, max_ciclos = (r['params'][name] for name in PARAM_NAMES)
+            line = (f"{base:>5} {per_vehicle:>6} {max_green:>5} {max_ciclos:>5} | "
+                    f"{r['avg_delay']:>6.2f}s {r['avg_max_queue']:>9.2f} {r['max_queue']:>9} "
+                    f"{r['avg_starvation']:>8.1f}s {r['max_starvation']:>5.0f}s {r['cycles_per_hour']:>9.1f}")
+            self.stdout.write(self.style.SUCCESS(line + "  ← actual") if r['current'] else line)
+        self.stdout.write("=" * 92)
+
+        if not any(r['current'] for r in results):
+            self.stdout.write(f"ℹ️  Los valores actuales {current_params()} no están en la grilla")
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Exportar el modelo YOLO a ONNX, ONNX INT8 u OpenVINO para los backends de CPU'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'format', choices=['onnx', 'onnx-int8', 'openvino', 'openvino-int8'],
+            help='Formato de salida'
+        )
+        parser.add_argument('--model', default='yolov8n.pt', help='Modelo .pt de origen')
+        parser.add_argument(
+            '--imgsz', type=int, default=1280,
+            help='Tamaño de entrada de referencia (fijo con --fixed)'
+        )
+        parser.add_argument(
+            '--fixed', action='store_true',
+            help='Entrada y lote fijos: más rápido, pero ignora el imgsz de cada recorte '
+                 '(usar solo con camera.INFERENCE_MODE = \'full\' y --imgsz = camera.INFERENCE_IMGSZ)'
+        )
+        parser.add_argument(
+            '--batch', type=int, default=1,
+            help='Lote del modelo con --fixed (>1 para el servidor de inferencia por lotes)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from ultralytics import YOLO
+        except ImportError:
+            raise CommandError('Exportar requiere ultralytics instalado')
+
+        model = YOLO(options['model'])
+        fmt = options['format']
+        # Por defecto tamaño y lote dinámicos: con TILING cada recorte pide su
+        # propio imgsz (tiling.region_imgsz) y un modelo fijo lo ignoraría
+        dynamic = not options['fixed']
+        shape = {
+            'imgsz': options['imgsz'],
+            'batch': 1 if dynamic else options['batch'],
+            'dynamic': dynamic,
+        }
+
+        if fmt == 'openvino-int8':
+            # Cuantización post-entrenamiento con NNCF (usa imágenes de calibración de COCO)
+            path = model.export(format='openvino', int8=True, **shape)
+        elif fmt == 'openvino':
+            path = model.export(format='openvino', **shape)
+        else:
+            path = model.export(format='onnx', simplify=True, **shape)
+
+            if fmt == 'onnx-int8':
+                path = self._quantize_onnx(path)
+
+        self.stdout.write(self.style.SUCCESS(f'Modelo exportado: {path}'))
+        if dynamic:
+            self.stdout.write("Entrada dinámica: respeta el imgsz de cada recorte (TILING)")
+        else:
+            self.stdout.write(f"⚠️ Entrada fija {options['imgsz']}: todo frame o recorte se escala a ese tamaño")
+        self.stdout.write("Configura settings.TRAFFIC_DETECTOR con el backend y la ruta del modelo")
+
+    def _quantize_onnx(self, onnx_path):
+        """Cuantización dinámica de pesos a INT8 con ONNX Runtime"""
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+        except ImportError:
+            raise CommandError('La cuantización INT8 requiere: pip install onnxruntime')
+
+        int8_path = str(onnx_path).replace('.onnx', '-int8.onnx')
+        quantize_dynamic(str(onnx_path), int8_path, weight_type=QuantType.QUInt8)
+        return int8_path
@@ -0,0 +1,68 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Servidor local de inferencia por lotes compartido por los workers de varias cámaras'
+
+    def add_arguments(self, parser):
+        from traffic.inference_server import DEFAULT_ADDRESS, MAX_BATCH, MAX_WAIT_MS
+
+        parser.add_argument('--address', default=DEFAULT_ADDRESS,
+                            help='Ruta del socket Unix o host:puerto')
+        parser.add_argument('--backend', default=None,
+                            help='Backend del detector (por defecto settings.TRAFFIC_DETECTOR)')
+        parser.add_argument('--model', default=None, help='Ruta del modelo')
+        parser.add_argument('--threads', type=int, default=None, help='Hilos de inferencia')
+        parser.add_argument('--max-batch', type=int, default=MAX_BATCH,
+                            help='Frames máximos por llamada al detector')
+        parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                            help='Espera máxima de un pedido antes de lanzar el lote')
+        parser.add_argument('--stats-interval', type=float, default=30.0,
+                            help='Segundos entre reportes de estadísticas (0 = nunca)')
+
+    def handle(self, *args, **options):
+        from traffic.detectors import DEFAULT_MODELS, create_detector, get_detector_config
+        from traffic.inference_server import InferenceServer
+
+        config = get_detector_config()
+        backend = options['backend'] or config['BACKEND']
+        if backend == 'remote':
+            raise CommandError("El servidor necesita un backend local (no 'remote'); usa --backend")
+
+        if options['model']:
+            model = options['model']
+        elif backend == config['BACKEND']:
+            model = config['MODEL']
+        else:
+            model = DEFAULT_MODELS.get(backend)
+        detector = create_detector(backend, model, options['threads'] or config['THREADS'])
+        detector.warmup()
+
+        server = InferenceServer(
+            detector,
+            address=options['address'],
+            max_batch=options['max_batch'],
+            max_wait_ms=options['max_wait_ms'],
+        )
+        server.start()
+        self.stdout.write(self.style.SUCCESS('Servidor de inferencia corriendo. Ctrl+C para detener.'))
+
+        interval = options['stats_interval']
+        last_report = time.monotonic()
+        try:
+            while True:
+                time.sleep(1)
+                if interval and time.monotonic() - last_report >= interval:
+                    last_report = time.monotonic()
+                    stats = server.get_stats()
+                    self.stdout.write(
+                        f"📊 {stats['clients']} clientes | {stats['batches']} lotes | "
+                        f"lote prom {stats['avg_batch_size']} (máx {stats['max_batch_size']}) | "
+                        f"cola prom {stats['queue_ms_avg']} ms, p95 {stats['queue_ms_p95']} ms | "
+                        f"inferencia {stats['infer_ms_avg']} ms"
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write('\nDeteniendo...')
+        finally:
+            server.stop()
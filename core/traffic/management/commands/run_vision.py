@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Ejecutar el worker de visión (captura + YOLO + conteo) sin servidor web'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--controller', action='store_true',
+            help='Iniciar también el controlador automático de semáforos'
+        )
+        parser.add_argument(
+            '--render', action='store_true',
+            help='Dibujar y codificar frames (solo útil si hay visores en este proceso)'
+        )
+
+    def handle(self, *args, **options):
+        from traffic import startup
+        startup.begin()
+
+        from traffic import camera, controller
+
+        # Este comando ya es un proceso aparte: el worker corre aquí mismo
+        camera.start_vision_worker(render=options['render'], process=False)
+
+        if options['controller']:
+            controller.start_auto_cycle()
+
+        # El Arduino solo hace falta si este proceso controla los semáforos
+        startup.start_warmup(arduino=options['controller'])
+
+        self.stdout.write(self.style.SUCCESS('Worker de visión corriendo. Ctrl+C para detener.'))
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('\nDeteniendo...')
+        finally:
+            if options['controller']:
+                controller.stop_auto_cycle()
+            camera.stop_vision_worker()
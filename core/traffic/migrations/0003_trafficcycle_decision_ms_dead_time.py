@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0002_trafficcycle_trafficstats_delete_trafficrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trafficcycle',
+            name='dead_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficcycle',
+            name='decision_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,162 @@
+"""
+Fuente MJPEG sobre HTTP (DroidCam) sin decodificar cada frame
+
+OpenCV decodifica todos los frames del stream y después los volvemos a
+codificar en JPEG para los visores. Este adaptador lee directamente los bytes
+JPEG del multipart: los frames se decodifican solo cuando hacen falta
+(inferencia o render) y, si el detector usa una entrada más chica, a escala
+reducida con IMREAD_REDUCED_COLOR_2/4. Los clientes de vista cruda reciben
+los bytes originales de la cámara sin recodificar.
+
+Cada parte se corta por su Content-Length cuando el encabezado lo trae (un
+JPEG puede tener FFD9 dentro, p. ej. en la miniatura EXIF); sin él se busca
+el fin de imagen (EOI).
+
+Tiene la misma interfaz básica que cv2.VideoCapture (isOpened, read,
+release), así que LatestFrameGrabber la usa igual; read() devuelve los bytes
+JPEG en lugar de un array.
+"""
+
+import re
+import urllib.request
+import cv2
+import numpy as np
+
+CHUNK_SIZE = 16384
+MAX_BUFFER = 4 * 1024 * 1024  # Descartar basura si no aparece un JPEG completo
+CONNECT_TIMEOUT = 5
+
+SOI = b'\xff\xd8'  # Inicio de imagen JPEG
+EOI = b'\xff\xd9'  # Fin de imagen JPEG
+HEADER_END = b'\r\n\r\n'
+CONTENT_LENGTH = re.compile(rb'content-length:[ \t]*(\d+)', re.IGNORECASE)
+
+# Factor de reducción → flag de decodificación de OpenCV
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class MjpegHttpSource:
+    """Lector de multipart/x-mixed-replace que entrega JPEG crudos"""
+
+    def __init__(self, url, timeout=CONNECT_TIMEOUT):
+        self.url = url
+        self._buffer = b''
+        self._response = None
+
+        try:
+            self._response = urllib.request.urlopen(url, timeout=timeout)
+        except Exception as e:
+            print(f"❌ Error abriendo MJPEG {url}: {e}")
+
+    def isOpened(self):
+        return self._response is not None
+
+    def read(self):
+        """
+        Leer el siguiente JPEG completo del stream
+
+        Returns:
+            tuple: (success, jpeg_bytes)
+        """
+        if self._response is None:
+            return False, None
+
+        try:
+            while True:
+                jpeg = self._next_part()
+                if jpeg is not None:
+                    return True, jpeg
+
+                chunk = self._response.read(CHUNK_SIZE)
+                if not chunk:
+                    return False, None
+
+                self._buffer += chunk
+                if len(self._buffer) > MAX_BUFFER:
+                    # Conservar solo desde el último inicio de imagen
+                    last_start = self._buffer.rfind(SOI)
+                    self._buffer = self._buffer[last_start:] if last_start != -1 else b''
+
+        except Exception as e:
+            print(f"⚠️ Error leyendo MJPEG: {e}")
+            return False, None
+
+    def _next_part(self):
+        """
+        Sacar del buffer el próximo JPEG completo
+
+        Returns:
+            bytes o None si todavía faltan datos
+        """
+        buffer = self._buffer
+        start = buffer.find(SOI)
+        header_end = buffer.find(HEADER_END)
+
+        if header_end != -1 and (start == -1 or header_end < start):
+            # Encabezados de la parte antes de la imagen
+            body = header_end + len(HEADER_END)
+            match = CONTENT_LENGTH.search(buffer, 0, header_end)
+            if match:
+                end = body + int(match.group(1))
+                if len(buffer) < end:
+                    return None
+                if buffer.startswith(SOI, body):
+                    self._buffer = buffer[end:]
+                    return buffer[body:end]
+            start = buffer.find(SOI, body)
+
+        # Sin Content-Length: cortar en el primer fin de imagen
+        if start == -1:
+            return None
+        end = buffer.find(EOI, start + 2)
+        if end == -1:
+            return None
+        self._buffer = buffer[end + 2:]
+        return buffer[start:end + 2]
+
+    def release(self):
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass
+            self._response = None
+
+
+def jpeg_size(jpeg):
+    """Leer ancho y alto del encabezado SOF sin decodificar la imagen"""
+    i = 2
+    n = len(jpeg)
+    while i + 9 < n:
+        if jpeg[i] != 0xFF:
+            i += 1
+            continue
+        marker = jpeg[i + 1]
+        # SOF0..SOF15 excepto DHT (C4), JPG (C8) y DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = (jpeg[i + 5] << 8) | jpeg[i + 6]
+            width = (jpeg[i + 7] << 8) | jpeg[i + 8]
+            return width, height
+        segment_length = (jpeg[i + 2] << 8) | jpeg[i + 3]
+        i += 2 + segment_length
+    return None
+
+
+def choose_reduction(frame_width, target_width):
+    """Mayor reducción (1, 2, 4, 8) que deja el frame al menos tan ancho como target_width"""
+    reduction = 1
+    for factor in (2, 4, 8):
+        if frame_width / factor >= target_width:
+            reduction = factor
+    return reduction
+
+
+def decode_jpeg(jpeg, reduction=1):
+    """Decodificar un JPEG, opcionalmente a 1/2, 1/4 o 1/8 de escala"""
+    flag = REDUCED_FLAGS.get(reduction, cv2.IMREAD_COLOR)
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), flag)
@@ -19,6 +19,10 @@ class TrafficCycle(models.Model):
     green_time = models.IntegerField(default=0)
     total_vehicles = models.IntegerField(default=0)
     
+    # Rendimiento del controlador
+    decision_ms = models.FloatField(null=True, blank=True)  # Tiempo que tomó decidir el ciclo
+    dead_time = models.FloatField(null=True, blank=True)    # Segundos sin verde desde el ciclo anterior
+    
     class Meta:
         ordering = ['-timestamp']
     
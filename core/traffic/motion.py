@@ -0,0 +1,112 @@
+"""
+Compuerta de movimiento para saltar inferencias innecesarias
+
+Compara una versión reducida en grises del frame contra la del último frame
+en que corrió YOLO, solo dentro de las zonas de detección. Si no cambió nada
+(escena vacía, de noche, cola detenida en rojo) no se vuelve a inferir y se
+reutilizan los conteos anteriores. Cada MAX_SKIP_SECONDS se fuerza una
+inferencia de refresco igual.
+"""
+
+import time
+import cv2
+import numpy as np
+from .zones import get_zone_label_map
+
+# ===== CONFIGURACIÓN =====
+MOTION_WIDTH = 160           # Ancho del frame reducido para comparar
+PIXEL_THRESHOLD = 25         # Diferencia de gris (0-255) para considerar un píxel cambiado
+MIN_CHANGED_FRACTION = 0.005 # Fracción de píxeles de zona cambiados para disparar YOLO
+MAX_SKIP_SECONDS = 3.0       # Forzar inferencia si pasó este tiempo sin inferir
+
+
+class MotionGate:
+    """Decide si un frame merece correr el detector"""
+
+    def __init__(self, max_skip_seconds=MAX_SKIP_SECONDS):
+        self.max_skip_seconds = max_skip_seconds
+        self._reference = None       # Frame reducido de la última inferencia
+        self._last_inference = 0.0
+        self._mask = None
+        self._mask_key = None
+
+        # Estadísticas
+        self.checks = 0
+        self.skipped = 0
+        self.last_changed_fraction = 0.0
+
+    def _zone_mask(self, frame_width, frame_height, small_size):
+        """Máscara de zonas a la resolución reducida (cacheada)"""
+        key = (frame_width, frame_height, small_size)
+        if self._mask_key != key:
+            labels = get_zone_label_map(frame_width, frame_height)
+            small = cv2.resize(labels, small_size, interpolation=cv2.INTER_NEAREST)
+            self._mask = small > 0
+            self._mask_key = key
+        return self._mask
+
+    def _prepare(self, frame, gray=None):
+        if gray is None or gray.shape[1] != MOTION_WIDTH:
+            h, w = frame.shape[:2]
+            small_h = max(1, int(h * MOTION_WIDTH / w))
+            small = cv2.resize(frame, (MOTION_WIDTH, small_h), interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame, gray=None):
+        """
+        True si hay cambios en las zonas o venció el intervalo máximo
+
+        Cuando devuelve True, el frame pasa a ser la nueva referencia.
+
+        Args:
+            gray: Miniatura en grises de MOTION_WIDTH ya calculada (opcional,
+                  la de FrameHealth), para no reducir el frame dos veces
+        """
+        self.checks += 1
+        now = time.monotonic()
+        gray = self._prepare(frame, gray)
+
+        run = False
+        if self._reference is None or self._reference.shape != gray.shape:
+            run = True
+        elif now - self._last_inference >= self.max_skip_seconds:
+            run = True
+        else:
+            h, w = frame.shape[:2]
+            mask = self._zone_mask(w, h, (gray.shape[1], gray.shape[0]))
+            changed = cv2.absdiff(gray, self._reference) > PIXEL_THRESHOLD
+            zone_pixels = np.count_nonzero(mask)
+            self.last_changed_fraction = (
+                float(np.count_nonzero(changed & mask)) / zone_pixels if zone_pixels else 0.0
+            )
+            run = self.last_changed_fraction >= MIN_CHANGED_FRACTION
+
+        if run:
+            self._reference = gray
+            self._last_inference = now
+        else:
+            self.skipped += 1
+
+        return run
+
+    def refresh_due(self):
+        """True si venció MAX_SKIP_SECONDS sin inferir (o no hay referencia)"""
+        return self._reference is None or time.monotonic() - self._last_inference >= self.max_skip_seconds
+
+    def reset(self):
+        """Olvidar la referencia (p. ej. tras reconectar la cámara)"""
+        self._reference = None
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.checks if self.checks else 0.0
+
+    def get_stats(self):
+        """Estadísticas de la compuerta"""
+        return {
+            'motion_checks': self.checks,
+            'motion_skipped': self.skipped,
+            'motion_skip_ratio': round(self.skip_ratio, 3),
+            'motion_changed_fraction': round(self.last_changed_fraction, 4),
+        }
@@ -0,0 +1,71 @@
+"""
+Capa estática de visualización (zonas, fondos de etiquetas, barra de estado)
+
+Todo lo que no cambia entre frames se dibuja UNA vez por resolución en una
+imagen + máscara, y en cada frame se copia encima con una sola operación.
+Solo el texto dinámico (conteos, brillo, estabilidad) se dibuja por frame.
+"""
+
+import cv2
+import numpy as np
+from .zones import ZONES, ZONE_NAMES, ZONE_COLORS, get_zone_pixel_polygon
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.5
+LABEL_THICKNESS = 2
+STATUS_BAR_HEIGHT = 40
+COUNT_DIGITS = 2  # Espacio reservado para el conteo en la etiqueta de cada zona
+
+_overlay_cache = {}
+
+
+class StaticOverlay:
+    """Capa precompilada para una resolución"""
+
+    def __init__(self, frame_width, frame_height):
+        self.size = (frame_width, frame_height)
+        self.image = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+        self.label_positions = []  # Posición del texto de cada zona
+
+        for i in range(len(ZONES)):
+            points = get_zone_pixel_polygon(i, frame_width, frame_height)
+            x1, y1 = points.min(axis=0).tolist()
+
+            cv2.polylines(self.image, [points], True, ZONE_COLORS[i], 2)
+
+            # Fondo de la etiqueta con ancho fijo para el conteo
+            template = f"{ZONE_NAMES[i]}: {'0' * COUNT_DIGITS}"
+            (text_w, text_h), _ = cv2.getTextSize(template, FONT, LABEL_SCALE, LABEL_THICKNESS)
+            cv2.rectangle(self.image, (x1, y1), (x1 + text_w + 10, y1 + text_h + 10),
+                          ZONE_COLORS[i], -1)
+            self.label_positions.append((x1 + 5, y1 + text_h + 5))
+
+        # Barra de estado inferior
+        cv2.rectangle(self.image, (0, frame_height - STATUS_BAR_HEIGHT),
+                      (frame_width, frame_height), (0, 0, 0), -1)
+
+        # Máscara: píxeles dibujados + barra de estado (que es negra)
+        self.mask = np.any(self.image > 0, axis=2).astype(np.uint8)
+        self.mask[frame_height - STATUS_BAR_HEIGHT:, :] = 1
+
+    def apply(self, frame):
+        """Copiar la capa estática sobre el frame (una sola operación)"""
+        cv2.copyTo(self.image, self.mask, frame)
+
+    def draw_counts(self, frame, counts):
+        """Texto dinámico de cada zona sobre su fondo precompilado"""
+        for i, (x, y) in enumerate(self.label_positions):
+            cv2.putText(frame, f"{ZONE_NAMES[i]}: {counts[i]}", (x, y),
+                        FONT, LABEL_SCALE, (0, 0, 0), LABEL_THICKNESS)
+
+
+def get_static_overlay(frame_width, frame_height):
+    """Capa estática para una resolución (se compila una sola vez)"""
+    key = (frame_width, frame_height, repr(ZONES))
+    overlay = _overlay_cache.get(key)
+
+    if overlay is None:
+        overlay = StaticOverlay(frame_width, frame_height)
+        _overlay_cache[key] = overlay
+
+    return overlay
@@ -0,0 +1,281 @@
+"""
+Evaluador Monte Carlo de la lógica de fases (fuera de línea)
+
+Para elegir BASE_GREEN_TIME, TIME_PER_VEHICLE, MAX_GREEN_TIME y
+MAX_CICLOS_GRUPO (logic.py) sin adivinar: un modelo de colas por carril
+(llegadas Poisson, descarga a flujo de saturación durante el verde) sobre
+las cuatro PHASES, con la misma regla de decisión que select_best_phase y
+traffic_controller (fase con más vehículos, justicia por grupo, las dos
+subfases del grupo ganador con su propio verde).
+
+Todo va vectorizado en NumPy: cada paso avanza un ciclo de decisión de
+TODOS los escenarios y TODOS los juegos de parámetros a la vez, en arrays
+(parámetros, escenarios, carriles). Los escenarios se reparten en bloques
+entre procesos, uno por núcleo.
+
+Simplificaciones del modelo:
+- El conteo que ve el controlador es la cola del carril.
+- Los vehículos que llegan durante el verde pueden salir en ese verde.
+- No se modela el escalonado entre carriles (LANE_STAGGER).
+
+Uso:
+    python manage.py evaluate_policy --scenarios 1000
+"""
+
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import logic
+
+# ===== CONFIGURACIÓN =====
+N_LANES = 6
+SCENARIOS = 1000                  # Escenarios de llegadas aleatorias
+HORIZON = 3600.0                  # Segundos simulados por escenario
+ARRIVAL_RATE = (0.01, 0.12)       # Llegadas por segundo y carril (uniforme por escenario)
+SATURATION_HEADWAY = 2.0          # Segundos entre vehículos que cruzan en verde
+CHUNK_SCENARIOS = 250             # Escenarios por tarea del pool
+
+# Grilla por defecto (nombre de constante en logic.py → valores)
+DEFAULT_GRID = {
+    'BASE_GREEN_TIME': (2, 3, 5),
+    'TIME_PER_VEHICLE': (2, 3, 5),
+    'MAX_GREEN_TIME': (30, 45, 60),
+    'MAX_CICLOS_GRUPO': (2, 3, 4),
+}
+PARAM_NAMES = tuple(DEFAULT_GRID)
+
+# Fases como arrays: máscara fase × carril y grupo de cada fase
+PHASE_MASK = np.array(
+    [[lane in phase['lanes'] for lane in range(N_LANES)] for phase in logic.PHASES],
+    dtype=np.float64,
+)
+_GROUPS = sorted({phase.get('group') for phase in logic.PHASES})
+PHASE_GROUP = np.array([_GROUPS.index(phase.get('group')) for phase in logic.PHASES])
+
+
+def current_params():
+    """Valores actuales de logic.py"""
+    return tuple(getattr(logic, name) for name in PARAM_NAMES)
+
+
+def build_grid(grid=None):
+    """
+    Producto cartesiano de la grilla
+
+    Returns:
+        np.ndarray: (P, 4) en el orden de PARAM_NAMES
+    """
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    return np.array(list(itertools.product(*(grid[name] for name in PARAM_NAMES))), dtype=np.float64)
+
+
+def default_timing():
+    """Tiempos fijos del ciclo, tomados del controlador"""
+    from . import controller
+    return {
+        'red_clearance': controller.RED_CLEARANCE,
+        'yellow': controller.YELLOW_TIME,
+        'cycle_pause': 0 if controller.PIPELINE_PLANNING else controller.CYCLE_PAUSE,
+        'wait_interval': controller.WAIT_INTERVAL,
+    }
+
+
+# ===== MODELO =====
+
+def _green_times(phase_vehicles, base, per_vehicle, max_green):
+    """
+    calculate_phase_priority vectorizado: 0 si la fase no tiene vehículos
+
+    Con el piso MIN_GREEN_TIME que el controlador aplica a cada subfase.
+    """
+    green = np.minimum(base + phase_vehicles * per_vehicle, max_green)
+    green = np.maximum(green, logic.MIN_GREEN_TIME)
+    return np.where(phase_vehicles > 0, green, 0.0)
+
+
+def _select_group(phase_vehicles, last_group, ciclos, max_ciclos):
+    """
+    select_best_phase vectorizado
+
+    Args:
+        phase_vehicles: (P, S, fases)
+        last_group: (P, S) grupo del ciclo anterior (-1 = ninguno)
+        ciclos: (P, S) ciclos seguidos del grupo anterior
+        max_ciclos: (P, 1) MAX_CICLOS_GRUPO de cada juego de parámetros
+
+    Returns:
+        tuple: (grupo elegido, ciclos actualizados)
+    """
+    active = phase_vehicles > 0
+    best = np.argmax(phase_vehicles, axis=-1)   # Empate → la primera, como el sort estable
+
+    other = active & (PHASE_GROUP != last_group[..., None])
+    switch = (last_group >= 0) & (ciclos >= max_ciclos) & other.any(axis=-1)
+    best_other = np.argmax(np.where(other, phase_vehicles, -1), axis=-1)
+
+    group = PHASE_GROUP[np.where(switch, best_other, best)]
+    ciclos = np.where(~switch & (group == last_group), ciclos + 1, 1)
+    return group, ciclos
+
+
+def simulate(params, n_scenarios, seed, horizon=HORIZON, timing=None):
+    """
+    Simular un bloque de escenarios para todos los juegos de parámetros
+
+    Args:
+        params: (P, 4) en el orden de PARAM_NAMES
+        n_scenarios: Escenarios del bloque
+        seed: Semilla o np.random.SeedSequence
+        horizon: Segundos simulados
+        timing: Tiempos fijos del ciclo (None = los del controlador)
+
+    Returns:
+        dict: Sumas y máximos por juego de parámetros (ver combine)
+    """
+    timing = timing or default_timing()
+    rng = np.random.default_rng(seed)
+    n_params = len(params)
+    shape = (n_params, n_scenarios)
+
+    base, per_vehicle, max_green, max_ciclos = (params[:, i, None] for i in range(4))
+    fixed = timing['red_clearance'] + timing['yellow'] + timing['cycle_pause']
+
+    # Mismas tasas de llegada para todos los juegos de parámetros (comparación justa)
+    rates = rng.uniform(*ARRIVAL_RATE, size=(1, n_scenarios, N_LANES))
+
+    queue = np.zeros(shape + (N_LANES,))
+    waiting = np.zeros(shape + (N_LANES,))       # Segundos en rojo con cola
+    t = np.zeros(shape)
+    last_group = np.full(shape, -1)
+    ciclos = np.zeros(shape, dtype=np.int64)
+
+    delay = np.zeros(shape)                      # Vehículo-segundos en cola
+    arrivals = np.zeros(shape)
+    max_queue = np.zeros(shape)
+    starvation = np.zeros(shape)
+    cycles = np.zeros(shape)
+
+    live = t < horizon
+    while live.any():
+        phase_vehicles = queue @ PHASE_MASK.T                     # (P, S, fases)
+        has_traffic = phase_vehicles.sum(axis=-1) > 0
+
+        group, new_ciclos = _select_group(phase_vehicles, last_group, ciclos, max_ciclos)
+        green = _green_times(phase_vehicles, base[..., None], per_vehicle[..., None], max_green[..., None])
+        green = np.where(PHASE_GROUP == group[..., None], green, 0.0)
+        lane_green = green @ PHASE_MASK                          # (P, S, carriles)
+
+        cycle = np.where(has_traffic, fixed + lane_green.max(axis=-1), timing['wait_interval'])
+        cycle = np.where(live, np.minimum(cycle, horizon - t), 0.0)
+
+        # Llegadas y descarga
+        new = rng.poisson(rates * cycle[..., None])
+        capacity = np.floor(lane_green / SATURATION_HEADWAY)
+        served = np.minimum(queue + new, capacity)
+        next_queue = queue + new - served
+
+        delay += ((queue + next_queue) / 2 * cycle[..., None]).sum(axis=-1)
+        arrivals += new.sum(axis=-1)
+        max_queue = np.maximum(max_queue, np.maximum(queue, next_queue).max(axis=-1))
+
+        waiting = np.where(lane_green > 0, 0.0, np.where(queue > 0, waiting + cycle[..., None], 0.0))
+        starvation = np.maximum(starvation, waiting.max(axis=-1))
+
+        ran = live & has_traffic
+        last_group = np.where(ran, group, last_group)
+        ciclos = np.where(ran, new_ciclos, ciclos)
+        cycles += ran
+        queue = next_queue
+        t += cycle
+        live = t < horizon
+
+    return {
+        'scenarios': n_scenarios,
+        'delay': delay.sum(axis=1),
+        'arrivals': arrivals.sum(axis=1),
+        'max_queue_sum': max_queue.sum(axis=1),
+        'max_queue': max_queue.max(axis=1),
+        'starvation_sum': starvation.sum(axis=1),
+        'starvation_max': starvation.max(axis=1),
+        'final_queue_sum': queue.sum(axis=(1, 2)),
+        'cycles': cycles.sum(axis=1),
+    }
+
+
+def combine(chunks):
+    """Juntar los resultados de varios bloques"""
+    total = dict(chunks[0])
+    for chunk in chunks[1:]:
+        for key, value in chunk.items():
+            if key in ('max_queue', 'starvation_max'):
+                total[key] = np.maximum(total[key], value)
+            else:
+                total[key] = total[key] + value
+    return total
+
+
+# ===== EVALUACIÓN =====
+
+def evaluate(grid=None, scenarios=SCENARIOS, horizon=HORIZON, workers=None, seed=0):
+    """
+    Evaluar una grilla de parámetros sobre escenarios de llegadas aleatorias
+
+    Args:
+        grid: {constante: valores} (faltantes = DEFAULT_GRID)
+        scenarios: Total de escenarios
+        horizon: Segundos simulados por escenario
+        workers: Procesos (None = uno por núcleo disponible)
+        seed: Semilla global
+
+    Returns:
+        list: Un dict por juego de parámetros, ordenado por demora promedio
+    """
+    from .cameras import available_cores
+
+    params = build_grid(grid)
+    timing = default_timing()
+    workers = workers or len(available_cores())
+
+    sizes = [CHUNK_SCENARIOS] * (scenarios // CHUNK_SCENARIOS)
+    if scenarios % CHUNK_SCENARIOS:
+        sizes.append(scenarios % CHUNK_SCENARIOS)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    started = time.perf_counter()
+    if workers > 1 and len(sizes) > 1:
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [
+                pool.submit(simulate, params, size, chunk_seed, horizon, timing)
+                for size, chunk_seed in zip(sizes, seeds)
+            ]
+            chunks = [future.result() for future in futures]
+    else:
+        chunks = [
+            simulate(params, size, chunk_seed, horizon, timing)
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+    elapsed = time.perf_counter() - started
+    total = combine(chunks)
+
+    current = current_params()
+    results = []
+    for i, values in enumerate(params):
+        values = tuple(int(v) if float(v).is_integer() else float(v) for v in values)
+        results.append({
+            'params': dict(zip(PARAM_NAMES, values)),
+            'current': values == current,
+            'avg_delay': round(float(total['delay'][i] / max(total['arrivals'][i], 1)), 2),
+            'avg_max_queue': round(float(total['max_queue_sum'][i] / scenarios), 2),
+            'max_queue': int(total['max_queue'][i]),
+            'avg_starvation': round(float(total['starvation_sum'][i] / scenarios), 1),
+            'max_starvation': round(float(total['starvation_max'][i]), 1),
+            'final_queue': round(float(total['final_queue_sum'][i] / scenarios), 2),
+            'cycles_per_hour': round(float(total['cycles'][i] / scenarios * 3600 / horizon), 1),
+        })
+
+    results.sort(key=lambda r: r['avg_delay'])
+    print(f"📈 {len(params)} juegos × {scenarios} escenarios en {elapsed:.1f}s ({workers} procesos)")
+    return results
@@ -0,0 +1,298 @@
+"""
+Planificador de eventos de luces del controlador
+
+Una fase ya no es una cadena de time.sleep(): el controlador arma un PLAN,
+una lista de eventos con su instante relativo (todo en rojo, verde de cada
+carril, amarillo, rojo), y el planificador los dispara en orden desde un
+heap, esperando con una Condition hasta el próximo evento. Así:
+
+- cancel() corta el plan en milisegundos (despierta la espera) y, con
+  `final=all_red`, deja todo en rojo sin que un evento pendiente vuelva a
+  poner un verde después: los eventos y el apagado final comparten un lock
+  de salida y cada evento revisa antes de salir que su plan siga vigente.
+  Además el planificador queda DETENIDO: un plan que llegue después (ya
+  decidido antes del cancel) no arranca hasta reset(). cancel(stop=False)
+  corta solo el plan en curso.
+- extend() corre el fin de verde (amarillo y rojo) de un grupo de carriles
+  mientras todavía está en verde: positivo lo alarga, negativo lo acorta.
+- run(on_clearing=...) avisa cuando ya no queda ningún verde ni amarillo
+  por salir (empezó el despeje), para decidir el próximo ciclo mientras
+  tanto; run(on_green=...) avisa cuando sale el primer verde del plan.
+
+Los instantes y las esperas pasan por clock.py (reloj real o simulado).
+"""
+
+import heapq
+import itertools
+import threading
+from . import clock
+
+ALL_LANES = None   # lane de un evento que pone todos los semáforos en rojo
+
+
+class LightEvent:
+    """Cambio de luz programado"""
+
+    __slots__ = ('at', 'lane', 'color', 'group')
+
+    def __init__(self, at, lane, color, group=None):
+        """
+        Args:
+            at: Segundos desde el inicio del plan
+            lane: Carril 0-5, o ALL_LANES para todo en rojo
+            color: 'G', 'Y' o 'R'
+            group: Subfase a la que pertenece (para extend)
+        """
+        self.at = at
+        self.lane = lane
+        self.color = color
+        self.group = group
+
+    def __repr__(self):
+        target = 'todos' if self.lane is ALL_LANES else self.lane
+        return f"LightEvent({self.at:.2f}s, {target}, {self.color}, {self.group})"
+
+
+def plan_duration(events):
+    """Duración de un plan (instante del último evento)"""
+    return max((event.at for event in events), default=0.0)
+
+
+class LightScheduler:
+    """Ejecuta planes de eventos de luces; un plan a la vez"""
+
+    def __init__(self, set_light, all_red):
+        self._set_light = set_light
+        self._all_red = all_red
+
+        self._cond = threading.Condition()
+        self._output_lock = threading.Lock()   # Eventos y apagado final, nunca a la vez
+        self._run_lock = threading.Lock()      # Un plan a la vez
+        self._heap = []                        # (instante absoluto, orden, evento)
+        self._order = itertools.count()
+        self._generation = 0                   # Cambia al cancelar: invalida el plan en curso
+        self._stopped = False                  # cancel() detiene hasta reset(): ningún plan arranca
+        self._plan_started = None
+
+        # Estadísticas
+        self.plans_completed = 0
+        self.plans_cancelled = 0
+        self.events_fired = 0
+        self.max_lateness_ms = 0.0
+
+    # ----- Ejecución -----
+
+    def run(self, events, on_clearing=None, on_green=None):
+        """
+        Ejecutar un plan; bloquea hasta que termina o se cancela
+
+        Args:
+            events: Lista de LightEvent
+            on_clearing: Función a llamar (en este hilo) cuando ya salió el
+                         último amarillo del plan
+            on_green: Función a llamar (en este hilo) cuando sale el primer
+                      verde del plan
+
+        Returns:
+            bool: True si se ejecutaron todos los eventos (False si se
+                  canceló o el planificador está detenido)
+        """
+        with self._run_lock:
+            with self._cond:
+                if self._stopped:
+                    self.plans_cancelled += 1
+                    return False
+                generation = self._generation
+                start = clock.now()
+                self._plan_started = start
+                for event in events:
+                    heapq.heappush(self._heap, (start + event.at, next(self._order), event))
+
+            try:
+                while True:
+                    event, due = self._next_event(generation)
+                    if event is None:
+                        completed = due
+                        break
+
+                    with self._output_lock:
+                        if generation != self._generation or self._stopped:
+                            completed = False
+                            break
+                        self._fire(event)
+                        self.max_lateness_ms = max(
+                            self.max_lateness_ms, (clock.now() - due) * 1000
+                        )
+
+                    if on_green is not None and event.color == 'G':
+                        on_green()
+                        on_green = None
+
+                    if on_clearing is not None and self._clearing(generation):
+                        on_clearing()
+                        on_clearing = None
+            finally:
+                with self._cond:
+                    if generation == self._generation:
+                        self._heap.clear()
+                    self._plan_started = None
+
+            if completed:
+                self.plans_completed += 1
+            else:
+                self.plans_cancelled += 1
+            return completed
+
+    def _next_event(self, generation):
+        """
+        Esperar el próximo evento del plan
+
+        Returns:
+            tuple: (evento, instante) cuando le toca, o (None, completado)
+                   si el plan terminó (True) o se canceló (False)
+        """
+        with self._cond:
+            while True:
+                if generation != self._generation or self._stopped:
+                    return None, False
+                if not self._heap:
+                    return None, True
+
+                due, _, event = self._heap[0]
+                delay = due - clock.now()
+                if delay <= 0:
+                    heapq.heappop(self._heap)
+                    return event, due
+                clock.wait(self._cond, delay)
+
+    def _clearing(self, generation):
+        """True si al plan vigente ya no le quedan verdes ni amarillos"""
+        with self._cond:
+            return generation == self._generation and not any(
+                event.color in ('G', 'Y') for _, _, event in self._heap
+            )
+
+    def _fire(self, event):
+        self.events_fired += 1
+        if event.lane is ALL_LANES:
+            self._all_red()
+        else:
+            self._set_light(event.lane, event.color)
+
+    # ----- Control -----
+
+    def cancel(self, final=None, stop=True):
+        """
+        Cortar el plan en curso
+
+        Args:
+            final: Función a ejecutar cuando ya no puede salir ningún evento
+                   del plan cancelado (ej: all_red)
+            stop: Dejar el planificador detenido hasta reset(); así un plan
+                  decidido antes del cancel tampoco llega a arrancar
+        """
+        with self._cond:
+            if stop:
+                self._stopped = True
+            self._generation += 1
+            self._heap.clear()
+            self._cond.notify_all()
+
+        if final is not None:
+            with self._output_lock:
+                final()
+
+    def reset(self):
+        """Volver a aceptar planes después de un cancel() que detuvo el planificador"""
+        with self._cond:
+            self._stopped = False
+
+    def extend(self, seconds, group=None):
+        """
+        Alargar (o acortar, con seconds < 0) el verde de un grupo en curso
+
+        Se corren el amarillo y el rojo pendientes del grupo; el verde no
+        puede terminar antes que ahora.
+
+        Args:
+            group: Subfase a modificar (None = todas las que siguen en verde)
+
+        Returns:
+            float: Segundos que realmente se corrió (0 si no había verde que cambiar)
+        """
+        with self._cond:
+            now = clock.now()
+            groups = {
+                event.group for _, _, event in self._heap
+                if event.color == 'Y' and (group is None or event.group == group)
+            }
+            if not groups:
+                return 0.0
+
+            shifted = 0.0
+            entries = []
+            for group_name in groups:
+                first_yellow = min(
+                    due for due, _, event in self._heap
+                    if event.group == group_name and event.color == 'Y'
+                )
+                delta = max(seconds, now - first_yellow)
+                shifted = delta if abs(delta) > abs(shifted) else shifted
+                entries.append((group_name, delta))
+
+            for group_name, delta in entries:
+                self._heap = [
+                    (due + delta, order, event)
+                    if event.group == group_name and event.color in ('Y', 'R') else (due, order, event)
+                    for due, order, event in self._heap
+                ]
+            heapq.heapify(self._heap)
+            self._cond.notify_all()
+            return shifted
+
+    # ----- Estado -----
+
+    def green_remaining(self, group=None):
+        """
+        Segundos de verde que le quedan a un grupo (o al más largo)
+
+        Returns:
+            float: 0 si no hay verde en curso
+        """
+        with self._cond:
+            yellows = [
+                due for due, _, event in self._heap
+                if event.color == 'Y' and (group is None or event.group == group)
+            ]
+        if not yellows:
+            return 0.0
+        return max(0.0, max(yellows) - clock.now())
+
+    @property
+    def busy(self):
+        return self._plan_started is not None
+
+    @property
+    def stopped(self):
+        with self._cond:
+            return self._stopped
+
+    def get_status(self):
+        """Plan en curso y estadísticas"""
+        with self._cond:
+            now = clock.now()
+            pending = sorted(self._heap)
+            started = self._plan_started
+            stopped = self._stopped
+
+        return {
+            'plan_running': started is not None,
+            'stopped': stopped,
+            'plan_elapsed': round(now - started, 2) if started is not None else 0.0,
+            'pending_events': len(pending),
+            'next_event_in': round(max(0.0, pending[0][0] - now), 2) if pending else None,
+            'plans_completed': self.plans_completed,
+            'plans_cancelled': self.plans_cancelled,
+            'events_fired': self.events_fired,
+            'max_lateness_ms': round(self.max_lateness_ms, 1),
+        }
@@ -0,0 +1,248 @@
+"""
+Simulación del controlador con reloj virtual
+
+Corre el ciclo automático REAL (smart_auto_cycle → plan_cycle →
+decide_phase → planificador de luces) contra una traza de conteos,
+con un SimulatedClock (clock.py) y un set_light falso que registra cada
+cambio. Las esperas del controlador no bloquean: 24 horas de tráfico se
+reproducen en segundos.
+
+Uso:
+    python manage.py simulate_controller --hours 24
+"""
+
+import contextlib
+import functools
+import io
+import math
+import time
+from collections import deque
+import numpy as np
+from .clock import SimulatedClock, use_clock
+from .scheduler import ALL_LANES, LightScheduler
+from .logic import PHASES
+from . import clock, controller, state
+
+# ===== CONFIGURACIÓN =====
+TRACE_STEP = 5.0                                # Segundos entre muestras de la traza
+LANE_DEMAND = (0.5, 1.2, 1.0, 0.5, 1.0, 1.2)    # Vehículos esperando por carril en hora pico media
+NIGHT_FACTOR = 0.05                             # Demanda de madrugada respecto al pico medio
+RUSH_HOURS = ((8.0, 1.0, 2.5), (18.0, 1.5, 3.0))  # (hora, ancho en horas, multiplicador)
+
+
+# ===== TRAZA SINTÉTICA =====
+
+def demand_profile(hours):
+    """
+    Multiplicador de demanda según la hora del día
+
+    Curva diurna (mínimo a las 3:00) más las horas pico de RUSH_HOURS.
+    """
+    hours = np.asarray(hours, dtype=np.float64) % 24
+    daytime = NIGHT_FACTOR + (1 - NIGHT_FACTOR) * (1 - np.cos(2 * math.pi * (hours - 3) / 24)) / 2
+    rush = sum(
+        (peak - 1) * np.exp(-0.5 * ((hours - center) / width) ** 2)
+        for center, width, peak in RUSH_HOURS
+    )
+    return daytime * (1 + rush)
+
+
+def synthetic_trace(hours=24.0, step=TRACE_STEP, seed=0):
+    """
+    Conteos por carril muestreados cada `step` segundos
+
+    Returns:
+        tuple: (times (N,) en segundos desde las 0:00, counts (N, 6) enteros)
+    """
+    rng = np.random.default_rng(seed)
+    times = np.arange(0.0, hours * 3600, step)
+    demand = demand_profile(times / 3600)[:, None] * np.asarray(LANE_DEMAND)
+    return times, rng.poisson(demand)
+
+
+# ===== SEMÁFOROS FALSOS =====
+
+class RecordingLights:
+    """set_light / all_red falsos: registran cada cambio con la hora simulada"""
+
+    def __init__(self):
+        self.events = []                   # (instante, carril o None = todos, color)
+        self.states = ['R'] * 6
+        self.violations = []               # (instante, carril, carriles en conflicto en verde)
+        self._conflicts = {
+            lane: set(phase['conflicts']) for phase in PHASES for lane in phase['lanes']
+        }
+
+    def set_light(self, lane, color='G'):
+        now = clock.now()
+        self.events.append((now, lane, color))
+        self.states[lane] = color
+
+        if color == 'G':
+            green = {l for l, c in enumerate(self.states) if c == 'G'}
+            clash = green & self._conflicts.get(lane, set())
+            if clash:
+                self.violations.append((now, lane, sorted(clash)))
+        return True
+
+    def all_red(self):
+        self.events.append((clock.now(), ALL_LANES, 'R'))
+        self.states = ['R'] * 6
+        return True
+
+    def green_intervals(self, lane, end):
+        """Intervalos (inicio, fin) en verde de un carril"""
+        intervals = []
+        started = None
+        for at, event_lane, color in self.events:
+            if event_lane is not ALL_LANES and event_lane != lane:
+                continue
+            if color == 'G' and started is None:
+                started = at
+            elif color != 'G' and started is not None:
+                intervals.append((started, at))
+                started = None
+        if started is not None:
+            intervals.append((started, end))
+        return intervals
+
+
+@contextlib.contextmanager
+def simulated_controller(lights, actuated=None):
+    """
+    Conectar el controlador a `lights` y a un reloj simulado dentro del bloque
+
+    Guarda y restaura el estado compartido que la simulación modifica.
+
+    Args:
+        actuated: Forzar el modo actuado (None = controller.ACTUATED_MODE)
+    """
+    if controller.controller_running:
+        raise RuntimeError("El controlador real está corriendo en este proceso")
+
+    saved_state = (
+        state.vehicle_counts, state.vehicle_count, state.last_phase,
+        state.ciclos_grupo_actual, list(state.light_states),
+    )
+    saved_controller = (
+        controller.scheduler, controller.all_red, controller.RECORD_CYCLES,
+        controller.cycle_stats, controller.ACTUATED_MODE,
+    )
+
+    sim = SimulatedClock()
+    controller.scheduler = LightScheduler(lights.set_light, lights.all_red)
+    controller.all_red = lights.all_red
+    controller.RECORD_CYCLES = False
+    controller.cycle_stats = deque()   # Todos los ciclos de la simulación
+    if actuated is not None:
+        controller.ACTUATED_MODE = actuated
+    try:
+        with use_clock(sim):
+            yield sim
+    finally:
+        (controller.scheduler, controller.all_red, controller.RECORD_CYCLES,
+         controller.cycle_stats, controller.ACTUATED_MODE) = saved_controller
+        controller.controller_running = False
+        controller._stop_event.clear()
+        (state.vehicle_counts, state.vehicle_count, state.last_phase,
+         state.ciclos_grupo_actual, state.light_states) = saved_state
+
+
+# ===== REPRODUCCIÓN =====
+
+def _set_counts(counts):
+    # Igual que la visión: avisa a los listeners (modo actuado)
+    state.update_vehicle_counts(counts)
+
+
+def _stop_controller():
+    controller.controller_running = False
+    controller._stop_event.set()
+
+
+def replay(times, counts, quiet=True, actuated=None):
+    """
+    Reproducir una traza con el ciclo automático real y un reloj simulado
+
+    Args:
+        times: Instantes de cada muestra (segundos, crecientes)
+        counts: Conteos por carril (N, 6)
+        quiet: Silenciar los prints del controlador
+        actuated: Forzar el modo actuado (None = controller.ACTUATED_MODE)
+
+    Returns:
+        dict: Reporte (ver summarize)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    step = float(times[1] - times[0]) if len(times) > 1 else TRACE_STEP
+    end = float(times[-1]) + step
+
+    lights = RecordingLights()
+    phases_chosen = {}
+
+    started = time.perf_counter()
+    with simulated_controller(lights, actuated) as sim:
+        for at, row in zip(times, counts.tolist()):
+            sim.call_at(float(at), functools.partial(_set_counts, row))
+        sim.call_at(end, _stop_controller)
+
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            controller.smart_auto_cycle()
+        simulated_end = sim.now()
+        # Solo ciclos completados: un plan descartado no cuenta
+        for cycle in controller.cycle_stats:
+            phases_chosen[cycle['phase']] = phases_chosen.get(cycle['phase'], 0) + 1
+        scheduler_stats = controller.scheduler.get_status()
+        cycle_stats = controller.get_cycle_stats()
+
+    report = summarize(lights, times, counts, max(end, simulated_end))
+    report.update(
+        wall_seconds=round(time.perf_counter() - started, 2),
+        phases_chosen=phases_chosen,
+        plans_completed=scheduler_stats['plans_completed'],
+        avg_decision_ms=cycle_stats['avg_decision_ms'],
+        avg_dead_time=cycle_stats['avg_dead_time'],
+        actuated=cycle_stats['actuated'],
+        avg_green_shift=cycle_stats['avg_green_shift'],
+    )
+    report['speedup'] = round(report['simulated_hours'] * 3600 / max(report['wall_seconds'], 1e-6))
+    return report
+
+
+def summarize(lights, times, counts, end):
+    """
+    Métricas de una reproducción
+
+    - green_seconds: segundos en verde por carril
+    - waiting_share: fracción del tiempo con vehículos esperando en rojo
+    - max_wait_seconds: mayor espera seguida en rojo con vehículos (hambruna)
+    """
+    step = float(times[1] - times[0]) if len(times) > 1 else TRACE_STEP
+    green_seconds, waiting_share, max_wait = [], [], []
+
+    for lane in range(counts.shape[1]):
+        intervals = lights.green_intervals(lane, end)
+        green_seconds.append(round(sum(b - a for a, b in intervals), 1))
+
+        # Verde/rojo en cada muestra de la traza
+        green = np.zeros(len(times), dtype=bool)
+        for a, b in intervals:
+            green[np.searchsorted(times, a):np.searchsorted(times, b)] = True
+
+        waiting = (counts[:, lane] > 0) & ~green
+        waiting_share.append(round(float(waiting.mean()), 3))
+
+        # Racha más larga de muestras esperando
+        edges = np.diff(np.concatenate(([0], waiting.astype(np.int8), [0])))
+        runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        max_wait.append(round(float(runs.max() * step) if len(runs) else 0.0, 1))
+
+    return {
+        'simulated_hours': round(end / 3600, 2),
+        'light_changes': len(lights.events),
+        'conflict_violations': len(lights.violations),
+        'green_seconds': green_seconds,
+        'waiting_share': waiting_share,
+        'max_wait_seconds': max_wait,
+    }
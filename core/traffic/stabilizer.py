@@ -0,0 +1,141 @@
+"""
+Estabilizador de conteos por zona
+
+Guarda las últimas `window` lecturas en un array circular (window, zonas) y
+mantiene por zona sumas acumuladas y colas monótonas para el máximo de la
+ventana, así cada lectura nueva cuesta O(1) por zona (amortizado) sin recorrer
+el historial. La mediana es la excepción: mantiene la ventana ordenada por
+zona con bisect (búsqueda O(log window), inserción y borrado O(window) en una
+lista corta) en vez de ordenar todo el historial en cada lectura.
+
+POLÍTICAS:
+- 'max':    máximo de las últimas `max_window` lecturas (la del sistema en vivo:
+            si se detectó aunque sea 1 vez recientemente, se mantiene)
+- 'mean':   promedio de la ventana, redondeado; 0 si es menor a `mean_threshold`
+            (la de la calibración con test_camera)
+- 'median': mediana de la ventana
+- 'ewma':   promedio móvil exponencial con factor `alpha`
+"""
+
+from bisect import bisect_left, insort
+from collections import deque
+import numpy as np
+
+POLICIES = ('max', 'mean', 'median', 'ewma')
+
+
+class CountStabilizer:
+    """Estabilizador incremental sobre un buffer circular NumPy"""
+
+    def __init__(self, n_zones=6, window=10, policy='max', max_window=5,
+                 min_frames=2, mean_threshold=0.4, alpha=0.3):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy}. Opciones: {POLICIES}")
+
+        self.n_zones = n_zones
+        self.window = window
+        self.policy = policy
+        self.max_window = min(max_window, window)
+        self.min_frames = min_frames
+        self.mean_threshold = mean_threshold
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """Vaciar el historial y volver a conteos en cero"""
+        self._ring = np.zeros((self.window, self.n_zones), dtype=np.int64)
+        self._sums = np.zeros(self.n_zones, dtype=np.int64)
+        self._ewma = np.zeros(self.n_zones, dtype=np.float64)
+        self._max_deques = [deque() for _ in range(self.n_zones)]  # (seq, valor)
+        self._sorted = [[] for _ in range(self.n_zones)]  # Ventana ordenada (mediana)
+        self._seq = 0
+        self.frames = 0  # Lecturas en la ventana (≤ window)
+        self.stable = [0] * self.n_zones
+
+    def push(self, counts):
+        """
+        Agregar una lectura y devolver los conteos estabilizados
+
+        Args:
+            counts: Secuencia de n_zones enteros
+
+        Returns:
+            list: Conteos estabilizados
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        slot = self._seq % self.window
+
+        # Sumas acumuladas: entra la lectura nueva, sale la más vieja
+        if self.frames == self.window:
+            self._sums -= self._ring[slot]
+            oldest = self._ring[slot].tolist()
+        else:
+            self.frames += 1
+            oldest = None
+        self._push_sorted(counts, oldest)
+        self._ring[slot] = counts
+        self._sums += counts
+
+        self._push_max(counts)
+        self._ewma = counts if self._seq == 0 else (
+            self.alpha * counts + (1 - self.alpha) * self._ewma
+        )
+        self._seq += 1
+
+        if self.frames >= self.min_frames:
+            self.stable = self._compute()
+
+        return self.stable
+
+    def _push_max(self, counts):
+        """Colas monótonas decrecientes: el frente es el máximo de la ventana"""
+        if self.policy != 'max':
+            return
+
+        seq = self._seq
+        oldest_valid = seq - self.max_window + 1
+
+        for zone, value in enumerate(counts.tolist()):
+            dq = self._max_deques[zone]
+            while dq and dq[-1][1] <= value:
+                dq.pop()
+            dq.append((seq, value))
+            while dq[0][0] < oldest_valid:
+                dq.popleft()
+
+    def _push_sorted(self, counts, oldest):
+        """Mantener la ventana ordenada por zona (solo la política 'median')"""
+        if self.policy != 'median':
+            return
+
+        for zone, value in enumerate(counts.tolist()):
+            window = self._sorted[zone]
+            if oldest is not None:
+                del window[bisect_left(window, oldest[zone])]
+            insort(window, value)
+
+    def _compute(self):
+        if self.policy == 'max':
+            return [dq[0][1] if dq else 0 for dq in self._max_deques]
+
+        if self.policy == 'mean':
+            avg = self._sums / self.frames
+            return np.where(avg >= self.mean_threshold, np.round(avg), 0).astype(int).tolist()
+
+        if self.policy == 'median':
+            mid = self.frames // 2
+            if self.frames % 2:
+                return [window[mid] for window in self._sorted]
+            return np.round([(w[mid - 1] + w[mid]) / 2 for w in self._sorted]).astype(int).tolist()
+
+        # ewma
+        return np.round(self._ewma).astype(int).tolist()
+
+    @property
+    def fill_ratio(self):
+        """Qué tan llena está la ventana (0-1)"""
+        return self.frames / self.window
+
+    @property
+    def is_stable(self):
+        return self.frames >= self.window
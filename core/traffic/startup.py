@@ -0,0 +1,141 @@
+"""
+Arranque diferido de recursos pesados y reporte de tiempos
+
+Importar la app no carga el modelo ni abre el puerto serie, así que
+`manage.py migrate`, `shell` o los tests no pagan esos costos. Cuando arranca
+el servidor (apps.ready) o el worker headless (run_vision), start_warmup()
+carga el detector y conecta el Arduino en hilos de fondo y, al terminar,
+imprime cuánto tardó cada etapa del arranque en frío.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_started_at = None       # time.perf_counter() al llamar begin()
+_timings = {}            # Etapa → segundos que tardó
+_marks = {}              # Hito → segundos desde begin()
+_detector_ready = threading.Event()
+_detector_lock = threading.Lock()
+_warmup_thread = None
+
+
+def begin():
+    """Marcar el inicio del arranque (idempotente)"""
+    global _started_at
+
+    with _lock:
+        if _started_at is None:
+            _started_at = time.perf_counter()
+
+
+def record(name, seconds):
+    """Guardar la duración de una etapa"""
+    with _lock:
+        _timings[name] = seconds
+
+
+@contextmanager
+def timed(name):
+    """Medir la duración de un bloque como etapa del arranque"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def mark(name):
+    """Registrar un hito (ej: primer frame) la primera vez que ocurre"""
+    with _lock:
+        if name in _marks or _started_at is None:
+            return
+        _marks[name] = time.perf_counter() - _started_at
+
+    print(f"⏱️  {name}: {_marks[name]:.2f}s desde el arranque")
+
+
+def warm_detector():
+    """Cargar y calentar el detector una sola vez (lo comparten todos los hilos)"""
+    with _detector_lock:
+        if _detector_ready.is_set():
+            return
+
+        from .detectors import get_detector
+
+        try:
+            with timed('detector_load'):
+                detector = get_detector()
+            with timed('detector_warmup'):
+                detector.warmup()
+            print(f"🧠 Detector listo ({_timings['detector_load'] + _timings['detector_warmup']:.1f}s)")
+        except Exception as e:
+            print(f"⚠️ No se pudo precargar el detector: {e}")
+        finally:
+            _detector_ready.set()
+
+
+def warm_arduino():
+    """Abrir el puerto serie antes del primer comando"""
+    from .arduino import warmup_arduino
+
+    with timed('arduino_connect'):
+        warmup_arduino()
+
+
+def start_warmup(arduino=True, detector=True):
+    """
+    Precargar detector y Arduino en segundo plano (idempotente)
+
+    Args:
+        arduino (bool): Conectar también el Arduino
+        detector (bool): Cargar el detector (False si la visión corre en
+                         otro proceso, que carga el suyo)
+    """
+    global _warmup_thread
+
+    begin()
+
+    with _lock:
+        if _warmup_thread is not None:
+            return False
+
+        def run():
+            threads = []
+            if detector:
+                threads.append(threading.Thread(target=warm_detector, daemon=True))
+            if arduino:
+                threads.append(threading.Thread(target=warm_arduino, daemon=True))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            mark('warmup_done')
+            print_startup_report()
+
+        _warmup_thread = threading.Thread(target=run, daemon=True)
+        _warmup_thread.start()
+        return True
+
+
+def get_startup_report():
+    """Duración de cada etapa e hitos del arranque, en milisegundos"""
+    with _lock:
+        return {
+            'timings_ms': {name: round(s * 1000, 1) for name, s in _timings.items()},
+            'marks_ms': {name: round(s * 1000, 1) for name, s in _marks.items()},
+        }
+
+
+def print_startup_report():
+    """Imprimir el reporte de arranque en frío"""
+    report = get_startup_report()
+
+    print("\n" + "=" * 60)
+    print("⏱️  REPORTE DE ARRANQUE")
+    for name, ms in report['timings_ms'].items():
+        print(f"   - {name}: {ms:.0f} ms")
+    for name, ms in report['marks_ms'].items():
+        print(f"   - {name}: {ms:.0f} ms desde el arranque")
+    print("=" * 60 + "\n")
@@ -4,6 +4,7 @@ Usado para compartir información entre módulos
 """
 
 import threading
+import time
 
 # Lock para acceso thread-safe
 _state_lock = threading.Lock()
@@ -12,6 +13,19 @@ _state_lock = threading.Lock()
 camera_active = False
 vehicle_count = 0
 vehicle_counts = [0, 0, 0, 0, 0, 0]  # Conteo por cada carril
+vision_stats = {}  # Métricas del pipeline de visión (frames descartados, latencia, etc.)
+latest_detections = None  # Última detección: arrays de cajas/clases/zonas + timestamp
+camera_fault = None  # Motivo de falla de la cámara (ej: 'frozen') o None si está sana
+camera_connection = {  # Estado de la conexión con la cámara (ver camera_manager.py)
+    'status': 'stopped',
+    'outage_started': None,  # Hora (time.time) en que se perdió el video, None si hay video
+    'last_outage_seconds': None,
+    'failed_attempts': 0,
+    'outages': 0,
+    'last_error': None,
+}
+_counts_listeners = []  # Funciones avisadas cuando cambian los conteos (ver controller.py, modo actuado)
+cameras = {}  # Estado por cámara del registro (conteos por carril, actividad, falla); ver vision_process.py
 
 # ===== ESTADO DEL CONTROLADOR =====
 last_green = -1  # Último carril que tuvo luz verde
@@ -24,12 +38,39 @@ ciclos_grupo_actual = 0  # Cuántos ciclos seguidos ha tenido el grupo actual (A
 
 
 def update_vehicle_counts(new_counts):
-    """Actualizar conteo de vehículos de forma thread-safe"""
+    """
+    Actualizar conteo de vehículos de forma thread-safe
+    
+    Si cambiaron, avisa a los listeners con (conteos nuevos, conteos
+    anteriores), en este mismo hilo y fuera del lock
+    """
     global vehicle_counts, vehicle_count
     
     with _state_lock:
+        previous = list(vehicle_counts)
+        changed = list(new_counts) != previous
         vehicle_counts = new_counts
         vehicle_count = sum(new_counts)
+        listeners = list(_counts_listeners) if changed else []
+    
+    for listener in listeners:
+        try:
+            listener(list(new_counts), previous)
+        except Exception as e:
+            print(f"⚠️ Error en listener de conteos: {e}")
+
+
+def add_counts_listener(listener):
+    """Registrar listener(counts, previous) para cada cambio de conteos"""
+    with _state_lock:
+        _counts_listeners.append(listener)
+
+
+def remove_counts_listener(listener):
+    """Quitar un listener registrado con add_counts_listener"""
+    with _state_lock:
+        if listener in _counts_listeners:
+            _counts_listeners.remove(listener)
 
 
 def get_vehicle_counts():
@@ -38,6 +79,80 @@ def get_vehicle_counts():
         return vehicle_counts.copy()
 
 
+def update_vision_stats(**stats):
+    """Actualizar métricas del pipeline de visión de forma thread-safe"""
+    with _state_lock:
+        vision_stats.update(stats)
+
+
+def get_vision_stats():
+    """Obtener copia de las métricas del pipeline de visión"""
+    with _state_lock:
+        return dict(vision_stats)
+
+
+def set_camera_fault(reason):
+    """Marcar (o limpiar con None) una falla de la cámara"""
+    global camera_fault
+    
+    with _state_lock:
+        camera_fault = reason
+
+
+def get_camera_fault():
+    """Motivo de la falla actual de la cámara (o None)"""
+    with _state_lock:
+        return camera_fault
+
+
+def update_camera_connection(**info):
+    """Actualizar el estado de la conexión con la cámara de forma thread-safe"""
+    with _state_lock:
+        camera_connection.update(info)
+
+
+def get_camera_connection():
+    """Estado de la conexión, con la duración del corte actual en segundos"""
+    with _state_lock:
+        info = dict(camera_connection)
+    
+    started = info['outage_started']
+    info['outage_seconds'] = round(time.time() - started, 1) if started else 0.0
+    return info
+
+
+def update_camera(camera_id, **info):
+    """Actualizar el estado de una cámara de forma thread-safe"""
+    with _state_lock:
+        cameras.setdefault(camera_id, {}).update(info)
+
+
+def get_cameras():
+    """Copia del estado de cada cámara (id → dict)"""
+    with _state_lock:
+        return {camera_id: dict(info) for camera_id, info in cameras.items()}
+
+
+def reset_cameras():
+    """Olvidar el estado de las cámaras (al relanzar los workers)"""
+    with _state_lock:
+        cameras.clear()
+
+
+def update_latest_detections(detections):
+    """Guardar la última detección (dict de arrays, no se modifica después)"""
+    global latest_detections
+    
+    with _state_lock:
+        latest_detections = detections
+
+
+def get_latest_detections():
+    """Obtener la última detección (o None si aún no hubo ninguna)"""
+    with _state_lock:
+        return latest_detections
+
+
 def update_last_green(lane):
     """Actualizar último carril con luz verde"""
     global last_green
@@ -48,10 +163,11 @@ def update_last_green(lane):
 
 def reset_state():
     """Resetear todo el estado"""
-    global camera_active, vehicle_count, vehicle_counts, last_green, current_phase
+    global camera_active, vehicle_count, vehicle_counts, last_green, current_phase, camera_fault
     
     with _state_lock:
         camera_active = False
+        camera_fault = None
         vehicle_count = 0
         vehicle_counts = [0, 0, 0, 0, 0, 0]
         last_green = -1
@@ -63,6 +179,8 @@ def get_full_state():
     with _state_lock:
         return {
             'camera_active': camera_active,
+            'camera_fault': camera_fault,
+            'camera_status': camera_connection['status'],
             'vehicle_count': vehicle_count,
             'vehicle_counts': vehicle_counts.copy(),
             'last_green': last_green,
@@ -0,0 +1,420 @@
+"""
+Difusión de frames JPEG hacia múltiples clientes MJPEG
+
+Un solo productor (el hilo de la cámara) publica el último frame codificado.
+Cada cliente HTTP lee siempre el frame más reciente: si un cliente es lento
+se salta los frames intermedios (drop-on-slow) en vez de acumularlos, así el
+costo de captura + YOLO es el mismo sin importar cuántos estén mirando.
+
+VARIANTES: cada combinación (ancho, fps, calidad JPEG) pedida en video_feed
+es una variante con su propio buffer. En cada tick el productor codifica cada
+variante activa UNA sola vez y todos los clientes de esa variante comparten
+los mismos bytes.
+
+VISTA CRUDA: el buffer `raw` reenvía los JPEG tal como llegan de la cámara
+(sin anotaciones ni recodificación) a los clientes de video_feed?raw=1.
+"""
+
+import os
+import threading
+import time
+import cv2
+
+
+class FrameBroadcaster:
+    """Buffer de difusión de un solo slot (último frame publicado)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._closed = True
+        self._subscribers = 0
+
+        # Estadísticas
+        self.frames_published = 0
+        self.frames_dropped = 0  # Frames que algún cliente lento no alcanzó a leer
+        self.bytes_sent = 0      # Bytes entregados a todos los clientes
+
+    def open(self):
+        """Marcar el buffer como activo (productor arrancando)"""
+        with self._cond:
+            self._closed = False
+
+    def close(self):
+        """Cerrar el buffer: los clientes conectados terminan su stream"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def publish(self, frame_bytes):
+        """Publicar un nuevo frame JPEG y despertar a los clientes"""
+        with self._cond:
+            self._frame = frame_bytes
+            self._seq += 1
+            self.frames_published += 1
+            self._cond.notify_all()
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return self._subscribers
+
+    @property
+    def is_open(self):
+        with self._cond:
+            return not self._closed
+
+    def latest(self):
+        """Último frame publicado (o None si aún no hay)"""
+        with self._cond:
+            return self._frame
+
+    def subscribe(self, wait_timeout=1.0):
+        """
+        Generador de frames para UN cliente
+
+        Entrega siempre el frame más reciente. Si el productor publicó varios
+        frames mientras el cliente enviaba el anterior, los intermedios se
+        descartan para ese cliente.
+        """
+        with self._cond:
+            self._subscribers += 1
+            last_seq = self._seq - 1 if self._frame is not None else self._seq
+
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._seq != last_seq or self._closed,
+                        timeout=wait_timeout
+                    )
+
+                    if self._seq == last_seq:
+                        if self._closed:
+                            return
+                        continue
+
+                    skipped = self._seq - last_seq - 1
+                    if skipped > 0:
+                        self.frames_dropped += skipped
+
+                    frame = self._frame
+                    last_seq = self._seq
+                    self.bytes_sent += len(frame)
+
+                yield frame
+
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def get_stats(self):
+        """Estadísticas del buffer de difusión"""
+        with self._cond:
+            return {
+                'subscribers': self._subscribers,
+                'frames_published': self.frames_published,
+                'frames_dropped': self.frames_dropped,
+                'bytes_sent': self.bytes_sent,
+                'active': not self._closed,
+            }
+
+
+# ===== VARIANTES DE STREAM =====
+DEFAULT_QUALITY = 95     # Calidad JPEG por defecto de OpenCV
+MIN_WIDTH = 160
+WIDTH_STEP = 16          # El ancho se redondea para no crear variantes casi iguales
+MAX_FPS = 30
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+MAX_VARIANTS = 8
+VARIANT_GRACE = 5.0      # Segundos tras pedir una variante en que no se desaloja (el cliente aún no empezó a leer)
+
+
+def normalize_variant(width=None, fps=None, quality=None):
+    """
+    Validar y redondear los parámetros de una variante
+
+    Returns:
+        tuple: (width, fps, quality); width/fps None = nativo / sin límite
+    """
+    if width is not None:
+        width = max(MIN_WIDTH, int(width) // WIDTH_STEP * WIDTH_STEP)
+    if fps is not None:
+        fps = round(min(MAX_FPS, max(0.1, float(fps))), 1)
+    quality = DEFAULT_QUALITY if quality is None else int(min(MAX_QUALITY, max(MIN_QUALITY, int(quality))))
+    return width, fps, quality
+
+
+class StreamVariant:
+    """Una resolución / frecuencia / calidad con su propio buffer de difusión"""
+
+    def __init__(self, width, fps, quality):
+        self.width = width
+        self.fps = fps
+        self.quality = quality
+        self.broadcaster = FrameBroadcaster()
+        self._last_encode = 0.0
+        self.last_requested = time.monotonic()
+
+        # Estadísticas
+        self.frames_encoded = 0
+        self.bytes_encoded = 0
+
+    @property
+    def key(self):
+        return (self.width, self.fps, self.quality)
+
+    def is_due(self, now):
+        """True si toca codificar según el límite de fps"""
+        return self.fps is None or now - self._last_encode >= 1.0 / self.fps
+
+    def encode(self, frame, now):
+        """Codificar y publicar un frame ya redimensionado"""
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+
+        frame_bytes = buffer.tobytes()
+        self._last_encode = now
+        self.frames_encoded += 1
+        self.bytes_encoded += len(frame_bytes)
+        self.broadcaster.publish(frame_bytes)
+        return frame_bytes
+
+    def get_stats(self):
+        stats = self.broadcaster.get_stats()
+        stats.update({
+            'width': self.width or 'native',
+            'fps': self.fps or 'max',
+            'quality': self.quality,
+            'frames_encoded': self.frames_encoded,
+            'bytes_encoded': self.bytes_encoded,
+        })
+        return stats
+
+
+class StreamHub:
+    """Conjunto de variantes alimentadas por un solo productor"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._variants = {}
+        self._open = False
+        self.raw = FrameBroadcaster()  # JPEG originales de la cámara
+
+    def get_variant(self, width=None, fps=None, quality=None):
+        """Obtener (o crear) la variante pedida"""
+        key = normalize_variant(width, fps, quality)
+        default = normalize_variant()
+
+        with self._lock:
+            variant = self._variants.get(key)
+            if variant is None and key != default:
+                if self._is_full(default):
+                    self._evict_idle()
+                if self._is_full(default):
+                    # Sin espacio: usar la variante nativa por defecto
+                    key = default
+                    variant = self._variants.get(key)
+
+            if variant is None:
+                variant = StreamVariant(*key)
+                if self._open:
+                    variant.broadcaster.open()
+                self._variants[key] = variant
+
+            # El cliente se registra recién en su primer next(): hasta entonces
+            # la variante figura sin suscriptores y no debe desalojarse
+            variant.last_requested = time.monotonic()
+            return variant
+
+    def _is_full(self, default):
+        """Sin lugar para otra variante: la nativa por defecto siempre tiene uno reservado"""
+        return len(self._variants) + (default not in self._variants) >= MAX_VARIANTS
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, variant in list(self._variants.items()):
+            if (variant.broadcaster.subscriber_count == 0
+                    and now - variant.last_requested >= VARIANT_GRACE):
+                variant.broadcaster.close()
+                del self._variants[key]
+
+    def open(self):
+        with self._lock:
+            self._open = True
+            self.raw.open()
+            for variant in self._variants.values():
+                variant.broadcaster.open()
+
+    def close(self):
+        with self._lock:
+            self._open = False
+            self.raw.close()
+            for variant in self._variants.values():
+                variant.broadcaster.close()
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            variants = list(self._variants.values())
+        return sum(v.broadcaster.subscriber_count for v in variants) + self.raw.subscriber_count
+
+    def wants_raw(self):
+        """True si hay clientes de la vista cruda"""
+        return self.raw.subscriber_count > 0
+
+    def publish_raw(self, jpeg):
+        """Reenviar un JPEG original de la cámara, sin recodificar"""
+        self.raw.publish(jpeg)
+
+    def wants_frame(self):
+        """True si alguna variante con clientes necesita un frame en este tick"""
+        now = time.monotonic()
+        with self._lock:
+            variants = list(self._variants.values())
+        return any(v.broadcaster.subscriber_count > 0 and v.is_due(now) for v in variants)
+
+    def publish_frame(self, frame):
+        """
+        Codificar el frame para cada variante con clientes y que le toque
+
+        Cada ancho se redimensiona una sola vez aunque varias variantes
+        (distinta calidad o fps) lo compartan.
+        """
+        now = time.monotonic()
+        with self._lock:
+            variants = [v for v in self._variants.values()
+                        if v.broadcaster.subscriber_count > 0 and v.is_due(now)]
+
+        h, w = frame.shape[:2]
+        resized = {}
+
+        for variant in variants:
+            target_w = variant.width if variant.width and variant.width < w else w
+            scaled = resized.get(target_w)
+            if scaled is None:
+                if target_w == w:
+                    scaled = frame
+                else:
+                    target_h = max(1, round(h * target_w / w))
+                    scaled = cv2.resize(frame, (target_w, target_h), interpolation=cv2.INTER_AREA)
+                resized[target_w] = scaled
+
+            variant.encode(scaled, now)
+
+    def subscribe(self, width=None, fps=None, quality=None, raw=False):
+        """Generador de frames JPEG de una variante (o de la vista cruda) para UN cliente"""
+        if raw:
+            return self.raw.subscribe()
+        variant = self.get_variant(width, fps, quality)
+        return variant.broadcaster.subscribe()
+
+    def get_stats(self):
+        """Estadísticas por variante (incluye ancho de banda)"""
+        with self._lock:
+            variants = list(self._variants.values())
+
+        return {
+            'subscribers': sum(v.broadcaster.subscriber_count for v in variants)
+                           + self.raw.subscriber_count,
+            'active': self._open,
+            'variants': [v.get_stats() for v in variants],
+            'raw': self.raw.get_stats(),
+        }
+
+
+# ===== SNAPSHOT =====
+SNAPSHOT_INTERVAL = 1.0        # Segundos mínimos entre snapshots codificados
+SNAPSHOT_DEMAND_SECONDS = 30   # Se siguen generando mientras alguien los pida
+SNAPSHOT_WAIT = 1.5            # Segundos que espera un pedido a que llegue un snapshot nuevo
+SNAPSHOT_MAX_AGE = 5.0         # Más viejo que esto no se sirve (visión caída)
+SNAPSHOT_QUALITY = 80
+
+# Prefijo de ETag único por proceso: _seq vuelve a 1 al reiniciar y un
+# navegador con "snap-1" en caché recibiría un 304 con la imagen vieja
+_ETAG_NONCE = f"{os.getpid():x}{time.time_ns():x}"
+
+
+class SnapshotCache:
+    """
+    Último frame anotado en JPEG para snapshot.jpg
+
+    Pedir un snapshot no dispara captura ni inferencia: solo marca demanda
+    para que el worker de visión codifique un frame (a lo sumo uno por
+    SNAPSHOT_INTERVAL) mientras haya clientes pidiendo. Un cliente que pide
+    cada tanto (sin demanda reciente) espera en get_fresh() el próximo frame
+    en vez de recibir el que quedó de su pedido anterior.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stored = threading.Condition(self._lock)
+        self._jpeg = None
+        self._etag = None
+        self._seq = 0
+        self._captured_at = None
+        self._last_store = 0.0
+        self._last_demand = 0.0
+
+    def touch(self):
+        """Registrar que alguien pidió un snapshot"""
+        with self._lock:
+            self._last_demand = time.monotonic()
+
+    def wants_frame(self):
+        """True si hay demanda reciente y el snapshot actual ya es viejo"""
+        now = time.monotonic()
+        with self._lock:
+            return (
+                now - self._last_demand <= SNAPSHOT_DEMAND_SECONDS
+                and now - self._last_store >= SNAPSHOT_INTERVAL
+            )
+
+    def store(self, frame, captured_at=None):
+        """Codificar y guardar un frame anotado"""
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, SNAPSHOT_QUALITY])
+        if ret:
+            self.store_bytes(buffer.tobytes(), captured_at)
+
+    def store_bytes(self, jpeg, captured_at=None):
+        """Guardar un JPEG ya codificado"""
+        with self._lock:
+            self._seq += 1
+            self._jpeg = jpeg
+            self._etag = f'"snap-{_ETAG_NONCE}-{self._seq}"'
+            self._captured_at = captured_at or time.time()
+            self._last_store = time.monotonic()
+            self._stored.notify_all()
+
+    def get(self):
+        """
+        Returns:
+            tuple: (jpeg, etag, captured_at) o (None, None, None) si aún no hay
+        """
+        with self._lock:
+            return self._jpeg, self._etag, self._captured_at
+
+    def get_fresh(self, timeout=None):
+        """
+        Marcar demanda y, si el frame guardado se capturó hace más de
+        SNAPSHOT_INTERVAL, esperar hasta `timeout` (None = SNAPSHOT_WAIT) a que
+        el worker guarde otro
+
+        Returns:
+            tuple: (jpeg, etag, captured_at, segundos desde la captura) o
+                   (None, None, None, None) si aún no hay
+        """
+        with self._stored:
+            self._last_demand = time.monotonic()
+            if self._jpeg is None or time.time() - self._captured_at > SNAPSHOT_INTERVAL:
+                seq = self._seq
+                self._stored.wait_for(lambda: self._seq != seq,
+                                      SNAPSHOT_WAIT if timeout is None else timeout)
+
+            if self._jpeg is None:
+                return None, None, None, None
+            age = max(0.0, time.time() - self._captured_at)
+            return self._jpeg, self._etag, self._captured_at, age
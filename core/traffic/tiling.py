@@ -0,0 +1,288 @@
+"""
+Inferencia recortada a las zonas de detección
+
+En vez de pasar el frame completo a YOLO con imgsz=1280, se recorta a las
+regiones donde hay zonas y se infiere cada recorte a un tamaño proporcional,
+conservando la misma escala (píxeles de entrada por píxel de cámara) que la
+inferencia de frame completo. Así los vehículos pequeños se siguen viendo
+igual de grandes, pero el cielo y las casas fuera de las zonas no se procesan.
+
+El ahorro depende del backend y de cuánto del frame cubren las zonas. Lo
+que cuesta es la entrada del detector (ver input_pixels):
+- Ultralytics letterboxea un frame solo (o un lote de frames iguales) a un
+  rectángulo: el frame completo de 1280x720 a imgsz 1280 entra como 1280x736.
+  Un lote de recortes de distinta forma se rellena a cuadrados de imgsz.
+- Los modelos exportados (ONNX / OpenVINO) siempre letterboxean a un cuadrado:
+  el frame completo entra como 1280x1280.
+
+Por eso los recortes se eligen según el backend. Con las zonas de zones.py
+(franjas de avenida de lado a lado) y un frame de 1280x720:
+- Modelo exportado: 2 recortes de imgsz 704, ~60% de la entrada del frame
+  completo.
+- Ultralytics: esos 2 recortes (formas distintas, un lote) costarían más que
+  el frame completo; se usan 3 recortes con imgsz distintos, cada uno
+  rectangular, ~79% de la entrada.
+Si los recortes no ahorran al menos MIN_INPUT_SAVING de la entrada se usa
+el frame completo (recortar y deduplicar también cuesta).
+
+MODOS:
+- 'full':  frame completo (comportamiento original)
+- 'roi':   un solo recorte con la caja envolvente de todas las zonas
+- 'tiles': un recorte por grupo de zonas (zonas cercanas se fusionan), o la
+           caja envolvente si cuesta menos
+
+Las cajas se devuelven en coordenadas del frame y se eliminan los duplicados
+que aparecen donde dos recortes se superponen.
+"""
+
+import numpy as np
+from .zones import ZONES, get_zone_pixel_polygon
+from .detectors import empty_result
+
+TILE_MARGIN = 0.04   # Margen alrededor de cada zona (fracción del ancho del frame)
+STRIDE = 32          # imgsz debe ser múltiplo del stride de YOLO
+DEDUP_IOU = 0.5      # IoU para considerar dos cajas la misma detección
+DEDUP_IOMIN = 0.7    # Caja cortada en un borde: intersección / área de la menor
+MIN_INPUT_SAVING = 0.2  # Entrada que deben ahorrar los recortes frente al frame completo
+
+_regions_cache = {}
+
+
+def _zone_boxes(frame_width, frame_height, margin):
+    """Caja envolvente de cada zona en píxeles, con margen"""
+    boxes = []
+    for i in range(len(ZONES)):
+        points = get_zone_pixel_polygon(i, frame_width, frame_height)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        boxes.append([
+            max(0, x1 - margin), max(0, y1 - margin),
+            min(frame_width, x2 + margin), min(frame_height, y2 + margin)
+        ])
+    return boxes
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _union(a, b):
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def _cost(box, square_input=True):
+    """Costo aproximado de un recorte: letterbox cuadrado del lado mayor, o su área"""
+    w, h = box[2] - box[0], box[3] - box[1]
+    return max(w, h) ** 2 if square_input else w * h
+
+
+def _merge_tiles(boxes, square_input=True):
+    """
+    Fusionar el par de cajas cuya unión más ahorra costo de detector, mientras
+    alguna unión no cueste más que las dos por separado
+    """
+    boxes = [list(b) for b in boxes]
+
+    while True:
+        best = None
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                union = _union(boxes[i], boxes[j])
+                saving = (_cost(boxes[i], square_input) + _cost(boxes[j], square_input)
+                          - _cost(union, square_input))
+                if saving >= 0 and (best is None or saving > best[0]):
+                    best = (saving, i, j, union)
+        if best is None:
+            return boxes
+
+        _, i, j, union = best
+        boxes[i] = union
+        del boxes[j]
+
+
+def get_inference_regions(frame_width, frame_height, mode='tiles', full_imgsz=1280,
+                          square_input=True):
+    """
+    Recortes (x1, y1, x2, y2) a inferir para una resolución
+
+    Se calculan una vez por resolución, modo, backend y configuración de zonas.
+
+    Args:
+        full_imgsz: imgsz equivalente sobre el frame completo
+        square_input: El detector rellena cada entrada a un cuadrado
+                      (Detector.square_input)
+    """
+    key = (frame_width, frame_height, mode, full_imgsz, square_input, repr(ZONES))
+    regions = _regions_cache.get(key)
+    if regions is not None:
+        return regions
+
+    full = [(0, 0, frame_width, frame_height)]
+
+    if mode == 'full':
+        regions = full
+    else:
+        margin = int(TILE_MARGIN * frame_width)
+        boxes = _zone_boxes(frame_width, frame_height, margin)
+
+        roi = boxes[0]
+        for box in boxes[1:]:
+            roi = _union(roi, box)
+        candidates = [[roi]]
+        if mode != 'roi':
+            candidates.insert(0, _merge_tiles(boxes, square_input))
+
+        def cost(boxes):
+            return input_pixels(boxes, full_imgsz, frame_width, frame_height, square_input)
+
+        # Recortes más baratos, solo si ahorran frente al frame completo
+        boxes = min(candidates, key=cost)
+        if cost(boxes) > cost(full) * (1 - MIN_INPUT_SAVING):
+            boxes = full
+
+        regions = [tuple(int(v) for v in box) for box in boxes]
+
+    _regions_cache[key] = regions
+    return regions
+
+
+def _padded(side):
+    return int(np.ceil(side / STRIDE)) * STRIDE
+
+
+def region_imgsz(region, full_imgsz, frame_width, frame_height):
+    """imgsz del recorte con la misma escala que full_imgsz sobre el frame completo"""
+    x1, y1, x2, y2 = region
+    scale = full_imgsz / max(frame_width, frame_height)
+    side = max(x2 - x1, y2 - y1) * scale
+    return max(STRIDE, _padded(side))
+
+
+def input_pixels(regions, full_imgsz, frame_width, frame_height, square_input=True):
+    """
+    Píxeles de entrada al detector para inferir `regions` como detect_in_regions
+
+    Los recortes con el mismo imgsz van en un lote. Un lote entra como
+    rectángulos (lado menor redondeado al stride) solo si el detector lo
+    permite y todos sus frames tienen la misma forma; si no, cada frame se
+    rellena a un cuadrado de imgsz.
+    """
+    by_imgsz = {}
+    for region in regions:
+        by_imgsz.setdefault(region_imgsz(region, full_imgsz, frame_width, frame_height), []).append(region)
+
+    total = 0
+    for imgsz, group in by_imgsz.items():
+        shapes = {(x2 - x1, y2 - y1) for x1, y1, x2, y2 in group}
+        if square_input or len(shapes) > 1:
+            total += len(group) * imgsz ** 2
+            continue
+        (w, h), = shapes
+        ratio = imgsz / max(w, h)
+        total += len(group) * _padded(w * ratio) * _padded(h * ratio)
+    return total
+
+
+def dedupe_boxes(xyxy, conf, cls, iou_threshold=DEDUP_IOU, iomin_threshold=DEDUP_IOMIN):
+    """
+    Eliminar duplicados entre recortes (greedy por confianza, por clase)
+
+    Además del IoU se usa intersección / área de la caja menor, porque un
+    vehículo cortado por el borde de un recorte queda como una caja parcial
+    contenida en la caja completa del recorte vecino.
+
+    Returns:
+        np.ndarray: Índices de las cajas que se conservan
+    """
+    n = len(xyxy)
+    if n <= 1:
+        return np.arange(n)
+
+    order = np.argsort(-conf)
+    boxes = xyxy[order].astype(np.float64)
+    classes = cls[order]
+
+    ix1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    iy1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    ix2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    iy2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = areas[:, None] + areas[None, :] - inter
+    smaller = np.minimum(areas[:, None], areas[None, :])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        duplicate = (
+            (inter / np.where(union > 0, union, 1) >= iou_threshold)
+            | (inter / np.where(smaller > 0, smaller, 1) >= iomin_threshold)
+        )
+    duplicate &= classes[:, None] == classes[None, :]
+
+    keep = np.ones(n, dtype=bool)
+    for i in range(n):
+        if keep[i]:
+            suppressed = duplicate[i].copy()
+            suppressed[:i + 1] = False
+            keep &= ~suppressed
+
+    return np.sort(order[keep])
+
+
+def detect_in_regions(detector, frame, regions, full_imgsz, conf=0.25, classes=None):
+    """
+    Correr el detector sobre cada recorte y volver a coordenadas del frame
+
+    Returns:
+        tuple: (xyxy, conf, cls) igual que Detector.detect
+    """
+    h, w = frame.shape[:2]
+
+    if len(regions) == 1 and regions[0] == (0, 0, w, h):
+        return detector.detect(frame, imgsz=full_imgsz, conf=conf, classes=classes)
+
+    # Recortes con el mismo imgsz van en un solo lote al detector
+    by_imgsz = {}
+    for region in regions:
+        by_imgsz.setdefault(region_imgsz(region, full_imgsz, w, h), []).append(region)
+
+    all_xyxy, all_conf, all_cls = [], [], []
+
+    for imgsz, group in by_imgsz.items():
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in group]
+        results = detector.detect_batch(crops, imgsz=imgsz, conf=conf, classes=classes)
+
+        for (x1, y1, _, _), (xyxy, scores, labels) in zip(group, results):
+            if not len(xyxy):
+                continue
+            all_xyxy.append(xyxy + np.array([x1, y1, x1, y1], dtype=xyxy.dtype))
+            all_conf.append(scores)
+            all_cls.append(labels)
+
+    if not all_xyxy:
+        return empty_result()
+
+    xyxy = np.concatenate(all_xyxy)
+    scores = np.concatenate(all_conf)
+    labels = np.concatenate(all_cls)
+
+    if len(regions) > 1:
+        keep = dedupe_boxes(xyxy, scores, labels)
+        xyxy, scores, labels = xyxy[keep], scores[keep], labels[keep]
+
+    return xyxy, scores, labels
+
+
+def pixel_fraction(frame_width, frame_height, mode='tiles', full_imgsz=1280, square_input=True):
+    """Fracción de píxeles del frame que se procesan respecto al modo 'full'"""
+    regions = get_inference_regions(frame_width, frame_height, mode, full_imgsz, square_input)
+    used = sum(_area(r) for r in regions)
+    return used / (frame_width * frame_height)
+
+
+def input_fraction(frame_width, frame_height, mode='tiles', full_imgsz=1280, square_input=True):
+    """Entrada del detector respecto a la del frame completo a full_imgsz"""
+    regions = get_inference_regions(frame_width, frame_height, mode, full_imgsz, square_input)
+    full = [(0, 0, frame_width, frame_height)]
+    return (input_pixels(regions, full_imgsz, frame_width, frame_height, square_input)
+            / input_pixels(full, full_imgsz, frame_width, frame_height, square_input))
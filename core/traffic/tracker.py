@@ -0,0 +1,269 @@
+"""
+Seguimiento de vehículos entre frames (estilo SORT / ByteTrack, solo NumPy)
+
+Cada vehículo es un track con filtro de Kalman de velocidad constante sobre
+su caja [cx, cy, w, h]. Las detecciones se asocian a los tracks por IoU en
+dos pasadas (primero las de alta confianza, luego las de baja). En los frames
+donde no corre YOLO los tracks solo se predicen, así que los conteos por zona
+siguen siendo válidos aunque se detecte con menos frecuencia.
+
+Los conteos por zona son la cantidad de tracks confirmados cuyo centro cae
+en cada zona, en lugar del máximo de una ventana de detecciones.
+"""
+
+import numpy as np
+from .zones import ZONES, lookup_zones
+
+# ===== CONFIGURACIÓN =====
+HIGH_CONFIDENCE = 0.5     # Detecciones de la primera pasada de asociación
+NEW_TRACK_CONFIDENCE = None  # Confianza mínima para CREAR un track (None = cualquier
+                             # detección que llegue). Con 0.4 las de menos solo mantienen
+                             # tracks existentes: menos tracks fantasma, pero los carritos
+                             # de la maqueta que nunca pasan de 0.4 no se cuentan
+MATCH_IOU = 0.3           # IoU mínimo para asociar detección ↔ track
+MIN_HITS = 2              # Detecciones necesarias para confirmar un track
+MAX_AGE_SECONDS = 4.0     # Tiempo sin detección antes de borrar el track
+
+# Ruido del filtro de Kalman
+POSITION_NOISE = 10.0     # px (proceso, por segundo)
+VELOCITY_NOISE = 20.0     # px/s (proceso, por segundo)
+MEASUREMENT_NOISE = 5.0   # px
+
+# Estado: [cx, cy, w, h, vx, vy]
+_H = np.zeros((4, 6))
+_H[0, 0] = _H[1, 1] = _H[2, 2] = _H[3, 3] = 1.0
+_R = np.eye(4) * MEASUREMENT_NOISE ** 2
+
+
+def xyxy_to_cxcywh(xyxy):
+    xyxy = np.asarray(xyxy, dtype=np.float64)
+    w = xyxy[:, 2] - xyxy[:, 0]
+    h = xyxy[:, 3] - xyxy[:, 1]
+    return np.column_stack([xyxy[:, 0] + w / 2, xyxy[:, 1] + h / 2, w, h])
+
+
+def cxcywh_to_xyxy(boxes):
+    half_w = boxes[:, 2] / 2
+    half_h = boxes[:, 3] / 2
+    return np.column_stack([
+        boxes[:, 0] - half_w, boxes[:, 1] - half_h,
+        boxes[:, 0] + half_w, boxes[:, 1] + half_h
+    ])
+
+
+def iou_matrix(a, b):
+    """IoU entre todas las cajas de a (N, 4) y b (M, 4)"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.where(union > 0, union, 1)
+
+
+def greedy_match(iou, threshold):
+    """
+    Asociación greedy por IoU descendente
+
+    Returns:
+        list: Pares (fila, columna) asociados
+    """
+    matches = []
+    if iou.size == 0:
+        return matches
+
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols])
+    used_rows, used_cols = set(), set()
+
+    for k in order:
+        r, c = rows[k], cols[k]
+        if r in used_rows or c in used_cols:
+            continue
+        matches.append((r, c))
+        used_rows.add(r)
+        used_cols.add(c)
+
+    return matches
+
+
+class VehicleTracker:
+    """Tracker multi-objeto con todos los tracks en arrays NumPy"""
+
+    def __init__(self, new_track_confidence=NEW_TRACK_CONFIDENCE):
+        """
+        Args:
+            new_track_confidence: Confianza mínima para crear un track (None = sin mínimo)
+        """
+        self.new_track_confidence = new_track_confidence
+        self.x = np.zeros((0, 6))          # Estado de cada track
+        self.P = np.zeros((0, 6, 6))       # Covarianza de cada track
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.last_seen = np.zeros(0)       # Momento de la última detección asociada
+        self.matched = np.zeros(0, dtype=bool)  # Asociado en el último update()
+        self._next_id = 1
+        self._time = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def predict(self, timestamp):
+        """Avanzar todos los tracks hasta timestamp (sin detecciones)"""
+        if self._time is None:
+            self._time = timestamp
+            return
+
+        dt = max(0.0, timestamp - self._time)
+        self._time = timestamp
+        self._prune(timestamp)
+        if dt == 0 or len(self.ids) == 0:
+            return
+
+        F = np.eye(6)
+        F[0, 4] = F[1, 5] = dt
+        Q = np.diag([
+            POSITION_NOISE ** 2, POSITION_NOISE ** 2,
+            POSITION_NOISE ** 2, POSITION_NOISE ** 2,
+            VELOCITY_NOISE ** 2, VELOCITY_NOISE ** 2
+        ]) * dt
+
+        self.x = self.x @ F.T
+        self.P = F @ self.P @ F.T + Q
+
+        # Cajas con tamaño no negativo
+        self.x[:, 2:4] = np.clip(self.x[:, 2:4], 1.0, None)
+
+    def update(self, xyxy, conf, timestamp):
+        """
+        Asociar las detecciones de un frame y actualizar los tracks
+
+        Args:
+            xyxy: Array (N, 4) de cajas en píxeles
+            conf: Array (N,) de confianzas
+            timestamp: Momento de captura del frame (segundos, monótono)
+        """
+        self.predict(timestamp)
+
+        xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        conf = np.asarray(conf, dtype=np.float64).reshape(-1)
+
+        track_boxes = self.boxes()
+        unmatched_tracks = np.arange(len(self.ids))
+        matched_tracks, matched_dets = [], []
+
+        # Dos pasadas: primero alta confianza, luego baja (ByteTrack)
+        high = np.nonzero(conf >= HIGH_CONFIDENCE)[0]
+        low = np.nonzero(conf < HIGH_CONFIDENCE)[0]
+
+        for det_idx in (high, low):
+            if len(det_idx) == 0 or len(unmatched_tracks) == 0:
+                continue
+
+            iou = iou_matrix(track_boxes[unmatched_tracks], xyxy[det_idx])
+            pairs = greedy_match(iou, MATCH_IOU)
+
+            matched_t = [unmatched_tracks[r] for r, _ in pairs]
+            matched_tracks.extend(matched_t)
+            matched_dets.extend(det_idx[c] for _, c in pairs)
+            unmatched_tracks = np.setdiff1d(unmatched_tracks, matched_t)
+
+        self.matched[:] = False
+        if matched_tracks:
+            self._correct(np.array(matched_tracks), xyxy[matched_dets], timestamp)
+
+        # Detecciones sin track → tracks nuevos (se confirman con MIN_HITS)
+        unmatched_dets = np.setdiff1d(np.arange(len(xyxy)), matched_dets)
+        if self.new_track_confidence is not None:
+            unmatched_dets = unmatched_dets[conf[unmatched_dets] >= self.new_track_confidence]
+        self._spawn(xyxy[unmatched_dets], timestamp)
+        self._prune(timestamp)
+
+    def hold(self, timestamp):
+        """
+        La escena no cambió (compuerta de movimiento): los tracks siguen
+        donde estaban. Solo los asociados en el último update() se
+        consideran vistos; los que ya venían sin detección siguen envejeciendo.
+        """
+        self._time = timestamp
+        self.x[:, 4:6] = 0.0
+        self.last_seen[self.matched] = timestamp
+        self._prune(timestamp)
+
+    def _correct(self, idx, det_xyxy, timestamp):
+        """Paso de corrección de Kalman para los tracks asociados (vectorizado)"""
+        z = xyxy_to_cxcywh(det_xyxy)
+        x = self.x[idx]
+        P = self.P[idx]
+
+        y = z - x @ _H.T
+        S = _H @ P @ _H.T + _R
+        K = P @ _H.T @ np.linalg.inv(S)
+
+        self.x[idx] = x + np.einsum('nij,nj->ni', K, y)
+        self.P[idx] = (np.eye(6) - K @ _H) @ P
+        self.hits[idx] += 1
+        self.last_seen[idx] = timestamp
+        self.matched[idx] = True
+
+    def _spawn(self, det_xyxy, timestamp):
+        """Crear tracks nuevos para detecciones no asociadas"""
+        n = len(det_xyxy)
+        if n == 0:
+            return
+
+        x = np.zeros((n, 6))
+        x[:, :4] = xyxy_to_cxcywh(det_xyxy)
+        P = np.tile(np.diag([
+            MEASUREMENT_NOISE ** 2, MEASUREMENT_NOISE ** 2,
+            MEASUREMENT_NOISE ** 2, MEASUREMENT_NOISE ** 2,
+            VELOCITY_NOISE ** 2 * 10, VELOCITY_NOISE ** 2 * 10
+        ]), (n, 1, 1))
+
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, P])
+        self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + n)])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(n, timestamp)])
+        self.matched = np.concatenate([self.matched, np.ones(n, dtype=bool)])
+        self._next_id += n
+
+    def _prune(self, timestamp):
+        """Borrar tracks que llevan mucho tiempo sin detección"""
+        alive = (timestamp - self.last_seen) <= MAX_AGE_SECONDS
+        if not alive.all():
+            self.x = self.x[alive]
+            self.P = self.P[alive]
+            self.ids = self.ids[alive]
+            self.hits = self.hits[alive]
+            self.last_seen = self.last_seen[alive]
+            self.matched = self.matched[alive]
+
+    def reset(self):
+        """Borrar todos los tracks (conserva la configuración)"""
+        self.__init__(self.new_track_confidence)
+
+    def boxes(self):
+        """Cajas actuales (predichas) de todos los tracks, (T, 4) xyxy"""
+        return cxcywh_to_xyxy(self.x[:, :4])
+
+    def confirmed(self):
+        """Máscara de tracks confirmados"""
+        return self.hits >= MIN_HITS
+
+    def zone_counts(self, frame_width, frame_height):
+        """Cantidad de tracks confirmados por zona"""
+        mask = self.confirmed()
+        if not mask.any():
+            return [0] * len(ZONES)
+
+        centers = self.x[mask, :2].round().astype(np.int64)
+        zone = lookup_zones(centers[:, 0], centers[:, 1], frame_width, frame_height)
+        return np.bincount(zone[zone >= 0], minlength=len(ZONES)).tolist()
@@ -8,6 +8,8 @@ urlpatterns = [
     
     # ===== VIDEO Y ESTADO =====
     path('video_feed/', views.video_feed, name='video_feed'),
+    path('snapshot.jpg', views.snapshot, name='snapshot'),
+    path('detections/latest/', views.latest_detections, name='latest_detections'),
     path('traffic_status/', views.traffic_status, name='traffic_status'),
     path('controller_status/', views.controller_status, name='controller_status'),
     
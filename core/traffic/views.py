@@ -1,9 +1,11 @@
 from django.shortcuts import render
-from django.http import StreamingHttpResponse, JsonResponse
+from django.http import StreamingHttpResponse, JsonResponse, HttpResponse
+from django.utils.http import parse_etags
 from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 
-from .camera import generate_frames
+from .camera import generate_frames, snapshot_cache
+from .stream import SNAPSHOT_MAX_AGE
 from .models import TrafficCycle, TrafficStats
 from . import state
 
@@ -60,13 +62,100 @@ def intersection_detail(request, id):
 # VIDEO STREAM (CÁMARA)
 # =========================
 def video_feed(request):
-    """Stream de video en tiempo real desde la cámara"""
+    """
+    Stream de video en tiempo real desde la cámara
+    
+    Parámetros opcionales (ej: ?w=640&fps=5&q=60):
+        w: ancho en píxeles, fps: frames por segundo, q: calidad JPEG (10-95)
+        raw=1: video original de la cámara, sin anotaciones ni recodificar
+    """
+    try:
+        width = int(request.GET['w']) if 'w' in request.GET else None
+        fps = float(request.GET['fps']) if 'fps' in request.GET else None
+        quality = int(request.GET['q']) if 'q' in request.GET else None
+    except ValueError:
+        return JsonResponse({
+            "status": "error",
+            "message": "Parámetros inválidos: w, fps y q deben ser numéricos"
+        }, status=400)
+    
+    raw = request.GET.get('raw') in ('1', 'true')
+    
     return StreamingHttpResponse(
-        generate_frames(),
+        generate_frames(width, fps, quality, raw=raw),
         content_type='multipart/x-mixed-replace; boundary=frame'
     )
 
 
+# =========================
+# SNAPSHOT Y DETECCIONES
+# =========================
+def snapshot(request):
+    """
+    Último frame anotado en JPEG (desde memoria, no abre la cámara)
+    
+    Soporta ETag / If-None-Match: si el cliente ya tiene el frame actual
+    responde 304 sin cuerpo.
+    
+    Si el snapshot guardado es viejo (nadie pedía snapshots) espera un
+    momento a que el worker de visión guarde uno nuevo. El header Age dice
+    cuántos segundos pasaron desde la captura; si pasa de SNAPSHOT_MAX_AGE
+    responde 503.
+    """
+    # Marcar demanda: el worker de visión seguirá guardando snapshots
+    jpeg, etag, captured_at, age = snapshot_cache.get_fresh()
+    
+    if jpeg is None or age > SNAPSHOT_MAX_AGE:
+        message = "Aún no hay snapshot disponible" if jpeg is None else "Snapshot desactualizado"
+        response = JsonResponse({"status": "error", "message": message}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(jpeg, content_type='image/jpeg')
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    response['X-Captured-At'] = f"{captured_at:.3f}"
+    response['Age'] = str(int(age))
+    return response
+
+
+def _etag_matches(if_none_match, etag):
+    """If-None-Match según RFC 7232: lista de ETags, '*' y comparación débil (W/)"""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    if etags == ['*']:
+        return True
+    weak = lambda tag: tag[2:] if tag.startswith('W/') else tag
+    return weak(etag) in {weak(tag) for tag in etags}
+
+
+def latest_detections(request):
+    """
+    Última detección en JSON compacto (no dispara captura ni inferencia)
+    
+    Formato: cajas [x1, y1, x2, y2] en píxeles del frame y listas paralelas
+    de clase COCO, confianza y zona (-1 = fuera de zonas).
+    """
+    detections = state.get_latest_detections()
+    
+    if detections is None:
+        return JsonResponse({"status": "error", "message": "Sin detecciones todavía"}, status=503)
+    
+    return JsonResponse({
+        "t": round(detections['captured_at'], 3),
+        "size": list(detections['frame_size']),
+        "boxes": detections['xyxy'].tolist(),
+        "cls": detections['cls'].tolist(),
+        "conf": [round(c, 3) for c in detections['conf'].tolist()],
+        "zone": detections['zone'].tolist(),
+    })
+
+
 # =========================
 # ESTADO GENERAL (UI)
 # =========================
@@ -113,7 +202,15 @@ def auto_control(request):
     try:
         result = traffic_controller()
         
-        # traffic_controller devuelve (phase_id, cycle_time) o (None, 0)
+        # traffic_controller devuelve (phase_id, cycle_time), (None, 0) sin
+        # tráfico o (None, None) si el ciclo se descartó o se interrumpió
+        if result is not None and result[0] is None and result[1] is None:
+            return JsonResponse({
+                "status": "error",
+                "message": "Ciclo interrumpido (parada del controlador)",
+                "counts": state.vehicle_counts
+            }, status=409)
+        
         if result is None or result[0] is None:
             return JsonResponse({
                 "status": "success",
@@ -0,0 +1,373 @@
+"""
+Workers de visión en procesos separados, uno por cámara
+
+Captura + inferencia (+ render cuando hay visores) corren en un proceso
+propio por cada cámara del registro (cameras.py), con su propio GIL y fijado
+a un núcleo: un reports_view pesado o un cliente MJPEG lento en el proceso
+web ya no frenan la detección, y una cámara no frena a otra.
+
+PROCESO WORKER: el mismo bucle de camera.py con la fuente y las zonas de su
+cámara, pero sus salidas van a un FrameBus (framebus.py) en memoria
+compartida. Un hilo publicador escribe en el canal seqlock los conteos por
+carril, la última detección y el estado de la cámara después de cada frame.
+
+PROCESO WEB: un hilo puente lee los canales sin locks, guarda el estado de
+cada cámara en state.cameras y fusiona los conteos en state.vehicle_counts
+(fusion.py; así el controlador y las vistas siguen leyendo state como
+siempre). El video, el snapshot y los campos de estado de una sola cámara
+salen de la principal (la primera del registro). Si un worker muere se
+vuelve a lanzar.
+"""
+
+import multiprocessing
+import threading
+import time
+from .cameras import get_camera_configs, assign_cores, pin_to_cores
+from .framebus import FrameBus, KIND_JPEG
+from .fusion import fuse_counts, uncovered_lanes
+from . import state
+
+# ===== CONFIGURACIÓN =====
+POLL_INTERVAL = 0.005       # Segundos entre lecturas del canal en el proceso web
+STATUS_INTERVAL = 0.25      # El worker publica estado aunque no lleguen frames
+RESTART_DELAY = 2.0         # Espera antes de relanzar un worker caído
+ERROR_LOG_INTERVAL = 10.0   # Segundos entre registros de un mismo error del puente
+STOP_TIMEOUT = 10.0
+
+_lock = threading.Lock()
+_workers = []               # VisionWorker por cámara; el primero es el principal
+_bridge_thread = None
+_running = False
+
+# Estadísticas del puente
+bridge_stats = {
+    'messages': 0,
+    'frames_annotated': 0,
+    'frames_raw': 0,
+    'restarts': 0,
+    'fusions': 0,
+    'errors': 0,
+    'uncovered_lanes': [],
+}
+_uncovered = []   # Carriles sin cámara sana en la última fusión
+
+
+# ===== PROCESO WORKER =====
+
+def _worker_main(names, locks, config, cores, render, stop_event):
+    """Punto de entrada del proceso worker de una cámara"""
+    if pin_to_cores(cores):
+        # Un hilo de inferencia por núcleo propio (salvo THREADS explícito)
+        from . import detectors
+        detectors.DEFAULT_THREADS = len(cores)
+
+    # Sin django.setup(): settings.TRAFFIC_DETECTOR se lee igual (perezoso) y
+    # así apps.ready() no vuelve a arrancar worker y controlador aquí
+    from . import camera, startup
+
+    startup.begin()
+    camera.configure_camera(config)
+    bus = FrameBus(names, locks)
+    camera.frame_bus = bus
+    camera.start_vision_worker(render=render, process=False)
+
+    publisher = threading.Thread(target=_publish_results, args=(bus, stop_event), daemon=True)
+    publisher.start()
+
+    try:
+        while not stop_event.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.stop_vision_worker()
+        publisher.join(timeout=1)
+        bus.close()
+
+
+def _publish_results(bus, stop_event):
+    """Único escritor del canal: un mensaje por frame procesado (o cada STATUS_INTERVAL)"""
+    from . import camera, startup
+
+    while not stop_event.is_set():
+        camera.frame_processed.wait(STATUS_INTERVAL)
+        camera.frame_processed.clear()
+
+        bus.channel.write({
+            'counts': state.get_vehicle_counts(),
+            'detections': state.get_latest_detections(),
+            'camera_active': state.camera_active,
+            'camera_fault': state.get_camera_fault(),
+            'connection': state.get_camera_connection(),
+            'vision_stats': state.get_vision_stats(),
+            'startup': startup.get_startup_report(),
+            'published_at': time.time(),
+        })
+
+
+# ===== PROCESO WEB =====
+
+class VisionWorker:
+    """Proceso de visión de una cámara, su FrameBus y su supervisión"""
+
+    def __init__(self, config, cores, render):
+        self.config = config
+        self.cores = cores   # None = sin fijar
+        self.render = render
+        self.bus = FrameBus()
+        self.process = None
+        self.stop_event = None
+        self.dead_since = None
+        self.restarts = 0
+        self.messages = 0
+
+    def spawn(self):
+        ctx = multiprocessing.get_context('spawn')
+        self.stop_event = ctx.Event()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(self.bus.names, self.bus.locks, self.config, self.cores, self.render, self.stop_event),
+            name=f'vision-{self.config.id}',
+            daemon=True,
+        )
+        self.process.start()
+        print(f"👁️  Proceso de visión '{self.config.id}' iniciado "
+              f"(pid {self.process.pid}, núcleos {self.cores or 'todos'})")
+
+    def stop(self):
+        self.stop_event.set()
+        self.process.join(timeout=STOP_TIMEOUT)
+        if self.process.is_alive():
+            print(f"⚠️ El proceso de visión '{self.config.id}' no respondió; terminándolo")
+            self.process.terminate()
+            self.process.join(timeout=2)
+
+    def supervise(self):
+        """Relanzar el proceso RESTART_DELAY segundos después de que muera"""
+        if self.process.is_alive():
+            return
+
+        now = time.monotonic()
+        if self.dead_since is None:
+            self.dead_since = now
+            state.update_camera(self.config.id, active=False)
+            print(f"❌ El proceso de visión '{self.config.id}' terminó "
+                  f"(código {self.process.exitcode})")
+        elif now - self.dead_since >= RESTART_DELAY:
+            with _lock:
+                if _running:
+                    self.restarts += 1
+                    bridge_stats['restarts'] += 1
+                    self.spawn()
+            self.dead_since = None
+
+    def get_stats(self):
+        return {
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'cores': self.cores,
+            'restarts': self.restarts,
+            'messages': self.messages,
+        }
+
+
+def _apply_message(worker, message):
+    """Guardar el mensaje de una cámara; la principal además llena los campos globales"""
+    worker.messages += 1
+    config = worker.config
+    state.update_camera(
+        config.id,
+        lane_counts=message['counts'],
+        lanes=config.covered_lanes,
+        active=message['camera_active'],
+        fault=message['camera_fault'],
+        healthy=message['camera_active'] and not message['camera_fault'],
+        status=message['connection']['status'],
+        updated_at=message['published_at'],
+    )
+
+    if worker is not _workers[0]:
+        return
+
+    if message['detections'] is not None:
+        state.update_latest_detections(message['detections'])
+
+    connection = dict(message['connection'])
+    connection.pop('outage_seconds', None)  # Se recalcula al leer
+    state.update_camera_connection(**connection)
+
+    state.update_vision_stats(
+        **message['vision_stats'],
+        worker_startup=message['startup'],
+        channel_latency_ms=round((time.time() - message['published_at']) * 1000, 2),
+    )
+
+
+def _fuse():
+    """
+    Fusionar los conteos de todas las cámaras en el vector por carril del controlador
+
+    La falla de cámara es la de la principal o, si está sana, la de los
+    carriles que se quedaron sin ninguna cámara sana (conteo 0).
+    """
+    global _uncovered
+
+    cameras = state.get_cameras()
+    state.camera_active = any(camera.get('active') for camera in cameras.values())
+
+    counts = fuse_counts(cameras.values())
+    if counts != state.get_vehicle_counts():
+        state.update_vehicle_counts(counts)
+    bridge_stats['fusions'] += 1
+
+    uncovered = uncovered_lanes(cameras.values())
+    if uncovered != _uncovered:
+        if uncovered:
+            lanes = ', '.join(chr(ord('A') + lane) for lane in uncovered)
+            print(f"⚠️ Carriles sin cámara sana: {lanes} → conteo 0")
+        else:
+            print("✅ Todos los carriles vuelven a tener una cámara sana")
+        _uncovered = uncovered
+    bridge_stats['uncovered_lanes'] = uncovered
+
+    primary = cameras.get(_workers[0].config.id, {})
+    fault = primary.get('fault')
+    if not fault and uncovered:
+        fault = 'uncovered:' + ''.join(chr(ord('A') + lane) for lane in uncovered)
+    if fault != state.get_camera_fault():
+        state.set_camera_fault(fault)
+
+
+def _forward_frames(bus):
+    """Pasar los frames nuevos de los rings de la cámara principal a los visores"""
+    from . import camera
+
+    if camera.stream_hub.wants_frame() or camera.snapshot_cache.wants_frame():
+        bus.annotated.demand()
+    if camera.stream_hub.wants_raw():
+        bus.raw.demand()
+
+    frame, _, captured_at = bus.annotated.read_latest()
+    if frame is not None:
+        bridge_stats['frames_annotated'] += 1
+        if camera.stream_hub.wants_frame():
+            camera.stream_hub.publish_frame(frame)
+        if camera.snapshot_cache.wants_frame():
+            camera.snapshot_cache.store(frame, captured_at)
+
+    data, kind, _ = bus.raw.read_latest()
+    if data is not None:
+        bridge_stats['frames_raw'] += 1
+        if kind != KIND_JPEG:
+            import cv2
+            ret, buffer = cv2.imencode('.jpg', data)
+            if not ret:
+                return
+            data = buffer.tobytes()
+        camera.stream_hub.publish_raw(data)
+
+
+def _bridge_loop():
+    """Hilo del proceso web: canales → state + fusión, rings → visores, supervisión"""
+    last_fusion = 0.0
+    last_error = (None, 0.0)   # (mensaje, instante) del último error registrado
+
+    while _running:
+        try:
+            updated = False
+            for worker in _workers:
+                message = worker.bus.channel.read()
+                if message is not None:
+                    bridge_stats['messages'] += 1
+                    _apply_message(worker, message)
+                    updated = True
+
+            # También sin mensajes, para que una cámara muda deje de contar como sana
+            now = time.monotonic()
+            if updated or now - last_fusion >= STATUS_INTERVAL:
+                _fuse()
+                last_fusion = now
+
+            _forward_frames(_workers[0].bus)
+
+            for worker in _workers:
+                worker.supervise()
+
+        except Exception as e:
+            # Un error no puede matar el puente: los conteos quedarían congelados
+            bridge_stats['errors'] += 1
+            now = time.monotonic()
+            if str(e) != last_error[0] or now - last_error[1] >= ERROR_LOG_INTERVAL:
+                print(f"❌ Error en el puente de visión: {e}")
+                import traceback
+                traceback.print_exc()
+                last_error = (str(e), now)
+
+        time.sleep(POLL_INTERVAL)
+
+
+def start(render=True):
+    """
+    Lanzar un proceso worker por cámara y el hilo puente (idempotente)
+
+    Returns:
+        bool: True si se inició, False si ya estaba corriendo
+    """
+    global _workers, _bridge_thread, _running
+
+    with _lock:
+        if _running:
+            return False
+
+        configs = get_camera_configs()
+        cores = assign_cores(configs)
+        _workers = [VisionWorker(config, worker_cores, render)
+                    for config, worker_cores in zip(configs, cores)]
+        state.reset_cameras()
+
+        _running = True
+        for worker in _workers:
+            worker.spawn()
+
+        _bridge_thread = threading.Thread(target=_bridge_loop, daemon=True)
+        _bridge_thread.start()
+        return True
+
+
+def stop():
+    """Detener los procesos worker y liberar la memoria compartida"""
+    global _running, _workers
+
+    with _lock:
+        if not _running:
+            return False
+        _running = False
+
+    # Avisar a todos antes de esperar a cada uno
+    for worker in _workers:
+        worker.stop_event.set()
+    for worker in _workers:
+        worker.stop()
+
+    if _bridge_thread:
+        _bridge_thread.join(timeout=2)
+
+    for worker in _workers:
+        worker.bus.close()
+    _workers = []
+    state.camera_active = False
+    print("⏹️  Procesos de visión detenidos")
+    return True
+
+
+def is_running():
+    return _running
+
+
+def get_stats():
+    """Estadísticas del puente y de cada proceso worker"""
+    return dict(
+        bridge_stats,
+        running=_running,
+        workers={worker.config.id: worker.get_stats() for worker in _workers},
+    )
@@ -16,8 +16,15 @@ RESUMEN:
 Coordenadas normalizadas (0-1):
 - 0,0 = esquina superior izquierda
 - 1,1 = esquina inferior derecha
+
+Cada zona puede ser:
+- Un rectángulo (x1, y1, x2, y2)
+- Un polígono [(x, y), (x, y), ...] para carriles curvos o en diagonal
 """
 
+import numpy as np
+import cv2
+
 # ===== ZONAS DE DETECCIÓN =====
 # Ajustar según la posición de la cámara
 
@@ -51,6 +58,9 @@ ZONES = [
     (0.50, 0.46, 1.00, 0.60),
 ]
 
+# Ejemplo de zona poligonal (carril en diagonal):
+#   [(0.22, 0.05), (0.48, 0.05), (0.52, 0.32), (0.26, 0.32)]
+
 # Nombres descriptivos
 ZONE_NAMES = [
     "A - Intersección Izq",
@@ -71,15 +81,129 @@ ZONE_COLORS = [
     (255, 0, 0),    # F - AZUL (avenida)
 ]
 
+# Carriles (semáforos A-F): nombre y color de cada uno. Las zonas de arriba son
+# las de la cámara principal; otra cámara puede definir sus propias zonas y a
+# qué carril cuenta cada una (ver cameras.py)
+LANE_NAMES = tuple(ZONE_NAMES)
+LANE_COLORS = tuple(ZONE_COLORS)
+
 
 # ===== FUNCIONES AUXILIARES =====
 
+# Mapas de etiquetas compilados: (ancho, alto, zonas) → raster uint8
+_label_map_cache = {}
+
+
+def is_polygon_zone(zone):
+    """Una zona es polígono si es una lista de puntos (x, y)"""
+    return len(zone) > 0 and isinstance(zone[0], (tuple, list))
+
+
+def zone_to_polygon(zone):
+    """Convertir una zona (rectángulo o polígono) a lista de puntos normalizados"""
+    if is_polygon_zone(zone):
+        return [tuple(p) for p in zone]
+    
+    x1, y1, x2, y2 = zone
+    return [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+
+
+def get_zone_pixel_polygon(zone_index, frame_width, frame_height, zones=None):
+    """Puntos de una zona en píxeles como array int32 (K, 2) para OpenCV"""
+    zones = ZONES if zones is None else zones
+    points = np.asarray(zone_to_polygon(zones[zone_index]), dtype=np.float64)
+    points = points * np.array([frame_width, frame_height])
+    return points.astype(np.int32)
+
+
+def _zones_key(zones):
+    """Firma hashable de la configuración de zonas"""
+    return tuple(tuple(tuple(p) for p in z) if is_polygon_zone(z) else tuple(z) for z in zones)
+
+
+def get_zone_label_map(frame_width, frame_height, zones=None):
+    """
+    Raster uint8 (alto, ancho) con la zona de cada píxel
+    
+    0 = fuera de zonas, i + 1 = zona i. Si dos zonas se superponen gana la de
+    menor índice (mismo criterio que la búsqueda anterior, que tomaba la
+    primera zona). Se compila una sola vez por resolución y configuración de
+    zonas; consultar la zona de un punto es un simple acceso al array.
+    """
+    zones = ZONES if zones is None else zones
+    key = (frame_width, frame_height, _zones_key(zones))
+    
+    label_map = _label_map_cache.get(key)
+    if label_map is not None:
+        return label_map
+    
+    label_map = np.zeros((frame_height, frame_width), dtype=np.uint8)
+    
+    # Pintar en orden inverso para que las primeras zonas queden encima
+    for i in reversed(range(len(zones))):
+        zone = zones[i]
+        
+        if is_polygon_zone(zone):
+            points = get_zone_pixel_polygon(i, frame_width, frame_height, zones)
+            cv2.fillPoly(label_map, [points], i + 1)
+        else:
+            x1, y1, x2, y2 = zone
+            px1 = int(x1 * frame_width)
+            py1 = int(y1 * frame_height)
+            px2 = int(x2 * frame_width)
+            py2 = int(y2 * frame_height)
+            # Bordes incluidos, igual que la comparación px1 <= x <= px2
+            label_map[py1:py2 + 1, px1:px2 + 1] = i + 1
+    
+    label_map.setflags(write=False)
+    _label_map_cache[key] = label_map
+    return label_map
+
+
+def lookup_zones(xs, ys, frame_width, frame_height, zones=None):
+    """
+    Zona de cada punto (vectorizado)
+    
+    Returns:
+        np.ndarray: Índice de zona por punto, -1 si no cae en ninguna
+    """
+    label_map = get_zone_label_map(frame_width, frame_height, zones)
+    xs = np.clip(xs, 0, frame_width - 1)
+    ys = np.clip(ys, 0, frame_height - 1)
+    return label_map[ys, xs].astype(np.int64) - 1
+
+
+def clear_zone_cache():
+    """Borrar los mapas compilados (p. ej. tras editar ZONES en caliente)"""
+    _label_map_cache.clear()
+
+
+def set_zones(zones, lanes):
+    """
+    Reemplazar las zonas de este proceso (las de una cámara del registro)
+    
+    Se modifican las listas en el lugar: los módulos que hicieron
+    `from .zones import ZONES` ven las zonas nuevas.
+    
+    Args:
+        zones: Lista de zonas (rectángulos o polígonos normalizados)
+        lanes: Carril (0-5) que cuenta cada zona; define nombre y color
+    """
+    if len(zones) != len(lanes):
+        raise ValueError(f"{len(zones)} zonas pero {len(lanes)} carriles")
+    
+    ZONES[:] = zones
+    ZONE_NAMES[:] = [LANE_NAMES[lane] for lane in lanes]
+    ZONE_COLORS[:] = [LANE_COLORS[lane] for lane in lanes]
+    clear_zone_cache()
+
+
 def get_zone_center(zone_index):
     """Obtener el centro de una zona"""
     if 0 <= zone_index < len(ZONES):
-        x1, y1, x2, y2 = ZONES[zone_index]
-        cx = (x1 + x2) / 2
-        cy = (y1 + y2) / 2
+        points = zone_to_polygon(ZONES[zone_index])
+        cx = sum(p[0] for p in points) / len(points)
+        cy = sum(p[1] for p in points) / len(points)
         return (cx, cy)
     return None
 
@@ -94,7 +218,13 @@ def is_point_in_zone(x, y, zone_index, frame_width, frame_height):
         frame_width, frame_height: Dimensiones del frame
     """
     if 0 <= zone_index < len(ZONES):
-        x1, y1, x2, y2 = ZONES[zone_index]
+        zone = ZONES[zone_index]
+        
+        if is_polygon_zone(zone):
+            points = get_zone_pixel_polygon(zone_index, frame_width, frame_height)
+            return cv2.pointPolygonTest(points, (float(x), float(y)), False) >= 0
+        
+        x1, y1, x2, y2 = zone
         
         # Convertir coordenadas normalizadas a píxeles
         px1 = int(x1 * frame_width)
@@ -118,6 +248,7 @@ def is_point_in_zone(x, y, zone_index, frame_width, frame_height):
 3. Ajusta los números en ZONES hasta que los rectángulos cubran tus calles:
 
    FORMATO: (x1, y1, x2, y2)
+   o para carriles curvos/diagonales: [(x, y), (x, y), (x, y), ...]
    
    x1, x2 = posición horizontal (0 = izquierda, 1 = derecha)
    y1, y2 = posición vertical (0 = arriba, 1 = abajo)